@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""Trading Bot v5 — historical 5m backtester running Agent's own entry/exit rules.
+
+Kullanım:  python backtest.py import SRC_DIR DATA_DIR      # Binance kline CSV/ZIP dökümleri -> sembol başına .npz
+           python backtest.py run DATA_DIR [--symbols BTCUSDT,ETHUSDT] [--start 2024-01-01] [--end 2025-01-01]
+                                           [--seed 0] [--risk '{"min_score":5}'] [--trades t.csv] [--equity e.csv]
+
+Her sembolün tüm geçmişi tek vektörel geçişte puanlanır (TAVec.series +
+Agent.score_arrays + Agent.entry_arrays); ardından tüm semboller zaman
+sırasıyla tek portföyde birleştirilir: açık pozisyonlar her barda
+Agent.exit_reason ile değerlendirilir, giriş adayları canlı batch taramadaki
+gibi |skor| sırasıyla max_positions dolana kadar açılır. Boyutlama, TP/SL,
+komisyon/kayma ve strateji ağırlıkları Agent ile aynıdır.
+
+Canlı bottan farklar: bir tick = bir kapanmış 5m mum (fiyat = kapanış), ve
+giriş/çıkış aynı barın kapanışında değil sonraki barlarda değerlendirilir.
+"""
+
+import argparse, csv, glob, io, json, os, time, zipfile
+from datetime import datetime, timezone
+
+import numpy as np
+
+import trading_bot_v5 as bot
+
+COLS=('t','o','h','l','c','v')
+MIN_BARS=35      # Agent.analyze: en az 35 mum
+SCORE_NA=-128    # analyze() None döndürdü (yetersiz mum / ATR filtresi)
+
+# ── DATA ───────────────────────────────────────────────────
+def _parse(text):
+    # Binance kline dökümü: open_time,open,high,low,close,volume,... (başlık satırı olabilir)
+    if not text.strip(): return np.zeros((0,6))
+    skip=0 if text.lstrip()[:1].isdigit() else 1
+    a=np.loadtxt(io.StringIO(text),delimiter=',',usecols=range(6),skiprows=skip,ndmin=2)
+    if len(a) and a[0,0]>1e14: a[:,0]//=1000  # mikro saniye damgalı dökümler
+    return a
+
+def read_dump(path):
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as z:
+            return np.concatenate([_parse(z.read(n).decode()) for n in z.namelist() if n.endswith('.csv')] or [np.zeros((0,6))])
+    with open(path) as f: return _parse(f.read())
+
+def save_candles(path,t,o,h,l,c,v):
+    np.savez(path,t=np.asarray(t,np.int64),o=o,h=h,l=l,c=c,v=v)
+
+def load_candles(path):
+    with np.load(path) as z: return tuple(z[k] for k in COLS)
+
+def import_dumps(src,dst):
+    # BTCUSDT-5m-2024-01.csv / .zip -> dst/BTCUSDT.npz (sıralı, tekrarsız)
+    os.makedirs(dst,exist_ok=True); groups={}
+    for p in sorted(glob.glob(os.path.join(src,'**','*.csv'),recursive=True)+
+                    glob.glob(os.path.join(src,'**','*.zip'),recursive=True)):
+        groups.setdefault(os.path.basename(p).split('-')[0].split('.')[0].upper(),[]).append(p)
+    for sym,paths in sorted(groups.items()):
+        a=np.concatenate([read_dump(p) for p in paths])
+        if not len(a): continue
+        a=a[np.argsort(a[:,0],kind='stable')]
+        a=a[np.r_[True,np.diff(a[:,0])>0]]
+        save_candles(os.path.join(dst,f"{sym}.npz"),a[:,0],*a[:,1:].T)
+        print(f"{sym}: {len(a)} mum ({len(paths)} dosya)")
+    return sorted(groups)
+
+def list_symbols(data_dir):
+    return sorted(os.path.basename(p)[:-4] for p in glob.glob(os.path.join(data_dir,'*.npz')))
+
+# ── SIGNALS ────────────────────────────────────────────────
+_GATE_RISK=dict(min_score=0,min_conf=0,max_atr_pct=np.inf)  # sadece eşikten bağımsız filtreler
+
+def features(o,h,l,c,v):
+    """Risk ayarlarından bağımsız bar özellikleri; bir kez hesaplanıp tüm konfigürasyonlarca paylaşılır.
+
+    score[i]: analyze() skoru (c[:i+1] üzerinde), atr_pct[i]: ham ATR %'si,
+    gate[i]: bit0/bit1 = LONG/SHORT için entry_action()'ın eşik dışı filtreleri
+    (hacim, RSI uçları, onay sayısı, BB konumu) geçiliyor mu; ilk MIN_BARS-1 bar kapalı.
+    """
+    ind=bot.TAVec.series(h,l,c,v)
+    pc=np.concatenate((c[:1],c[:-1]))
+    score=bot.Agent.score_arrays(ind,o,h,l,c,pc)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        atr_pct=np.where(c>0,ind['atr']/c*100,0)
+    r=np.round; one=np.ones(len(c),np.int8)
+    args=(r(ind['rsi'],1),r(ind['macd'],8),r(ind['stoch'],1),r(ind['vr'],2),r(atr_pct,2),
+          r(ind['bbu'],6),r(ind['bbl'],6),c)  # analyze() ile aynı yuvarlama
+    gate=(bot.Agent.entry_arrays(_GATE_RISK,one,100,*args)==1).astype(np.uint8)
+    gate|=(bot.Agent.entry_arrays(_GATE_RISK,-one,100,*args)==-1).astype(np.uint8)<<1
+    gate[:MIN_BARS-1]=0
+    return score.astype(np.int8),atr_pct,gate
+
+def entries(score,atr_pct,gate,risk):
+    """features() + risk eşikleri -> (analyze skoru ya da SCORE_NA, giriş indeksleri, yön +1/-1)."""
+    ok=atr_pct<=risk['max_atr_pct']; ok[:MIN_BARS-1]=False  # analyze(): >=35 mum ve ATR filtresi
+    ms=risk['min_score']
+    side=np.where(score>=ms,1,np.where(score<=-ms,-1,0)).astype(np.int8)
+    conf=np.minimum(np.abs(score)/8*100,97)
+    go=ok&(side!=0)&(np.where(side>0,gate&1,gate&2)>0)&(conf>=risk['min_conf'])&(np.round(atr_pct,2)<=risk['max_atr_pct'])
+    idx=np.flatnonzero(go)
+    return np.where(ok,score,SCORE_NA).astype(np.int8),idx,side[idx]
+
+def signals(o,h,l,c,v,risk):
+    """Her bar için Agent.analyze() skoru ve entry_action() kararı (vektörel).
+
+    score[i] == analyze() skoru, c[:i+1] üzerinde (None ise SCORE_NA);
+    aday barlar: idx, side (+1 LONG / -1 SHORT), score, conf.
+    """
+    score,idx,side=entries(*features(o,h,l,c,v),risk)
+    return score,dict(idx=idx,side=side,score=score[idx],conf=np.minimum(np.abs(score[idx])/8*100,97))
+
+def featurize(path):
+    t,o,h,l,c,v=load_candles(path)
+    return (t,c)+features(o,h,l,c,v)
+
+class Market:
+    """Sembol başına bar dizileri: t, c ve features() çıktısı (score, atr_pct, gate).
+
+    Dosyalardan (load) ya da optimizer'ın paylaşılan belleğinden kurulur;
+    Backtester sadece kopyasız zaman dilimleri alır.
+    """
+    FIELDS=(('t',np.int64),('c',np.float64),('score',np.int8),('atr_pct',np.float64),('gate',np.uint8))
+
+    def __init__(self,symbols,cols):
+        self.symbols=list(symbols); self.cols=cols  # alan -> sembol başına dizi listesi
+        self.index={s:i for i,s in enumerate(self.symbols)}
+
+    @classmethod
+    def load(cls,data_dir,symbols=None,verbose=False):
+        symbols=sorted(symbols or list_symbols(data_dir)); cols={k:[] for k,_ in cls.FIELDS}; t0=time.perf_counter()
+        for i,sym in enumerate(symbols):
+            for k,a in zip(cols,featurize(os.path.join(data_dir,f"{sym}.npz"))): cols[k].append(a)
+            if verbose and (i+1)%50==0: print(f"  {i+1}/{len(symbols)} sembol ({time.perf_counter()-t0:.1f}s)")
+        m=cls(symbols,cols); m.load_s=time.perf_counter()-t0
+        return m
+
+    def __len__(self): return len(self.symbols)
+    def bars(self): return int(sum(len(t) for t in self.cols['t']))
+
+# ── PORTFOLIO SIMULATION ───────────────────────────────────
+class BarClock(bot.WallClock):
+    # Simülasyon saati: bar zamanına ayarlanır, uyumaz
+    def __init__(self): self.t=0.0
+    def now(self): return self.t
+    def sleep(self,s): pass
+    def dt(self): return datetime.fromtimestamp(self.t)
+
+class _Tape:
+    # Agent'ın BinanceClient'tan kullandığı tek şey saat
+    def __init__(self): self.clock=BarClock()
+
+class BacktestResult:
+    def __init__(self,trades,eq_t,eq,start_balance,meta):
+        self.trades=trades; self.eq_t=np.asarray(eq_t,np.int64); self.eq=np.asarray(eq,float)
+        self.start_balance=start_balance; self.meta=meta
+
+    @property
+    def pnl(self): return np.array([t['pnl'] for t in self.trades],float)
+
+    def max_drawdown(self):
+        if not len(self.eq): return 0.0
+        peak=np.maximum.accumulate(self.eq)
+        return float(((peak-self.eq)/peak).max()*100)
+
+    def summary(self):
+        pnl=self.pnl; w=pnl>0
+        gp=float(pnl[w].sum()); gl=float(-pnl[~w].sum())
+        final=float(self.eq[-1]) if len(self.eq) else self.start_balance
+        why={}
+        for t in self.trades:
+            k=t['why'].split(':')[0]; why[k]=why.get(k,0)+1
+        strat={}
+        for t in self.trades:
+            s=strat.setdefault(t['strat'],{'trades':0,'wins':0,'pnl':0.0})
+            s['trades']+=1; s['wins']+=t['won']; s['pnl']=round(s['pnl']+t['pnl'],2)
+        return dict(trades=len(pnl),wins=int(w.sum()),wr=round(float(w.mean()*100),1) if len(pnl) else 0.0,
+                    start_balance=self.start_balance,final_balance=round(final,2),
+                    net_pnl=round(final-self.start_balance,2),return_pct=round((final/self.start_balance-1)*100,2),
+                    profit_factor=round(gp/gl,2) if gl>0 else (999.0 if gp>0 else 0.0),
+                    max_drawdown_pct=round(self.max_drawdown(),2),
+                    avg_pnl=round(float(pnl.mean()),2) if len(pnl) else 0.0,
+                    commission=round(sum(t['commission'] for t in self.trades),2),
+                    slippage=round(sum(t['slippage'] for t in self.trades),2),
+                    avg_bars=round(float(np.mean([t['bars'] for t in self.trades])),1) if self.trades else 0.0,
+                    exits=why,strategies=strat,**self.meta)
+
+    def save_trades(self,path):
+        keys=['id','sym','type','t_open','t_close','entry','exit','tp','sl','lev','sz','pnl','pnl_pct',
+              'commission','slippage','max_pnl','min_pnl','bars','score','conf','strat','why','won']
+        with open(path,'w',newline='') as f:
+            w=csv.DictWriter(f,keys,extrasaction='ignore'); w.writeheader(); w.writerows(self.trades)
+
+    def save_equity(self,path):
+        with open(path,'w',newline='') as f:
+            w=csv.writer(f); w.writerow(['t','balance'])
+            w.writerows(zip(self.eq_t.tolist(),np.round(self.eq,2).tolist()))
+
+class Backtester:
+    """Market (ya da .npz dizini) üzerinde çok sembollü backtest.
+
+    Agent örneği kurallar, risk ayarları, seed'li RNG (strateji/kaldıraç
+    seçimi) ve strateji ağırlıkları için kullanılır; pozisyon sözlükleri
+    Agent.positions ile aynı alanları taşır, böylece exit_reason doğrudan çalışır.
+    """
+    def __init__(self,market,symbols=None,risk=None,seed=0,start=None,end=None,balance=10000.0):
+        # market: Market ya da .npz dizini (bkz. import_dumps)
+        self.load_s=0.0
+        if isinstance(market,str): market=Market.load(market,symbols); self.load_s=market.load_s
+        self.market=market; self.symbols=sorted(symbols) if symbols else market.symbols
+        self.start=start; self.end=end; self.balance=float(balance); self.seed=seed
+        self.agent=bot.Agent(_Tape(),seed)
+        if risk: self.agent.risk.update(risk)
+
+    def prepare(self,verbose=True):
+        # [start, end) dilimi + risk eşikleri; sadece kapanış, skor ve giriş adayları tutulur
+        risk=self.agent.risk; cols=self.market.cols; self.t=[]; self.c=[]; self.sc=[]; cands=[]
+        t0=time.perf_counter()
+        for k,sym in enumerate(self.symbols):
+            i=self.market.index[sym]; t=cols['t'][i]
+            a=0 if self.start is None else int(np.searchsorted(t,self.start))
+            b=len(t) if self.end is None else int(np.searchsorted(t,self.end))
+            score,idx,side=entries(cols['score'][i][a:b],cols['atr_pct'][i][a:b],cols['gate'][i][a:b],risk)
+            self.t.append(t[a:b]); self.c.append(cols['c'][i][a:b]); self.sc.append(score)
+            cands.append(dict(idx=idx,side=side,score=score[idx],sym=np.full(len(idx),k,np.int32)))
+        ev={x:np.concatenate([d[x] for d in cands]) for x in cands[0]} if cands else {}
+        if ev:
+            et=np.concatenate([t[d['idx']] for t,d in zip(self.t,cands)])
+            # Aynı bar: |skor| büyük olan önce, eşitlikte sembol sırası (analyze_batch gibi)
+            order=np.lexsort((ev['sym'],-np.abs(ev['score'].astype(int)),et))
+            ev={x:y[order] for x,y in ev.items()}; ev['t']=et[order]
+            ev['conf']=np.minimum(np.abs(ev['score'].astype(int))/8*100,97)
+        self.ev=ev; self.prep_s=time.perf_counter()-t0+self.load_s
+        return self
+
+    def run(self,verbose=True):
+        if not hasattr(self,'ev'): self.prepare(verbose)
+        ag=self.agent; risk=ag.risk; clock=ag.bc.clock; t0=time.perf_counter()
+        ag.balance=ag.start_balance=ag.peak_balance=self.balance
+        times=np.unique(np.concatenate(self.t)) if self.t else np.zeros(0,np.int64)
+        ev=self.ev; ne=len(ev.get('t',())); e=0
+        pos={}  # sym_id -> (pozisyon sözlüğü, yerel bar indeksi)
+        trades=[]; eq_t=[int(times[0]) if len(times) else 0]; eq=[self.balance]
+
+        def settle(k,why,T):
+            d,_=pos.pop(k); com,slip=ag.costs(d['sz'],d['lev']); net=d['pnl']-com-slip
+            ag.balance+=net; ag.peak_balance=max(ag.peak_balance,ag.balance); ag._learn(d['strat'],net>0)
+            trades.append(dict(id=len(trades)+1,sym=self.symbols[k],type=d['type'],t_open=d['t_open'],t_close=int(T),
+                entry=d['entry'],exit=d['cur'],tp=d['tp'],sl=d['sl'],lev=d['lev'],sz=round(d['sz'],2),
+                pnl=round(net,2),pnl_pct=round(net/d['sz']*100,2),commission=round(com,2),slippage=round(slip,2),
+                max_pnl=round(d['max_pnl'],2),min_pnl=round(d['min_pnl'],2),bars=d['ticks'],
+                score=d['score'],conf=d['conf'],strat=d['strat'],why=why,won=net>0))
+            eq_t.append(int(T)); eq.append(ag.balance)
+
+        for T in times:
+            T=int(T); clock.t=T/1000
+            # 1. Açık pozisyonlar (canlıdaki update(): girişlerden önce)
+            for k in list(pos):
+                d,j=pos[k]; ts=self.t[k]
+                if j+1>=len(ts):
+                    if T>ts[-1]: settle(k,'End of data',T)
+                    continue
+                if ts[j+1]!=T: continue
+                j+=1; pos[k]=(d,j); p=float(self.c[k][j])
+                pnl,pct=ag.mark(d,p)
+                s=int(self.sc[k][j])
+                why=ag.exit_reason(d,p,pnl,pct,lambda s=s: None if s==SCORE_NA else s)
+                if why: settle(k,why,T)
+            # 2. Bu barın giriş adayları
+            while e<ne and ev['t'][e]<T: e+=1
+            while e<ne and ev['t'][e]==T:
+                k=int(ev['sym'][e]); i=int(ev['idx'][e])
+                if k not in pos and len(pos)<risk['max_positions']:
+                    p=float(self.c[k][i]); action='LONG' if ev['side'][e]>0 else 'SHORT'
+                    strat=ag._pick_strat()
+                    lev=ag.rng.choice([2,3,5,10]) if risk['leverage']==0 else risk['leverage']
+                    sz=ag.balance*(risk['position_size_pct']/100)  # open(): RiskManager yokken
+                    tp,sl=ag.levels(p,lev,action)
+                    pos[k]=(dict(type=action,entry=p,cur=p,tp=tp,sl=sl,sz=sz,lev=lev,pnl=0,pnl_pct=0,
+                                 strat=strat,score=int(ev['score'][e]),conf=float(ev['conf'][e]),
+                                 max_pnl=0,min_pnl=0,ticks=0,t_open=T),i)
+                e+=1
+        for k in list(pos):
+            settle(k,'End of backtest',int(self.t[k][pos[k][1]]))
+        meta=dict(symbols=len(self.symbols),bars=int(sum(len(t) for t in self.t)),seed=self.seed,
+                  prepare_s=round(self.prep_s,2),simulate_s=round(time.perf_counter()-t0,2))
+        return BacktestResult(trades,eq_t,eq,self.balance,meta)
+
+# ── CLI ────────────────────────────────────────────────────
+def _ms(s):
+    return None if not s else int(datetime.fromisoformat(s).replace(tzinfo=timezone.utc).timestamp()*1000)
+
+def main():
+    ap=argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub=ap.add_subparsers(dest='cmd',required=True)
+    p=sub.add_parser('import',help='Binance kline CSV/ZIP dökümlerini sembol başına .npz yap')
+    p.add_argument('src'); p.add_argument('dst')
+    p=sub.add_parser('run',help='backtest çalıştır')
+    p.add_argument('data'); p.add_argument('--symbols',default='')
+    p.add_argument('--start',default=''); p.add_argument('--end',default='')
+    p.add_argument('--seed',type=int,default=0); p.add_argument('--balance',type=float,default=10000)
+    p.add_argument('--risk',default='',help="Agent.risk üzerine JSON, örn. '{\"min_score\":5}'")
+    p.add_argument('--trades',default=''); p.add_argument('--equity',default='')
+    a=ap.parse_args()
+    if a.cmd=='import': import_dumps(a.src,a.dst); return
+    bt=Backtester(a.data,[s for s in a.symbols.split(',') if s] or None,json.loads(a.risk) if a.risk else None,
+                  a.seed,_ms(a.start),_ms(a.end),a.balance)
+    res=bt.run()
+    print(json.dumps(res.summary(),indent=2,ensure_ascii=False))
+    if a.trades: res.save_trades(a.trades)
+    if a.equity: res.save_equity(a.equity)
+
+if __name__=='__main__': main()
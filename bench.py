@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Trading Bot v5 — hot-path benchmarks against a local fake Binance (no network).
+
+Kullanım:  python bench.py prefetch [--symbols 20] [--latency 0.15]
+           python bench.py refresh [--sizes 100,200,400,800,1600]
+           python bench.py backtest [--symbols 100] [--days 365]
+           python bench.py sweep [--symbols 20] [--days 90] [--configs 16] [--workers 1,2,4,8]
+           python bench.py montecarlo [--trades 10000] [--paths 50000]
+           python bench.py memory [--trades 1000000] [--every 100000]
+           python bench.py journal [--trades 100000]
+           python bench.py shard [--symbols 400] [--scans 10] [--workers 1,2,4]
+"""
+
+import argparse, base64, contextlib, gzip, hashlib, io, json, math, os, re, socketserver, tempfile, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+import trading_bot_v5 as bot
+
+# ── FAKE BINANCE REST ──────────────────────────────────────
+class FakeBinance(BaseHTTPRequestHandler):
+    latency=0.0
+    symbols=[]
+    protocol_version='HTTP/1.1'
+
+    def do_GET(self):
+        p=urlparse(self.path); qs={k:v[0] for k,v in parse_qs(p.query).items()}
+        if self.latency: time.sleep(self.latency)
+        if p.path=='/fapi/v1/exchangeInfo':
+            body={'symbols':[{'symbol':s,'contractType':'PERPETUAL','status':'TRADING'} for s in self.symbols]}
+        elif p.path=='/fapi/v1/ticker/24hr':
+            body=[{'symbol':s,'lastPrice':'100','priceChangePercent':'0.5','volume':'1000','highPrice':'105',
+                   'lowPrice':'95','quoteVolume':'100000','openPrice':'99','count':100} for s in self.symbols]
+        elif p.path=='/fapi/v1/ticker/price':
+            body=[{'symbol':s,'price':'100'} for s in self.symbols]
+        elif p.path=='/fapi/v1/klines':
+            body=fake_klines(qs['symbol'],int(qs.get('limit',80)),qs.get('startTime'))
+        else:
+            self.send_response(404); self.send_header('Content-Length','0'); self.end_headers(); return
+        data=json.dumps(body).encode()
+        self.send_response(200); self.send_header('Content-Type','application/json')
+        self.send_header('Content-Length',str(len(data))); self.end_headers(); self.wfile.write(data)
+
+    def log_message(self,*a): pass
+
+def fake_klines(sym,limit,start=None,iv=300000):
+    now=int(time.time()*1000); last=now-now%iv
+    t=int(start) if start is not None else last-(limit-1)*iv; out=[]
+    seed=sum(map(ord,sym))
+    while t<=last and len(out)<limit:
+        c=100+5*math.sin(t/iv/7+seed)+(seed*t//iv)%97/100
+        out.append([t,f"{c-0.2}",f"{c+0.5}",f"{c-0.6}",f"{c}",f"{10+(t//iv+seed)%13}",t+iv-1,"0",0,"0","0","0"])
+        t+=iv
+    return out
+
+def serve(symbols,latency=0.0):
+    FakeBinance.symbols=symbols; FakeBinance.latency=latency
+    srv=ThreadingHTTPServer(('127.0.0.1',0),FakeBinance); srv.daemon_threads=True
+    threading.Thread(target=srv.serve_forever,daemon=True).start()
+    bot.BinanceClient.BASE=f"http://127.0.0.1:{srv.server_address[1]}"
+    return srv
+
+# ── FAKE BINANCE WEBSOCKET ─────────────────────────────────
+class FakeBinanceWS(socketserver.BaseRequestHandler):
+    # Minimal RFC 6455 sunucusu: kayıtlı stream mesajlarını her bağlantıya sırayla gönderir.
+    # drop=True iken son mesajdan sonra bağlantıyı kapatır (yeniden bağlanma testi);
+    # istemcinin gönderdikleri (SUBSCRIBE) server.received[bağlantı no] listesine yazılır.
+    GUID=b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+    def handle(self):
+        sock=self.request; data=b''
+        while b'\r\n\r\n' not in data:
+            chunk=sock.recv(4096)
+            if not chunk: return
+            data+=chunk
+        key=re.search(rb'Sec-WebSocket-Key:\s*(\S+)',data,re.I).group(1)
+        acc=base64.b64encode(hashlib.sha1(key+self.GUID).digest())
+        sock.sendall(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     b'Sec-WebSocket-Accept: '+acc+b'\r\n\r\n')
+        srv=self.server; got=[]; srv.received.append(got)
+        threading.Thread(target=self._read,args=(sock,got),daemon=True).start()
+        time.sleep(srv.delay)  # istemcinin on_open aboneliklerine zaman tanı
+        try:
+            for msg in srv.frames:
+                sock.sendall(self._frame(0x1,msg.encode())); time.sleep(srv.delay)
+            while not srv.drop and not srv.stopped: time.sleep(0.05)
+            sock.sendall(self._frame(0x8,b'\x03\xe8'))
+        except OSError: pass
+
+    @staticmethod
+    def _frame(op,payload):
+        n=len(payload)
+        head=bytes([0x80|op,n]) if n<126 else bytes([0x80|op,126])+n.to_bytes(2,'big') if n<65536 else bytes([0x80|op,127])+n.to_bytes(8,'big')
+        return head+payload
+
+    @staticmethod
+    def _read(sock,got):
+        # İstemci çerçeveleri maskelidir; sadece metin çerçeveleri saklanır
+        f=sock.makefile('rb')
+        try:
+            while True:
+                h=f.read(2)
+                if len(h)<2: return
+                n=h[1]&0x7f
+                if n==126: n=int.from_bytes(f.read(2),'big')
+                elif n==127: n=int.from_bytes(f.read(8),'big')
+                mask=f.read(4) if h[1]&0x80 else b'\0'*4
+                body=bytes(b^mask[i%4] for i,b in enumerate(f.read(n)))
+                if h[0]&0x0f==0x1: got.append(json.loads(body))
+                elif h[0]&0x0f==0x8: return
+        except (OSError,ValueError): return
+
+def ws_frames(path):
+    # MarketRecorder dosyasındaki stream mesajları (kayıt sırasıyla, metin olarak)
+    out=[]
+    with gzip.open(path,'rt',encoding='utf-8') as f:
+        for line in f:
+            rec=json.loads(line)
+            if rec.get('k')=='ws': out.append(json.dumps(rec['b']))
+    return out
+
+def ws_serve(frames,drop=False,delay=0.02):
+    srv=socketserver.ThreadingTCPServer(('127.0.0.1',0),FakeBinanceWS); srv.daemon_threads=True
+    srv.frames=list(frames); srv.drop=drop; srv.delay=delay; srv.received=[]; srv.stopped=False
+    threading.Thread(target=srv.serve_forever,daemon=True).start()
+    bot.BinanceClient.WS=f"ws://127.0.0.1:{srv.server_address[1]}"
+    return srv
+
+# ── BENCHMARKS ─────────────────────────────────────────────
+def bench_prefetch(n_symbols,latency):
+    syms=[f"B{i:03d}USDT" for i in range(n_symbols)]
+    srv=serve(syms,latency)
+    try:
+        bc=bot.BinanceClient()
+        t0=time.perf_counter()
+        for s in syms: bc.candles(s,'5m',80,max_age=0)
+        seq=time.perf_counter()-t0
+        t0=time.perf_counter(); bc.prefetch(syms,'5m',80,max_age=0); par=time.perf_counter()-t0
+        print(f"{n_symbols} sembol, {latency*1000:.0f}ms gecikme | sıralı {seq*1000:.0f}ms | "
+              f"paralel ({bc.POOL} işçi) {par*1000:.0f}ms | x{seq/par:.1f}")
+    finally: srv.shutdown()
+
+def _legacy_refresh(symbols,ticker,prices,data):
+    # v5.0 refresh_tickers: liste üyeliği testi -> O(n^2)
+    for t in data:
+        s=t.get('symbol')
+        if not s or s not in symbols or s not in ticker: continue
+        ticker[s].update({'price':float(t.get('lastPrice',0)),'change':float(t.get('priceChangePercent',0)),
+            'volume':float(t.get('volume',0)),'high':float(t.get('highPrice',0)),
+            'low':float(t.get('lowPrice',0)),'quoteVolume':float(t.get('quoteVolume',0))})
+        prices[s]=float(t.get('lastPrice',0))
+
+def bench_refresh(sizes,reps=20):
+    print(f"{'evren':>6} | {'eski (ms)':>10} | {'kayıt (ms)':>10} | x")
+    for n in sizes:
+        syms=[f"R{i:04d}USDT" for i in range(n)]
+        data=[{'symbol':s,'lastPrice':'1.5','priceChangePercent':'0.1','volume':'10','highPrice':'2',
+               'lowPrice':'1','quoteVolume':'15','openPrice':'1.4','count':3} for s in syms]
+        data+=[{'symbol':f"X{i}BUSD",'lastPrice':'1'} for i in range(n//4)]  # evren dışı satırlar
+        ticker={s:{} for s in syms}; prices={}
+        t0=time.perf_counter()
+        for _ in range(reps): _legacy_refresh(syms,ticker,prices,data)
+        old=(time.perf_counter()-t0)/reps
+        bc=bot.BinanceClient.__new__(bot.BinanceClient); bc.reg=bot.SymbolRegistry(syms)
+        t0=time.perf_counter()
+        for _ in range(reps): bc._apply_tickers(data)
+        new=(time.perf_counter()-t0)/reps
+        print(f"{n:>6} | {old*1000:>10.2f} | {new*1000:>10.2f} | x{old/new:.1f}")
+
+def synth_candles(n,seed,iv=300000):
+    # Rejim değiştiren volatilite + ara sıra şok/hacim patlaması olan rastgele yürüyüş
+    r=np.random.default_rng(seed); t=1_700_000_000_000+np.arange(n,dtype=np.int64)*iv
+    vol=0.002*(1+np.abs(np.sin(np.arange(n)/500)))*np.where(r.random(n)<0.02,4,1)
+    c=100*np.exp(np.cumsum(r.normal(0,vol)))
+    o=np.r_[c[0],c[:-1]]; h=np.maximum(o,c)*(1+r.random(n)*0.002); l=np.minimum(o,c)*(1-r.random(n)*0.002)
+    v=r.lognormal(3,0.6,n)*np.where(r.random(n)<0.03,5,1)
+    return t,o,h,l,c,v
+
+def bench_backtest(n_symbols,days):
+    import backtest
+    n=days*288
+    with tempfile.TemporaryDirectory() as d:
+        for i in range(n_symbols): backtest.save_candles(os.path.join(d,f"S{i:03d}USDT.npz"),*synth_candles(n,i))
+        t0=time.perf_counter(); res=backtest.Backtester(d).run(verbose=False); el=time.perf_counter()-t0
+        s=res.summary()
+        print(f"{n_symbols} sembol x {days} gün ({s['bars']:,} mum) | hazırlık {s['prepare_s']}s | "
+              f"simülasyon {s['simulate_s']}s | toplam {el:.1f}s | {s['bars']/el/1e6:.2f}M mum/s | {s['trades']} işlem")
+
+def bench_sweep(n_symbols,days,n_cfg,workers):
+    import backtest, optimizer
+    with tempfile.TemporaryDirectory() as d:
+        for i in range(n_symbols): backtest.save_candles(os.path.join(d,f"S{i:03d}USDT.npz"),*synth_candles(days*288,i))
+        cfgs=optimizer.StrategyOptimizer.sample(optimizer.DEFAULT_SPACE,n_cfg,1)
+        base=None
+        print(f"{n_symbols} sembol x {days} gün, {n_cfg} konfigürasyon ({os.cpu_count()} çekirdek)")
+        for w in workers:
+            with optimizer.StrategyOptimizer(d,workers=w) as opt:
+                opt.run(cfgs,verbose=False); el=opt.elapsed_s
+            base=base or el
+            print(f"  {w:>2} işçi | hazırlık {opt.prep_s:.1f}s | sweep {el:.1f}s | {n_cfg/el:.2f} konf/s | x{base/el:.2f}")
+
+def bench_montecarlo(n_trades,paths):
+    import montecarlo
+    pnl=np.random.default_rng(0).normal(0.5,20,n_trades)
+    print(f"{n_trades:,} işlem x {paths:,} yol ({os.cpu_count()} çekirdek)")
+    for m in ('bootstrap','block','shuffle'):
+        r=montecarlo.simulate(pnl,paths=paths,method=m)
+        print(f"  {m:>9} | {r['elapsed_s']:.2f}s | {n_trades*paths/r['elapsed_s']/1e6:.0f}M adım/s | "
+              f"DD p95 {r['max_drawdown_pct']['p95']}% | batma {r['prob_ruin']*100:.2f}%")
+
+def _rss_mb():
+    with open('/proc/self/statm') as f: return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')/2**20
+
+def _churn(ag,n):
+    # n adet açılış/kapanış (sabit sembol, değişen yön/sonuç); çıktı bastırılır
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        for i in range(1,n+1):
+            ag.open(dict(action='LONG' if i%2 else 'SHORT',sym='BTCUSDT',price=100.0,lev=3,conf=70,score=5,
+                         strat='Scalping',reasons=['bench'],ind={}))
+            pos=ag.positions['BTCUSDT']; pos['cur']=100.5 if i%3 else 99.2; pos['pnl']=ag.quote(pos,pos['cur'])[0]
+            ag.close('BTCUSDT','bench')
+            if i%10000==0: out.seek(0); out.truncate()
+            yield i
+
+def bench_journal(n_trades):
+    # Journal yazma maliyeti ve n işlemlik koşudan kurtarma süresi (snapshot'lı / snapshot'sız)
+    import backtest
+    for label,snap in (('snapshot',bot.Journal.SNAP_EVENTS),('sadece günlük',10**12)):
+        bot.Journal.SNAP_EVENTS=snap; snap_s=bot.Journal.SNAP_S; bot.Journal.SNAP_S=1e12 if snap>n_trades*2 else snap_s
+        with tempfile.TemporaryDirectory() as d:
+            jp,tp=os.path.join(d,'j.jsonl'),os.path.join(d,'t.jsonl')
+            with contextlib.redirect_stdout(io.StringIO()): ag=bot.Agent(backtest._Tape(),0,tp,jp)
+            t0=time.perf_counter()
+            for _ in _churn(ag,n_trades): pass
+            ag.journal.sync(); el=time.perf_counter()-t0
+            size=os.path.getsize(jp)/2**20
+            with contextlib.redirect_stdout(io.StringIO()): ag2=bot.Agent(backtest._Tape(),0,tp,jp)
+            st=ag2.journal.stats; ok=ag2.balance==ag.balance and ag2.trades==ag.trades==n_trades
+            print(f"{label:>13} | {n_trades:,} işlem {n_trades/el:,.0f}/s | günlük {size:.1f} MB | "
+                  f"kurtarma {st['recover_ms']:.0f}ms ({st['replayed']:,} olay, snapshot {st['snapshot_ms']:.0f}ms) | "
+                  f"{'tutarlı' if ok else 'UYUŞMAZ'}")
+            ag.all_trades.close(); ag2.all_trades.close(); ag2.journal.close()
+        bot.Journal.SNAP_S=snap_s
+
+def bench_memory(n_trades,every):
+    # Agent.open/close döngüsü: all_trades düz liste (eski) vs diske taşan TradeLog
+    import backtest
+    for mode in ('list','tradelog'):
+        with tempfile.TemporaryDirectory() as d:
+            ag=bot.Agent(backtest._Tape(),0)
+            ag.all_trades=[] if mode=='list' else bot.TradeLog(os.path.join(d,'trades.jsonl'))
+            base=_rss_mb(); t0=time.perf_counter(); row=[]
+            for i in _churn(ag,n_trades):
+                if i%every==0: row.append(f"{_rss_mb()-base:7.1f}")
+            el=time.perf_counter()-t0
+            print(f"{mode:>9} | {n_trades/el:,.0f} işlem/s | +RSS MB her {every:,} işlemde: {' '.join(row)}")
+            if mode=='tradelog': ag.all_trades.close()
+            del ag
+
+def _write_replay(path,n_symbols,bars):
+    # MarketRecorder biçiminde ağsız replay kaydı: evren + ticker + t0'a kadarki 121 mumluk tam
+    # pencere, ardından her mum kendi açılış anında kaydedilmiş artımlı bir yanıt (canlı kayıt gibi);
+    # böylece kayıt son muma kadar sürer (exhausted() erken True olmaz) ve her tick yeni veri görür
+    syms=[f"S{i:03d}USDT" for i in range(n_symbols)]
+    t0=None
+    with gzip.open(path,'wt',encoding='utf-8') as f:
+        rows={}
+        for i,s in enumerate(syms):
+            t,o,h,l,c,v=synth_candles(bars,i)
+            rows[s]=[[int(t[k]),*(f"{x[k]:.6f}" for x in (o,h,l,c,v)),int(t[k])+299999,"0",0,"0","0","0"] for k in range(bars)]
+        t0=rows[syms[0]][120][0]/1000
+        w=lambda p,q,b,t=t0: f.write(json.dumps({'t':t,'k':'rest','p':p,'q':q,'b':b})+'\n')
+        w('/fapi/v1/exchangeInfo',{},{'symbols':[{'symbol':s,'contractType':'PERPETUAL','status':'TRADING'} for s in syms]})
+        w('/fapi/v1/ticker/24hr',{},[{'symbol':s,'lastPrice':r[120][4],'priceChangePercent':'0','volume':'1','highPrice':'1',
+                                      'lowPrice':'1','quoteVolume':'1','openPrice':'1','count':1} for s,r in rows.items()])
+        w('/fapi/v1/ticker/price',{},[{'symbol':s,'price':r[120][4]} for s,r in rows.items()])
+        for s,r in rows.items():
+            q={'symbol':s,'interval':'5m'}; w('/fapi/v1/klines',dict(q,limit=121),r[:121])
+            for k in range(121,bars): w('/fapi/v1/klines',dict(q,limit=99,startTime=r[k-1][0]),r[k-1:k+1],r[k][0]/1000)
+    return t0
+
+def bench_shard(n_symbols,scans,workers,ta):
+    # Tüm evrenin taranması (tazeleme + analiz + karar) süreç içi vs N işçi süreç; her taramada
+    # sanal saat bir mum ilerler, eşik yüksek tutulur (pozisyon açılmaz, tüm semboller analiz edilir)
+    with tempfile.TemporaryDirectory() as d:
+        path=os.path.join(d,'replay.jsonl.gz'); t0=_write_replay(path,n_symbols,120+scans+2)
+        print(f"{n_symbols} sembol x {scans} tarama, ta_engine={ta} ({os.cpu_count()} çekirdek)")
+        if max(workers,default=0)>(os.cpu_count() or 1):
+            print("  ! işçi sayısı çekirdek sayısını aşıyor: süreçler çekirdek paylaşır, bu ölçüm çok çekirdekli\n"
+                  "    ölçeklemeyi göstermez (sadece dilimleme/IPC maliyetini); ölçekleme için yeterli çekirdekte çalıştırın")
+        base=None
+        for w in [0]+workers:
+            with contextlib.redirect_stdout(io.StringIO()):
+                bc=bot.ReplayClient(path); bc.clock=bot.ManualClock(t0)
+                e=bot.ShardedEngine(bc,0,persist=False,shards=w,replay=path) if w else bot.Engine(bc,0,persist=False)
+                e.agent.risk.update(scan_mode='random',scan_size=n_symbols,min_score=99,ta_engine=ta,tick_budget_ms=10**9)
+                e.sched.begin(); e._scan(e.agent,n_symbols); e.sched.end()  # ilk tam pencere (ısınma)
+                t1=time.perf_counter()
+                for k in range(scans):
+                    bc.clock.t+=300; e.sched.begin(); e._scan(e.agent,n_symbols); e.sched.end()
+                el=time.perf_counter()-t1
+                if w: e.close()
+            base=base or el
+            print(f"  {'süreç içi' if not w else f'{w} işçi':>9} | {el/scans*1000:7.1f} ms/tarama | "
+                  f"{n_symbols*scans/el:8,.0f} sembol/s | x{base/el:.2f}")
+
+def main():
+    ap=argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub=ap.add_subparsers(dest='cmd',required=True)
+    p=sub.add_parser('prefetch',help='sıralı vs paralel kline tazeleme')
+    p.add_argument('--symbols',type=int,default=20); p.add_argument('--latency',type=float,default=0.15)
+    p=sub.add_parser('refresh',help='ticker tazeleme maliyeti / evren büyüklüğü')
+    p.add_argument('--sizes',default='100,200,400,800,1600')
+    p=sub.add_parser('backtest',help='sentetik veride yıllık backtest süresi')
+    p.add_argument('--symbols',type=int,default=100); p.add_argument('--days',type=int,default=365)
+    p=sub.add_parser('sweep',help='optimizer verimi / işçi sayısı')
+    p.add_argument('--symbols',type=int,default=20); p.add_argument('--days',type=int,default=90)
+    p.add_argument('--configs',type=int,default=16); p.add_argument('--workers',default='1,2,4,8')
+    p=sub.add_parser('montecarlo',help='Monte Carlo yol simülasyonu süresi')
+    p.add_argument('--trades',type=int,default=10000); p.add_argument('--paths',type=int,default=50000)
+    p=sub.add_parser('journal',help='journal yazma maliyeti ve kurtarma süresi')
+    p.add_argument('--trades',type=int,default=100_000)
+    p=sub.add_parser('memory',help='uzun koşuda bellek kullanımı (all_trades/history)')
+    p.add_argument('--trades',type=int,default=1_000_000); p.add_argument('--every',type=int,default=100_000)
+    p=sub.add_parser('shard',help='çok süreçli sembol bölümleme: tarama verimi / işçi sayısı (replay)')
+    p.add_argument('--symbols',type=int,default=400); p.add_argument('--scans',type=int,default=10)
+    p.add_argument('--workers',default='1,2,4'); p.add_argument('--ta',default='incremental',choices=('incremental','numpy','python'))
+    a=ap.parse_args()
+    if a.cmd=='prefetch': bench_prefetch(a.symbols,a.latency)
+    elif a.cmd=='refresh': bench_refresh([int(x) for x in a.sizes.split(',')])
+    elif a.cmd=='backtest': bench_backtest(a.symbols,a.days)
+    elif a.cmd=='sweep': bench_sweep(a.symbols,a.days,a.configs,[int(x) for x in a.workers.split(',')])
+    elif a.cmd=='montecarlo': bench_montecarlo(a.trades,a.paths)
+    elif a.cmd=='memory': bench_memory(a.trades,a.every)
+    elif a.cmd=='journal': bench_journal(a.trades)
+    elif a.cmd=='shard': bench_shard(a.symbols,a.scans,[int(x) for x in a.workers.split(',')],a.ta)
+
+if __name__=='__main__': main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Trading Bot v5 — Monte Carlo robustness of a closed-trade sequence.
+
+Kullanım:  python montecarlo.py TRADES [--paths 50000] [--method bootstrap|block|shuffle] [--block 20]
+                               [--limit 0.20] [--balance 10000] [--seed 0] [--json]
+           TRADES: backtest.py --trades CSV'si ya da işlem sözlüklerinin JSON listesi (pnl alanı)
+
+İşlemler, kapanıştan önceki bakiyeye göre getiriye çevrilir ve log-getiri
+olarak yeniden örneklenir; her yol için bileşik son getiri ve maksimum
+düşüş tek geçişte (kümülatif toplam + koşan tepe) hesaplanır. Yollar bellek
+sınırlı parçalar halinde ve iş parçacıklarında işlenir (NumPy GIL'i bırakır);
+her işlem adımı, parçadaki tüm yolları bitişik float32 vektörlerle ilerletir.
+
+  bootstrap: iade ile bağımsız örnekleme
+  block:     dairesel blok bootstrap (seri kazanç/kayıpları korur)
+  shuffle:   aynı işlemlerin permütasyonu (son getiri sabit, sadece sıra riski)
+
+Batma olasılığı: yolun herhangi bir anda max_drawdown_limit'e (RiskManager
+varsayılanı %20) ulaşma oranı.
+"""
+
+import argparse, csv, json, os, time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+MAX_DRAWDOWN_LIMIT=0.20   # RiskManager(max_drawdown_limit=0.20)
+CHUNK_PATHS=16384         # iş parçacığı başına yol (durum vektörleri L2'de kalır)
+CHUNK_ELEMS=8_000_000     # shuffle permütasyon matrisi sınırı (int32: ~32 MB)
+BLOCK_ELEMS=262_144       # bir seferde üretilen indeks bloğu (int32: 1 MB)
+PCTS=(1,5,25,50,75,95,99)
+
+def trade_pnls(trades):
+    # Trade nesneleri (trading_bot_improvements) ya da pnl alanlı sözlükler
+    return np.array([float(t['pnl'] if isinstance(t,dict) else t.pnl) for t in trades],float)
+
+def load_trades(path):
+    if path.endswith('.json'):
+        with open(path) as f: data=json.load(f)
+        return trade_pnls(data.get('trades',data) if isinstance(data,dict) else data)
+    with open(path,newline='') as f: return np.array([float(r['pnl']) for r in csv.DictReader(f)],float)
+
+def returns(pnl,balance):
+    # $ pnl -> kapanıştan önceki bakiyeye göre oran (sıralı bileşik)
+    eq=balance+np.concatenate(([0.0],np.cumsum(pnl)[:-1]))
+    with np.errstate(divide='ignore',invalid='ignore'):
+        return np.where(eq>0,pnl/eq,-1.0)
+
+def _index_blocks(rng,n,paths,method,block,K):
+    # (K adım x yol) int32 işlem indeksleri; sütun düzeni her adımı bitişik bir vektör yapar
+    if method=='bootstrap':
+        for k in range(0,n,K): yield rng.integers(0,n,size=(min(K,n-k),paths),dtype=np.int32)
+    elif method=='block':
+        L=max(1,min(block,n)); pos=np.empty(paths,np.int32)
+        for k in range(0,n,K):
+            out=np.empty((min(K,n-k),paths),np.int32)
+            for j in range(len(out)):
+                if (k+j)%L==0: pos[:]=rng.integers(0,n,size=paths,dtype=np.int32)
+                else: pos+=1; pos[pos==n]=0
+                out[j]=pos
+            yield out
+    else:  # shuffle: yol başına permütasyon
+        perm=rng.permuted(np.broadcast_to(np.arange(n,dtype=np.int32),(paths,n)),axis=1)
+        for k in range(0,n,K): yield np.ascontiguousarray(perm[:,k:k+K].T)
+
+def walk(lr,blocks,paths):
+    """Log-getiri yürüyüşü -> (son getiri, maksimum düşüş) oranları; tepe başlangıç bakiyesini de kapsar."""
+    cum=np.zeros(paths,np.float32); peak=np.zeros(paths,np.float32)
+    dd=np.zeros(paths,np.float32); x=np.empty(paths,np.float32)
+    for ix in blocks:
+        for row in ix:
+            np.take(lr,row,out=x); cum+=x
+            np.maximum(peak,cum,out=peak); np.subtract(peak,cum,out=x); np.maximum(dd,x,out=dd)
+    return np.expm1(cum).astype(float),(-np.expm1(-dd)).astype(float)
+
+def simulate(pnl,balance=10000.0,paths=50000,method='bootstrap',block=20,limit=MAX_DRAWDOWN_LIMIT,seed=0,threads=None):
+    pnl=np.asarray(pnl,float)
+    if len(pnl)<2: raise ValueError("Monte Carlo icin en az 2 kapanmis islem gerekli")
+    if method not in ('bootstrap','block','shuffle'): raise ValueError(f"bilinmeyen yontem: {method}")
+    if paths<1 or block<1: raise ValueError(f"paths ve block en az 1 olmali (paths={paths}, block={block})")
+    t0=time.perf_counter()
+    r=returns(pnl,balance)
+    lr=np.log1p(np.maximum(r,-0.999999)).astype(np.float32)  # bakiyeyi tamamen sıfırlayan işlem ~ -%100
+    n=len(lr)
+    rows=min(CHUNK_PATHS,max(1,CHUNK_ELEMS//n)) if method=='shuffle' else CHUNK_PATHS
+    chunks=[(i,min(rows,paths-i)) for i in range(0,paths,rows)]
+    seqs=np.random.SeedSequence(seed).spawn(len(chunks))
+    fin=np.empty(paths); dd=np.empty(paths)
+    def work(k):
+        i,m=chunks[k]; K=max(1,BLOCK_ELEMS//m)
+        fin[i:i+m],dd[i:i+m]=walk(lr,_index_blocks(np.random.default_rng(seqs[k]),n,m,method,block,K),m)
+    threads=threads or min(len(chunks),os.cpu_count() or 1)
+    if threads>1:
+        with ThreadPoolExecutor(threads) as ex: list(ex.map(work,range(len(chunks))))
+    else:
+        for k in range(len(chunks)): work(k)
+    af,add=walk(lr,[np.arange(n,dtype=np.int32)[:,None]],1)
+    pct=lambda x: {f"p{q}":round(float(v)*100,2) for q,v in zip(PCTS,np.percentile(x,PCTS))}
+    return dict(trades=n,paths=paths,method=method,block=block if method=='block' else None,
+                balance=balance,limit_pct=round(limit*100,2),
+                actual=dict(return_pct=round(float(af[0])*100,2),max_drawdown_pct=round(float(add[0])*100,2)),
+                return_pct=pct(fin),max_drawdown_pct=pct(dd),
+                mean_return_pct=round(float(fin.mean())*100,2),
+                prob_loss=round(float((fin<0).mean()),4),
+                prob_ruin=round(float((dd>=limit).mean()),4),
+                elapsed_s=round(time.perf_counter()-t0,3))
+
+def main():
+    ap=argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('trades')
+    ap.add_argument('--paths',type=int,default=50000)
+    ap.add_argument('--method',default='bootstrap',choices=('bootstrap','block','shuffle'))
+    ap.add_argument('--block',type=int,default=20)
+    ap.add_argument('--limit',type=float,default=MAX_DRAWDOWN_LIMIT,help='batma eşiği: maksimum düşüş oranı')
+    ap.add_argument('--balance',type=float,default=10000); ap.add_argument('--seed',type=int,default=0)
+    ap.add_argument('--json',action='store_true')
+    a=ap.parse_args()
+    res=simulate(load_trades(a.trades),a.balance,a.paths,a.method,a.block,a.limit,a.seed)
+    if a.json: print(json.dumps(res,indent=2)); return
+    print(f"{res['trades']} işlem x {res['paths']:,} yol ({res['method']}) | {res['elapsed_s']}s")
+    print(f"Gerçek sıra: getiri {res['actual']['return_pct']}% | maks. düşüş {res['actual']['max_drawdown_pct']}%")
+    print(f"{'':>16}"+''.join(f"{k:>9}" for k in res['return_pct']))
+    for name in ('return_pct','max_drawdown_pct'):
+        print(f"{name:>16}"+''.join(f"{v:>9}" for v in res[name].values()))
+    print(f"Zarar olasılığı {res['prob_loss']*100:.1f}% | batma (düşüş >= %{res['limit_pct']:g}) {res['prob_ruin']*100:.2f}%")
+
+if __name__=='__main__': main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""Trading Bot v5 — parallel Agent.risk sweep on historical candles (StrategyOptimizer).
+
+Kullanım:  python optimizer.py DATA_DIR [--grid '{"tp_pct":[1.5,2,3],"sl_pct":[0.6,0.8,1.2]}']
+                                        [--random 200 --space '{"tp_pct":{"min":1,"max":4},"min_score":[3,4,5]}']
+                                        [--workers 8] [--start 2024-01-01] [--end 2025-01-01]
+                                        [--rank net_pnl] [--out sweep.csv]
+           python optimizer.py DATA_DIR --walk-forward [--is-days 60 --oos-days 14 --step-days 14]
+                                        [--memo wf_cache] [--out walkforward.csv] [--equity wf_equity.csv]
+
+Mum verisi ve parametreden bağımsız gösterge özellikleri (backtest.features:
+skor, ATR %, giriş kapıları) bir kez hesaplanır ve işçilere shared_memory
+ile kopyasız açılır; her işçi süreç başına bir kez bağlanır ve sadece
+konfigürasyon sözlüğü alıp özet sözlüğü döndürür. Konfigürasyonlar
+birbirinden bağımsız olduğu için verim çekirdek sayısıyla doğrusal ölçeklenir.
+
+Walk-forward: tarih aralığı kayan in-sample/out-of-sample pencerelere
+bölünür; her katmanın IS en iyisi OOS'ta çalıştırılır ve OOS sonuçları
+bileşik tek bir özsermaye eğrisine dikilir (karşılaştırma için mevcut
+varsayılan eşikler de aynı OOS pencerelerinde koşulur). Tüm katmanlar aynı
+anda havuza verilir; her (pencere, efektif risk, veri parmak izi) sonucu
+diskte saklandığından aralık uzatıldığında sadece yeni katmanlar hesaplanır.
+"""
+
+import argparse, csv, hashlib, itertools, json, os, random, time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import backtest
+import trading_bot_v5 as bot
+
+# Varsayılan arama uzayı: liste = ayrık seçenekler, {"min","max"} = aralık (sadece random)
+DEFAULT_SPACE={
+    'tp_pct':[1.0,1.5,2.0,3.0],'sl_pct':[0.5,0.8,1.2],
+    'min_score':[3,4,5],'min_conf':[40,50,60],'max_atr_pct':[3,6],
+    'smart_exit_score':[-2,-3,-4],'max_pnl_drawdown':[0.3,0.5,0.7],
+    'loss_cut_pct':[1.5,2.0,3.0],'sl_near_pct':[15,25,35],
+}
+SUMMARY_KEYS=('trades','wr','net_pnl','return_pct','profit_factor','max_drawdown_pct','avg_pnl','commission','avg_bars')
+MEMO_VERSION=1   # backtest/Agent kuralları değişirse artır: eski katman sonuçları geçersiz olur
+DAY_MS=86400000
+
+# ── SHARED MARKET ──────────────────────────────────────────
+class SharedMarket:
+    """backtest.Market'in alan başına tek bir SharedMemory bloğunda düz hali.
+
+    Sembol i'nin barları her alanda [off[i], off[i+1]) aralığındadır. Blokları
+    oluşturan süreç siler; havuz işçileri meta sözlüğüyle adına göre bağlanır
+    (aynı resource_tracker'ı paylaştıkları için işçi çıkışı bloğu silmez).
+    """
+    def __init__(self,meta,shm=None):
+        self.meta=meta; self.owner=shm is not None; cols={}
+        self.shm=shm or {k:shared_memory.SharedMemory(name=meta['names'][k]) for k,_ in backtest.Market.FIELDS}
+        off=meta['off']
+        for k,dt in backtest.Market.FIELDS:
+            a=np.ndarray((off[-1],),dtype=dt,buffer=self.shm[k].buf)
+            cols[k]=[a[off[i]:off[i+1]] for i in range(len(meta['symbols']))]
+        self.market=backtest.Market(meta['symbols'],cols)
+
+    @classmethod
+    def create(cls,data_dir,symbols,pool,workers):
+        symbols=sorted(symbols or backtest.list_symbols(data_dir))
+        lens=[]
+        for s in symbols:
+            with np.load(os.path.join(data_dir,f"{s}.npz")) as z: lens.append(len(z['t']))
+        off=np.concatenate(([0],np.cumsum(lens))).astype(int).tolist()
+        shm={k:shared_memory.SharedMemory(create=True,size=max(off[-1]*np.dtype(dt).itemsize,1))
+             for k,dt in backtest.Market.FIELDS}
+        meta=dict(data_dir=data_dir,symbols=symbols,off=off,names={k:m.name for k,m in shm.items()})
+        sm=cls(meta,shm)
+        # Özellik hesabı da işçilere dağıtılır; her işçi kendi sembollerini bloğa yazar
+        jobs=[(meta,i) for i in range(len(symbols))]
+        for _ in pool.map(_fill,jobs,chunksize=max(1,len(jobs)//(4*workers))): pass
+        return sm
+
+    def close(self):
+        self.market=None
+        for m in self.shm.values():
+            m.close()
+            if self.owner:
+                try: m.unlink()
+                except FileNotFoundError: pass
+        self.shm={}
+
+# ── WORKERS ────────────────────────────────────────────────
+_W={}  # işçi süreci: meta adı -> SharedMarket
+
+def _shared(meta):
+    key=meta['names']['t']
+    sm=_W.get(key)
+    if sm is None: sm=_W[key]=SharedMarket(meta)
+    return sm
+
+def _fill(job):
+    meta,i=job; sm=_shared(meta); cols=sm.market.cols
+    vals=backtest.featurize(os.path.join(meta['data_dir'],f"{meta['symbols'][i]}.npz"))
+    for (k,_),a in zip(backtest.Market.FIELDS,vals): cols[k][i][:]=a
+    return i
+
+def _evaluate(job):
+    meta,cfg,opts=job[:3]; memo=job[3] if len(job)>3 else None
+    t0=time.perf_counter()
+    res=backtest.Backtester(_shared(meta).market,risk=cfg,**opts).run(verbose=False)
+    s=res.summary()
+    out={k:s[k] for k in SUMMARY_KEYS}; out['elapsed_s']=round(time.perf_counter()-t0,2); out['pid']=os.getpid()
+    if memo:
+        # (path, equity isteniyor mu): sonuç diske, atomik olarak
+        path,want_eq=memo
+        if want_eq: out['equity']=[[int(t),round(float(b),2)] for t,b in zip(res.eq_t,res.eq)]
+        tmp=f"{path}.{os.getpid()}.tmp"
+        with open(tmp,'w') as f: json.dump(out,f)
+        os.replace(tmp,path)
+    return cfg,out
+
+# ── OPTIMIZER ──────────────────────────────────────────────
+class StrategyOptimizer:
+    """Agent.risk konfigürasyonlarını süreç havuzunda paralel backtest eder.
+
+    opt=StrategyOptimizer('data/',workers=8)
+    rows=opt.run(opt.grid({'tp_pct':[1,2,3],'sl_pct':[0.5,1]}),rank='net_pnl',out='sweep.csv')
+    """
+    def __init__(self,data_dir,symbols=None,workers=None,seed=0,start=None,end=None,balance=10000.0,base=None):
+        self.workers=workers or os.cpu_count() or 1
+        self.pool=ProcessPoolExecutor(max_workers=self.workers)
+        self.opts=dict(seed=seed,start=start,end=end,balance=balance)
+        self.base=dict(base or {})
+        t0=time.perf_counter()
+        self.shared=SharedMarket.create(data_dir,symbols,self.pool,self.workers)
+        self.prep_s=time.perf_counter()-t0
+        print(f"✓ {len(self.shared.market)} sembol, {self.shared.meta['off'][-1]:,} mum hazır "
+              f"({self.prep_s:.1f}s, {self.workers} işçi)")
+
+    def __enter__(self): return self
+    def __exit__(self,*a): self.close()
+
+    def close(self):
+        self.pool.shutdown(); self.shared.close()
+
+    @staticmethod
+    def grid(space):
+        keys=list(space)
+        return [dict(zip(keys,vals)) for vals in itertools.product(*(space[k] for k in keys))]
+
+    @staticmethod
+    def sample(space,n,seed=0):
+        rng=random.Random(seed); out=[]
+        for _ in range(n):
+            cfg={}
+            for k,v in space.items():
+                if isinstance(v,dict):
+                    lo,hi=v['min'],v['max']
+                    cfg[k]=rng.randint(lo,hi) if isinstance(lo,int) and isinstance(hi,int) else round(rng.uniform(lo,hi),4)
+                else: cfg[k]=rng.choice(v)
+            out.append(cfg)
+        return out
+
+    def run(self,configs,rank='net_pnl',out=None,verbose=True):
+        # rank: özet alanı, büyük olan iyi; '-' önekiyle küçük olan iyi (örn. '-max_drawdown_pct')
+        meta=self.shared.meta; rows=[]; t0=time.perf_counter()
+        jobs=[(meta,{**self.base,**cfg},self.opts) for cfg in configs]
+        for i,(cfg,res) in enumerate(self.pool.map(_evaluate,jobs),1):
+            rows.append(dict(params=cfg,**res))
+            if verbose and (i%max(1,len(jobs)//10)==0 or i==len(jobs)):
+                el=time.perf_counter()-t0
+                print(f"  {i}/{len(jobs)} konfigürasyon | {el:.1f}s | {i/el:.2f} konf/s")
+        key=rank.lstrip('-'); sign=1 if rank.startswith('-') else -1
+        rows.sort(key=lambda r: sign*r[key])
+        for i,r in enumerate(rows,1): r['rank']=i
+        self.elapsed_s=time.perf_counter()-t0
+        if out: self.save(rows,out)
+        return rows
+
+    # ── WALK-FORWARD ───────────────────────────────────────
+    def folds(self,is_days=60,oos_days=14,step_days=None):
+        # Günlere hizalı (UTC) sabit çapa: aralık sona doğru uzatılınca eski katmanlar aynı kalır.
+        # Sadece OOS penceresi tamamen veri içinde kalan katmanlar alınır.
+        ts=[t for t in self.shared.market.cols['t'] if len(t)]
+        if not ts: return []
+        lo=self.opts['start'] or min(int(t[0]) for t in ts); lo-=lo%DAY_MS
+        hi=self.opts['end'] or max(int(t[-1]) for t in ts)+1
+        step=(step_days or oos_days)*DAY_MS; out=[]; a=lo
+        while a+(is_days+oos_days)*DAY_MS<=hi:
+            m=a+is_days*DAY_MS
+            out.append(dict(fold=len(out)+1,is_a=a,is_b=m,oos_a=m,oos_b=m+oos_days*DAY_MS)); a+=step
+        return out
+
+    def _fingerprint(self,a,b):
+        # Penceredeki veri: bar sayısı + kapanış toplamı (yeniden import edilen veri anahtarı değiştirir)
+        cols=self.shared.market.cols; n=0; tot=0.0
+        for t,c in zip(cols['t'],cols['c']):
+            i,j=np.searchsorted(t,[a,b]); n+=int(j-i); tot+=float(c[i:j].sum())
+        return f"{n}:{tot:.6f}"
+
+    def _batch(self,items,memo_dir,verbose=True):
+        # items: (a, b, cfg, equity?) -> sonuç listesi; disk memosu varsa havuza gitmez
+        os.makedirs(memo_dir,exist_ok=True)
+        meta=self.shared.meta; risk0=bot.Agent(backtest._Tape()).risk
+        out=[None]*len(items); jobs=[]; idx=[]; fps={}
+        for i,(a,b,cfg,eq) in enumerate(items):
+            if (a,b) not in fps: fps[(a,b)]=self._fingerprint(a,b)
+            src=dict(v=MEMO_VERSION,a=a,b=b,risk={**risk0,**self.base,**cfg},seed=self.opts['seed'],
+                     balance=self.opts['balance'],symbols=meta['symbols'],data=fps[(a,b)])
+            key=hashlib.sha1(json.dumps(src,sort_keys=True).encode()).hexdigest()
+            path=os.path.join(memo_dir,f"{key}.json")
+            try:
+                with open(path) as f: r=json.load(f)
+                if not eq or 'equity' in r: out[i]=r; continue
+            except (OSError,ValueError): pass
+            jobs.append((meta,{**self.base,**cfg},dict(self.opts,start=a,end=b),(path,eq))); idx.append(i)
+        if verbose: print(f"  {len(items)} pencere x konfigürasyon: {len(items)-len(jobs)} diskten, {len(jobs)} hesaplanacak")
+        t0=time.perf_counter()
+        for n,(i,(cfg,r)) in enumerate(zip(idx,self.pool.map(_evaluate,jobs)),1):
+            out[i]=r
+            if verbose and (n%max(1,len(jobs)//10)==0 or n==len(jobs)):
+                el=time.perf_counter()-t0; print(f"  {n}/{len(jobs)} | {el:.1f}s | {n/el:.2f} iş/s")
+        return out
+
+    def walk_forward(self,configs,is_days=60,oos_days=14,step_days=None,rank='net_pnl',memo_dir='wf_cache',
+                     out=None,equity=None,verbose=True):
+        folds=self.folds(is_days,oos_days,step_days)
+        if not folds: raise ValueError("walk-forward icin veri araligi yetersiz")
+        key=rank.lstrip('-'); sign=1 if rank.startswith('-') else -1
+        t0=time.perf_counter()
+        # 1. In-sample: tüm katmanlar x konfigürasyonlar tek seferde (katmanlar eşzamanlı)
+        if verbose: print(f"Walk-forward: {len(folds)} katman, IS {is_days}g / OOS {oos_days}g, {len(configs)} konfigürasyon")
+        res=self._batch([(f['is_a'],f['is_b'],cfg,False) for f in folds for cfg in configs],memo_dir,verbose)
+        n=len(configs)
+        for k,f in enumerate(folds):
+            rs=res[k*n:(k+1)*n]; j=min(range(n),key=lambda i: sign*rs[i][key])
+            f['params']=configs[j]; f['is']={x:rs[j][x] for x in SUMMARY_KEYS}
+        # 2. Out-of-sample: katmanın en iyisi ve varsayılan eşikler
+        oos=self._batch([(f['oos_a'],f['oos_b'],cfg,True) for f in folds for cfg in (f['params'],{})],memo_dir,verbose)
+        for k,f in enumerate(folds): f['oos'],f['default']=oos[2*k],oos[2*k+1]
+        # 3. OOS eğrilerini bileşik olarak dik
+        bal=self.opts['balance']; curves={}
+        for name in ('oos','default'):
+            e=bal; ct=[folds[0]['oos_a']]; ce=[bal]
+            for f in folds:
+                eq=f[name]['equity']; base=e
+                for t,b in eq[1:]: e=base*b/bal; ct.append(t); ce.append(round(e,2))
+            curves[name]=(ct,ce)
+        def stats(ce):
+            ce=np.asarray(ce,float); peak=np.maximum.accumulate(ce)
+            return dict(final=round(float(ce[-1]),2),return_pct=round((ce[-1]/bal-1)*100,2),
+                        max_drawdown_pct=round(float(((peak-ce)/peak).max()*100),2))
+        is_d=np.mean([f['is']['return_pct'] for f in folds])/is_days
+        oos_d=np.mean([f['oos']['return_pct'] for f in folds])/oos_days
+        summary=dict(folds=len(folds),optimized=stats(curves['oos'][1]),defaults=stats(curves['default'][1]),
+                     oos_trades=sum(f['oos']['trades'] for f in folds),
+                     wf_efficiency=round(float(oos_d/is_d),3) if is_d else None,
+                     elapsed_s=round(time.perf_counter()-t0,1))
+        if out: self.save_folds(folds,out)
+        if equity:
+            with open(equity,'w',newline='') as fh:
+                w=csv.writer(fh); w.writerow(['curve','t','balance'])
+                for name,(ct,ce) in curves.items(): w.writerows([name,t,b] for t,b in zip(ct,ce))
+        return dict(folds=folds,curves=curves,summary=summary)
+
+    @staticmethod
+    def save_folds(folds,path):
+        fmt=lambda ms: time.strftime('%Y-%m-%d',time.gmtime(ms/1000))
+        pk=list(dict.fromkeys(k for f in folds for k in f['params']))
+        cols=('trades','wr','net_pnl','return_pct','profit_factor','max_drawdown_pct')
+        with open(path,'w',newline='') as fh:
+            w=csv.writer(fh)
+            w.writerow(['fold','is_start','oos_start','oos_end']+pk+[f"is_{c}" for c in cols]+
+                       [f"oos_{c}" for c in cols]+[f"default_{c}" for c in cols])
+            for f in folds:
+                w.writerow([f['fold'],fmt(f['is_a']),fmt(f['oos_a']),fmt(f['oos_b'])]+[f['params'].get(k,'') for k in pk]+
+                           [f['is'][c] for c in cols]+[f['oos'][c] for c in cols]+[f['default'][c] for c in cols])
+
+    @staticmethod
+    def save(rows,path):
+        pk=list(dict.fromkeys(k for r in rows for k in r['params']))
+        with open(path,'w',newline='') as f:
+            w=csv.writer(f); w.writerow(['rank']+pk+list(SUMMARY_KEYS))
+            for r in rows: w.writerow([r['rank']]+[r['params'].get(k,'') for k in pk]+[r[k] for k in SUMMARY_KEYS])
+
+# ── CLI ────────────────────────────────────────────────────
+def main():
+    ap=argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('data'); ap.add_argument('--symbols',default='')
+    ap.add_argument('--grid',default='',help='JSON: parametre -> değer listesi (kartezyen çarpım)')
+    ap.add_argument('--space',default='',help='JSON: random arama uzayı (liste ya da {"min","max"})')
+    ap.add_argument('--random',type=int,default=0,help='random aramada konfigürasyon sayısı')
+    ap.add_argument('--workers',type=int,default=0); ap.add_argument('--seed',type=int,default=0)
+    ap.add_argument('--start',default=''); ap.add_argument('--end',default='')
+    ap.add_argument('--rank',default='net_pnl'); ap.add_argument('--out',default='sweep.csv')
+    ap.add_argument('--top',type=int,default=10)
+    ap.add_argument('--walk-forward',action='store_true')
+    ap.add_argument('--is-days',type=int,default=60); ap.add_argument('--oos-days',type=int,default=14)
+    ap.add_argument('--step-days',type=int,default=0); ap.add_argument('--memo',default='wf_cache')
+    ap.add_argument('--equity',default='')
+    a=ap.parse_args()
+    with StrategyOptimizer(a.data,[s for s in a.symbols.split(',') if s] or None,a.workers or None,a.seed,
+                           backtest._ms(a.start),backtest._ms(a.end)) as opt:
+        if a.random: cfgs=opt.sample(json.loads(a.space) if a.space else DEFAULT_SPACE,a.random,a.seed)
+        else: cfgs=opt.grid(json.loads(a.grid) if a.grid else {k:v for k,v in DEFAULT_SPACE.items() if k in ('tp_pct','sl_pct','min_score')})
+        if a.walk_forward:
+            out=a.out if a.out!='sweep.csv' else 'walkforward.csv'
+            wf=opt.walk_forward(cfgs,a.is_days,a.oos_days,a.step_days or None,a.rank,a.memo,out,a.equity or None)
+            for f in wf['folds']:
+                print(f"#{f['fold']:<3} OOS {f['oos']['net_pnl']:>9} (varsayılan {f['default']['net_pnl']:>9}) | "
+                      f"IS {f['is'][a.rank.lstrip('-')]} | {json.dumps(f['params'])}")
+            print(json.dumps(wf['summary'],indent=2,ensure_ascii=False)); print(f"-> {out}")
+            return
+        rows=opt.run(cfgs,a.rank,a.out)
+    print(f"\n{len(rows)} konfigürasyon -> {a.out} (sıralama: {a.rank})")
+    for r in rows[:a.top]:
+        print(f"#{r['rank']:<3} {r[a.rank.lstrip('-')]:>10} | {r['trades']} işlem, WR {r['wr']}%, PF {r['profit_factor']}, "
+              f"DD {r['max_drawdown_pct']}% | {json.dumps(r['params'])}")
+
+if __name__=='__main__': main()
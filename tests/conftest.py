@@ -0,0 +1,52 @@
+import contextlib, gzip, io, json, os, sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import trading_bot_v5 as bot
+
+def _candles(n,seed,iv=300000):
+    # Rejim değiştiren volatilite + ara sıra şok/hacim patlaması olan rastgele yürüyüş
+    r=np.random.default_rng(seed); t=1_700_000_000_000+np.arange(n,dtype=np.int64)*iv
+    vol=0.002*(1+np.abs(np.sin(np.arange(n)/500)))*np.where(r.random(n)<0.02,4,1)
+    c=100*np.exp(np.cumsum(r.normal(0,vol)))
+    o=np.r_[c[0],c[:-1]]; h=np.maximum(o,c)*(1+r.random(n)*0.002); l=np.minimum(o,c)*(1-r.random(n)*0.002)
+    v=r.lognormal(3,0.6,n)*np.where(r.random(n)<0.03,5,1)
+    return t,o,h,l,c,v
+
+def write_replay(path,n_symbols,bars):
+    # MarketRecorder biçiminde ağsız replay kaydı: evren + ticker + t0'a kadarki 121 mumluk tam
+    # pencere, ardından her mum kendi açılış anında kaydedilmiş artımlı bir yanıt (canlı kayıt gibi).
+    # t0 (121. mumun açılışı, s) döndürür
+    syms=[f"S{i:03d}USDT" for i in range(n_symbols)]
+    with gzip.open(path,'wt',encoding='utf-8') as f:
+        rows={}
+        for i,s in enumerate(syms):
+            t,o,h,l,c,v=_candles(bars,i)
+            rows[s]=[[int(t[k]),*(f"{x[k]:.6f}" for x in (o,h,l,c,v)),int(t[k])+299999,"0",0,"0","0","0"] for k in range(bars)]
+        t0=rows[syms[0]][120][0]/1000
+        w=lambda p,q,b,t=t0: f.write(json.dumps({'t':t,'k':'rest','p':p,'q':q,'b':b})+'\n')
+        w('/fapi/v1/exchangeInfo',{},{'symbols':[{'symbol':s,'contractType':'PERPETUAL','status':'TRADING'} for s in syms]})
+        w('/fapi/v1/ticker/24hr',{},[{'symbol':s,'lastPrice':r[120][4],'priceChangePercent':'0','volume':'1','highPrice':'1',
+                                      'lowPrice':'1','quoteVolume':'1','openPrice':'1','count':1} for s,r in rows.items()])
+        w('/fapi/v1/ticker/price',{},[{'symbol':s,'price':r[120][4]} for s,r in rows.items()])
+        for s,r in rows.items():
+            q={'symbol':s,'interval':'5m'}; w('/fapi/v1/klines',dict(q,limit=121),r[:121])
+            for k in range(121,bars): w('/fapi/v1/klines',dict(q,limit=99,startTime=r[k-1][0]),r[k-1:k+1],r[k][0]/1000)
+    return t0
+
+@pytest.fixture
+def replay_client(tmp_path):
+    # replay_client(n_symbols, bars, clock=ManualClock) -> t0'da duran ReplayClient;
+    # aynı boyutlar için kayıt bir kez yazılır (bc.path), her çağrı yeni istemci kurar
+    paths={}
+    def make(n_symbols,bars,clock=bot.ManualClock):
+        if (n_symbols,bars) not in paths:
+            p=str(tmp_path/f"rec_{n_symbols}_{bars}.jsonl.gz"); paths[n_symbols,bars]=(p,write_replay(p,n_symbols,bars))
+        path,t0=paths[n_symbols,bars]
+        with contextlib.redirect_stdout(io.StringIO()):
+            bc=bot.ReplayClient(path)
+        bc.clock=clock(t0); return bc
+    return make
@@ -0,0 +1,23 @@
+import contextlib, io
+
+import trading_bot_v5 as bot
+
+def test_batch_and_scalar_scans_agree_on_short_buffers(replay_client):
+    bc=replay_client(30,200)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ag=bot.Agent(bc,0,risk=dict(ta_engine='numpy',min_score=1,min_conf=0,max_atr_pct=100))
+    syms=list(bc.symbols); bc.prefetch(syms)
+    # Yeni listelenmiş semboller: MIN_CANDLES..49 mum (farklı uzunluklar) ve eşiğin altı
+    for k,n in zip(range(8),(35,36,40,40,44,49,34,20)):
+        t,o,h,l,c,v=bc.cached(syms[k]).view(n); b=bot.CandleBuffer(bc.KL_CAP)
+        for row in zip(t,o,h,l,c,v): b.put(*row)
+        bc._klines_cache[f"{syms[k]}_5m"]=b
+    batch={x['sym']:x['score'] for x in ag.analyze_batch(syms)}
+    scalar={}
+    for s in syms:
+        buf=bc.cached(s)
+        if len(buf)<ag.MIN_CANDLES: continue
+        a=ag._analyze(s,buf)
+        if a and abs(a['score'])>=1: scalar[s]=a['score']
+    assert batch==scalar
+    assert set(syms[:6])&set(batch) and not set(syms[6:8])&set(batch)
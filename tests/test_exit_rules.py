@@ -0,0 +1,15 @@
+import contextlib, io
+
+import trading_bot_v5 as bot
+
+def test_sl_near_cut_is_relative_to_entry_sl_distance(replay_client):
+    with contextlib.redirect_stdout(io.StringIO()):
+        ag=bot.Agent(replay_client(2,130),0)
+    E=100.0; tp,sl=ag.levels(E,3,'LONG')
+    pos=dict(type='LONG',entry=E,cur=E,tp=tp,sl=sl,sz=1000.0,lev=3,ticks=6,max_pnl=0.0,min_pnl=0.0)
+    reason=lambda p: ag.exit_reason(pos,p,*ag.quote(pos,p),lambda: 0)
+    # SL'ye giden yolun yarısı: normal bir zarar, kesilmez (eskiden her zararlı pozisyon kesiliyordu)
+    assert reason(E-(E-sl)*0.5) is None
+    assert reason(E-(E-sl)*0.8)=="Loss Cut: SL'ye cok yakin - erken kes"
+    lo,hi=ag.band(pos)  # sessiz bant aynı eşikte biter
+    assert reason(lo) is None and reason(lo-1e-6*E) is not None
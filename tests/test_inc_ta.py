@@ -0,0 +1,53 @@
+import numpy as np
+
+import trading_bot_v5 as bot
+
+TOL=1e-8  # göreli; kayan toplamlar RESYNC mumda bir baştan toplanır
+IV=300000
+
+def _candles(n,seed):
+    r=np.random.default_rng(seed); t=1_700_000_000_000+np.arange(n,dtype=np.int64)*IV
+    c=100*np.exp(np.cumsum(r.normal(0,0.004,n))); o=np.r_[c[0],c[:-1]]
+    h=np.maximum(o,c)*(1+r.random(n)*0.003); l=np.minimum(o,c)*(1-r.random(n)*0.003)
+    return t,o,h,l,c,r.lognormal(3,0.7,n)
+
+def _check(inc,buf):
+    # Agent._inc_indicators ile aynı yol: kapanmış mumları işle, oluşan mumu peek et
+    inc.sync(buf)
+    if not inc.ready(): return False
+    t,o,h,l,c,v=buf.view(80)
+    ref=bot.TA.indicators(h.tolist(),l.tolist(),c.tolist(),v.tolist())
+    got=inc.peek(float(h[-1]),float(l[-1]),float(c[-1]),float(v[-1]))
+    for k,x in ref.items():
+        assert abs(x-got[k])<=TOL*max(1.0,abs(x)),(k,int(t[-1]),x,got[k])
+    return True
+
+def test_one_candle_at_a_time_with_forming_updates():
+    t,o,h,l,c,v=_candles(700,1)
+    buf=bot.CandleBuffer(120); inc=bot.IncTA(); checked=0
+    for i in range(len(t)):
+        # Oluşan mum önce yarım, sonra kapanış değerleriyle gelir (aynı açılış zamanı)
+        mid=(o[i]+c[i])/2
+        buf.put(int(t[i]),o[i],max(o[i],mid),min(o[i],mid),mid,v[i]/2); checked+=_check(inc,buf)
+        buf.put(int(t[i]),o[i],h[i],l[i],c[i],v[i]); checked+=_check(inc,buf)
+    # Tampon birçok kez döndü (cap 120), RESYNC defalarca çalıştı
+    assert checked>2*(700-60) and inc.n>bot.IncTA.RESYNC*5
+
+def test_jumps_rebuild_and_replaced_buffer():
+    t,o,h,l,c,v=_candles(900,2)
+    buf=bot.CandleBuffer(500); inc=bot.IncTA(); i=0
+    for step in [1]*60+[3,7,1,20,1]+[bot.IncTA.REBUILD+40]+[1]*10+[2]*30:
+        for j in range(i,min(i+step,len(t))): buf.put(int(t[j]),o[j],h[j],l[j],c[j],v[j])
+        i+=step; _check(inc,buf)
+    # Tam pencere yeniden çekildi (yeni tampon, bir mum kayık): durum yeniden kurulur
+    nb=bot.CandleBuffer(500); k=i+1
+    for j in range(k-80,k): nb.put(int(t[j]),o[j],h[j],l[j],c[j],v[j])
+    assert _check(inc,nb)
+    for j in range(k,k+100):
+        nb.put(int(t[j]),o[j],h[j],l[j],c[j],v[j]); assert _check(inc,nb)
+
+def test_flat_prices():
+    buf=bot.CandleBuffer(500); inc=bot.IncTA()
+    for j in range(150):
+        buf.put(1_700_000_000_000+j*IV,5.0,5.0,5.0,5.0,1.0); _check(inc,buf)
+    assert inc.peek(5.0,5.0,5.0,1.0)['rsi']==100.0
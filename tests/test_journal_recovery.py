@@ -0,0 +1,86 @@
+import contextlib, io, json, os, shutil, signal, socket, subprocess, sys, threading, time, urllib.request
+
+import bench
+import trading_bot_v5 as bot
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class _TickClock(bot.ManualClock):
+    # Sanal zaman sabit (replay verisi bitmez), tick'ler gerçekten uyur
+    def sleep(self,s): time.sleep(0.02)
+
+def _crash_copy(paths,dst):
+    # Süreç ölmüş gibi: sadece o an diskte olanlar (tamponlar hariç) kopyalanır
+    os.makedirs(dst)
+    for p in paths:
+        for f in (p,p+'.snap.json',p+'.pnl.npy'):
+            if os.path.exists(f): shutil.copy(f,dst)
+    return [os.path.join(dst,os.path.basename(p)) for p in paths]
+
+def test_idle_ticks_make_journal_and_trade_log_durable(tmp_path,monkeypatch,replay_client):
+    monkeypatch.setattr(bot.Journal,'SYNC_S',0.05)
+    tl,jn=str(tmp_path/'trades.jsonl'),str(tmp_path/'journal.jsonl')
+    monkeypatch.setattr(bot.Engine,'TRADE_LOG',tl); monkeypatch.setattr(bot.Engine,'JOURNAL',jn)
+    bc=replay_client(5,130,_TickClock)
+    with contextlib.redirect_stdout(io.StringIO()):
+        e=bot.Engine(bc,0,agents={'main':{'min_score':99}})
+    th=threading.Thread(target=e.start,daemon=True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        th.start(); time.sleep(0.2)
+        ag=e.agent; s=bc.symbols[0]
+        with e._tick:  # motor iş parçacığı dışından: tick'ler arasında
+            ag.open(dict(sym=s,action='LONG',price=bc.price(s),lev=3,strat='Scalping',reasons=[],ind={},conf=80,score=5))
+            ag.close(s,'Manual')
+        time.sleep(0.3)  # yeni olay yok, birkaç boş tick
+        tl2,jn2=_crash_copy([tl,jn],str(tmp_path/'crash'))
+        try:
+            assert os.path.getsize(tl2)>0
+            ag2=bot.Agent(bc,0,trade_log=tl2,journal=jn2)
+            assert ag2.recovered and ag2.trades==1 and not ag2.positions and len(ag2.all_trades)==1
+            assert ag2.balance==ag.balance
+        finally:
+            e.stop(); th.join(5)
+
+def _free_port():
+    with socket.socket() as so: so.bind(('127.0.0.1',0)); return so.getsockname()[1]
+
+def test_sigterm_flushes_unsynced_events(tmp_path,monkeypatch):
+    monkeypatch.setattr(bot.BinanceClient,'BASE',bot.BinanceClient.BASE)
+    rest=bench.serve(['AUSDT','BUSDT']); port=_free_port(); jn=tmp_path/'journal.jsonl'
+    env=dict(os.environ,BINANCE_REST=bot.BinanceClient.BASE,BINANCE_WS=f"ws://127.0.0.1:{_free_port()}",PORT=str(port),
+             BOT_JOURNAL=str(jn),BOT_TRADE_LOG=str(tmp_path/'trades.jsonl'),BOT_SNAPSHOT=str(tmp_path/'snap.npz'))
+    pr=subprocess.Popen([sys.executable,os.path.join(ROOT,'trading_bot_v5.py')],env=env,cwd=str(tmp_path),
+                        stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+    try:
+        post=lambda b: urllib.request.urlopen(urllib.request.Request(f"http://127.0.0.1:{port}/api/risk",
+                                              data=json.dumps(b).encode(),method='POST'),timeout=5).read()
+        for _ in range(100):
+            try: post({'max_positions':3}); break
+            except OSError: time.sleep(0.1)
+        post({'max_positions':4})  # SYNC_S içinde: sadece tamponda
+        pr.send_signal(signal.SIGTERM); assert pr.wait(10)==0
+    finally:
+        if pr.poll() is None: pr.kill()
+        rest.shutdown()
+    ev=[json.loads(l) for l in jn.read_text().splitlines()]
+    assert [x['r']['max_positions'] for x in ev if x['e']=='r'][-1]==4
+    assert (tmp_path/'snap.npz').exists() and not (tmp_path/'snap.npz.tmp').exists()
+
+def test_stop_saves_snapshot_before_returning(replay_client):
+    bc=replay_client(2,130); saved=[]
+    with contextlib.redirect_stdout(io.StringIO()):
+        e=bot.Engine(bc,0,persist=False)
+        bc.save_snapshot=lambda: (time.sleep(0.1),saved.append(True))  # yavaş disk
+        e.stop()
+    assert saved  # çıkış hemen ardından gelir; arka plan thread'i öldürülürdü
+
+def test_trade_log_restart_without_journal_keeps_file(tmp_path):
+    p=str(tmp_path/'trades.jsonl')
+    tl=bot.TradeLog(p,keep=1)
+    for k in range(3): tl.append({'sym':'A','pnl':float(k)})
+    tl.close()
+    tl=bot.TradeLog(p,keep=1)  # journal'sız yeniden başlatma
+    for k in range(2): tl.append({'sym':'B','pnl':10.0+k})
+    assert [t['pnl'] for t in tl]==[10.0,11.0] and tl[0]['sym']=='B'  # bu çalıştırmanın kayıtları
+    tl.close()
+    with open(p) as f: assert len(f.readlines())==5
@@ -0,0 +1,28 @@
+import contextlib, io
+from types import SimpleNamespace
+
+import trading_bot_v5 as bot
+
+class StubRiskManager:
+    def __init__(self): self.calls=[]
+    def calculate_position_size(self,**kw):
+        self.calls.append(kw); return dict(size_usd=500.0,size_pct=5.0,risk_amount=10.0,method='kelly')
+    def calculate_portfolio_heat(self): return 0.0
+    def should_stop_trading(self): return False,''
+    def add_position(self,**kw): pass
+
+def test_kelly_sizing_reads_restored_dict_trades(replay_client,monkeypatch):
+    bc=replay_client(2,130)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ag=bot.Agent(bc,0)
+    monkeypatch.setattr(bot,'IMPROVEMENTS_ENABLED',True)
+    ag.risk_manager=rm=StubRiskManager()
+    # Journal/disk kurtarması dict döndürür; canlı kapanışlar Trade nesnesidir
+    for k in range(12): ag.all_trades.append({'sym':'S000USDT','pnl':30.0 if k%3 else -15.0})
+    for pnl in (20.0,-10.0): ag.all_trades.append(SimpleNamespace(sym='S001USDT',pnl=pnl))
+    s=bc.symbols[0]
+    with contextlib.redirect_stdout(io.StringIO()):
+        ag.open(dict(sym=s,action='LONG',price=bc.price(s),lev=3,strat='Scalping',reasons=[],ind={},conf=80,score=5))
+    kw=rm.calls[-1]
+    assert kw['win_rate']==9/14 and kw['avg_win']==(8*30+20)/9 and kw['avg_loss']==(4*15+10)/5
+    assert ag.positions[s]['sz']==500.0
@@ -0,0 +1,13 @@
+import pytest
+
+import montecarlo
+
+PNL=[120.0,-80.0,45.0,-30.0,200.0,-150.0,60.0]
+
+@pytest.mark.parametrize('kw',[dict(paths=0),dict(paths=-5),dict(method='block',block=0),dict(block=-1)])
+def test_simulate_rejects_empty_paths_and_blocks(kw):
+    with pytest.raises(ValueError): montecarlo.simulate(PNL,**kw)
+
+def test_simulate_single_path():
+    res=montecarlo.simulate(PNL,paths=1,method='block',block=3)
+    assert res['paths']==1 and res['block']==3
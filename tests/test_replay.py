@@ -0,0 +1,51 @@
+import contextlib, gzip, io, json
+
+import trading_bot_v5 as bot
+
+IV=300000
+T0=1_700_000_000  # kayıt başlangıcı (s); ilk tam pencerenin son mumu bu anda açılır
+
+def _row(t,c):
+    return [t,str(c),str(c+1),str(c-1),str(c),"10",t+IV-1,"0",0,"0","0","0"]
+
+def _record(path):
+    # İlk tam pencere (80 mum), ardından user-002 tarzı artımlı istekler: her 100 s'de
+    # startTime=son mum, en fazla 2 satır (oluşan mum güncellenir / yeni mum eklenir)
+    last=T0*1000; recs=[(T0,{'symbol':'AUSDT','interval':'5m','limit':80},
+                         [_row(last-(79-i)*IV,100+i) for i in range(80)])]
+    for k in range(1,31):
+        t=T0+k*100; cur=(t*1000)//IV*IV
+        q={'symbol':'AUSDT','interval':'5m','limit':99,'startTime':last}
+        recs.append((t,q,[_row(x,1000+k) for x in range(last,cur+1,IV)])); last=cur
+    with gzip.open(path,'wt',encoding='utf-8') as f:
+        f.write(json.dumps({'t':T0,'k':'rest','p':'/fapi/v1/exchangeInfo','q':{},
+                            'b':{'symbols':[{'symbol':'AUSDT','contractType':'PERPETUAL','status':'TRADING'}]}})+'\n')
+        for t,q,b in recs: f.write(json.dumps({'t':t,'k':'rest','p':'/fapi/v1/klines','q':q,'b':b})+'\n')
+
+def _client(tmp_path):
+    path=str(tmp_path/'rec.jsonl.gz'); _record(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bc=bot.ReplayClient(path)
+    bc.clock=bot.ManualClock(T0); return bc
+
+def test_full_window_after_incremental_records(tmp_path):
+    bc=_client(tmp_path)
+    bc.clock.t=T0+2050  # 20 artımlı kayıttan sonra
+    kl=bc.klines('AUSDT','5m',80,max_age=0)  # taze tampon: tam pencere
+    assert len(kl)==80
+    t=[k['t'] for k in kl]
+    assert t==sorted(set(t)) and t[-1]==(bc.clock.t*1000)//IV*IV and t[1]-t[0]==IV
+    assert kl[-1]['c']==1020  # oluşan mum: now anındaki son kayıtlı hali, gelecektekiler değil
+    assert len(bc.cached('AUSDT')) >= 35  # analyze() için yeterli
+
+def test_start_time_limit_and_no_lookahead(tmp_path):
+    bc=_client(tmp_path); bc.clock.t=T0+1000
+    r=bc._get('/fapi/v1/klines',{'symbol':'AUSDT','interval':'5m','limit':3,'startTime':T0*1000-10*IV}).json()
+    assert [k[0] for k in r]==[T0*1000-10*IV+i*IV for i in range(3)]  # startTime'dan itibaren ilk 3
+    r=bc._get('/fapi/v1/klines',{'symbol':'AUSDT','interval':'5m','limit':500}).json()
+    assert r[-1][0]<=bc.clock.t*1000 and float(r[-1][4])==1010
+    # Oluşan mum ilk kez T0+200'de kaydedildi: T0+101'de onun kapanışı (1002) görünmemeli
+    bc.clock.t=T0+101
+    r=bc._get('/fapi/v1/klines',{'symbol':'AUSDT','interval':'5m','limit':500}).json()
+    assert r[-1][0]==T0*1000 and r[-1][4]=='1001' and all(float(k[4])<=1001 for k in r)
+    assert bc._get('/fapi/v1/klines',{'symbol':'BUSDT','interval':'5m','limit':80}) is None
@@ -0,0 +1,49 @@
+import contextlib, io, multiprocessing as mp, time
+
+import trading_bot_v5 as bot
+
+RISK=dict(min_score=1,min_conf=0,max_positions=50,max_atr_pct=100,tick_budget_ms=10**9,scan_mode='random')  # her sembol decide()'a girer
+
+def _opened(replay_client,shards):
+    # Aynı risk ayarlı iki ajan: önce hiçbir sembolün geçemeyeceği ATR eşiğiyle, sonra aynı mumda
+    # (decide() 10 s kısıtından sonra) normal eşikle tarama - eski analiz önbelleği kullanılmamalı
+    bc=replay_client(24,140)
+    with contextlib.redirect_stdout(io.StringIO()):
+        agents={'a':dict(RISK,max_atr_pct=0.01),'b':dict(RISK,max_atr_pct=0.01)}
+        e=bot.ShardedEngine(bc,0,persist=False,shards=shards,replay=bc.path,agents=agents) if shards else bot.Engine(bc,0,persist=False,agents=agents)
+        try:
+            out={}
+            for ag in e.agents.values():
+                e.sched.begin(); e._scan(ag,len(bc.symbols)); e.sched.end()
+            out['scan1']={n:set(ag.positions) for n,ag in e.agents.items()}
+            bc.clock.t+=20
+            for ag in e.agents.values():
+                ag.risk['max_atr_pct']=100; ag.risk_changed()
+                e.sched.begin(); e._scan(ag,len(bc.symbols)); e.sched.end()
+            out['scan2']={n:set(ag.positions) for n,ag in e.agents.items()}
+        finally:
+            if shards: e.close()
+    return out
+
+def test_sharded_matches_in_process_with_two_agents(replay_client):
+    ref=_opened(replay_client,0); got=_opened(replay_client,2)
+    assert ref['scan1']=={'a':set(),'b':set()}
+    assert ref['scan2']['a'] and ref['scan2']['a']==ref['scan2']['b']
+    assert got==ref
+
+def test_stuck_shard_is_dropped_for_the_tick(replay_client,monkeypatch):
+    monkeypatch.setattr(bot.ShardedEngine,'REPLY_GRACE_S',0.2)
+    bc=replay_client(8,130)
+    with contextlib.redirect_stdout(io.StringIO()):
+        e=bot.ShardedEngine(bc,0,persist=False,shards=2,replay=bc.path,agents={'a':dict(RISK,tick_budget_ms=100)})
+        try:
+            ag=e.agent; e.sched.begin(); e._scan(ag,len(bc.symbols)); e.sched.end()  # işçiler ayakta
+            n=[x['scanned'] for x in e.shard_stats]
+            a,b=mp.Pipe(); old=e._conns[0]; e._conns[0]=a  # istekleri alan ama yanıt vermeyen işçi
+            t=time.monotonic(); e.sched.begin(); e._scan(ag,len(bc.symbols)); e.sched.end()
+            assert time.monotonic()-t<5 and e.shard_stats[0]['restarts']==1 and e.shard_stats[0]['scanned']==n[0]
+            assert b.poll() and e.shard_stats[1]['scanned']>n[1]  # diğer işçi bu tick'te taradı
+            e.sched.begin(); e._scan(ag,len(bc.symbols)); e.sched.end()
+            assert e.shard_stats[0]['scanned']>n[0]  # yeniden başlatılan işçi sonraki tick'te döner
+        finally:
+            old.close(); e.close()
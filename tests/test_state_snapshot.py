@@ -0,0 +1,63 @@
+import asyncio, contextlib, io, json, threading, time, urllib.error, urllib.request
+
+import trading_bot_v5 as bot
+
+def _engine(replay_client):
+    bc=replay_client(4,130)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return bot.Engine(bc,0,persist=False,agents={'a':{},'b':{}})
+
+def test_risk_update_waits_for_tick_and_publishes(replay_client):
+    e=_engine(replay_client); ag=e.agents['b']; done=threading.Event()
+    ver=e.snap.ver
+    with e._tick:  # motor tick'in ortasında
+        th=threading.Thread(target=lambda: (e.update_risk(ag,{'max_positions':'3','nope':1}),done.set()))
+        th.start(); time.sleep(0.1)
+        assert not done.is_set() and ag.risk['max_positions']!=3
+    th.join(5)
+    assert done.is_set() and ag.risk['max_positions']==3 and 'nope' not in ag.risk
+    st=json.loads(e.snap.body('state','b'))
+    assert e.snap.ver>ver and st['risk']['max_positions']==3 and st['agent']=='b'
+    assert json.loads(e.snap.body('state','a'))['risk']['max_positions']!=3
+
+def test_snapshot_is_not_affected_by_later_changes(replay_client):
+    e=_engine(replay_client); snap=e.snap; before=snap.body('state')
+    e.agent.risk['max_positions']=1; e.agent.balance+=5; e.log('x')
+    assert snap.body('state')==before and snap.body('state','nope') is None  # bilinmeyen ajan
+    e.publish(); assert e.snap is not snap and json.loads(e.snap.body('state'))['risk']['max_positions']==1
+
+def test_unknown_agent_is_404(replay_client,monkeypatch):
+    e=_engine(replay_client); monkeypatch.setattr(bot,'engine_g',e)
+    srv=bot.HTTPServer(('127.0.0.1',0),bot.H); threading.Thread(target=srv.serve_forever,daemon=True).start()
+    url=f"http://127.0.0.1:{srv.server_address[1]}"
+    def code(path,data=None):
+        try: return urllib.request.urlopen(urllib.request.Request(url+path,data=data),timeout=5).status
+        except urllib.error.HTTPError as x: return x.code
+    try:
+        before=dict(e.agent.risk)
+        assert code('/api/risk?agent=nope',b'{"max_positions":1}')==404 and e.agent.risk==before
+        assert code('/api/status?agent=nope')==404 and code('/api/debug?agent=nope')==404
+        assert code('/api/status?agent=b')==200 and code('/api/status')==200
+    finally:
+        srv.shutdown(); srv.server_close()
+
+def test_async_loop_keeps_running_while_http_holds_tick(replay_client):
+    bc=replay_client(4,130)
+    with contextlib.redirect_stdout(io.StringIO()):
+        e=bot.AsyncEngine(bc,0,persist=False,agents={'main':{'min_score':99}})
+        th=threading.Thread(target=e.start,daemon=True); th.start()
+        try:
+            for _ in range(100):
+                if e._loop and e.tick: break
+                time.sleep(0.05)
+            with e._tick:  # HTTP iş parçacığı (update_risk) kilidi tutuyor
+                e._loop.call_soon_threadsafe(e._wake.set); time.sleep(0.5)  # ticaret döngüsü kilidi bekliyor
+                asyncio.run_coroutine_threadsafe(asyncio.sleep(0),e._loop).result(1)  # döngü hâlâ dönüyor
+            t=e.tick
+            for _ in range(100):
+                if e.tick>t: break
+                time.sleep(0.05)
+            assert e.tick>t
+        finally:
+            e.stop(); th.join(5)
+    assert not th.is_alive()
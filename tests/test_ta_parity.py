@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+import trading_bot_v5 as bot
+
+TOL=1e-9  # göreli; beklenen fark sadece toplama sırasından (~1e-12)
+
+def _walk(n,seed):
+    r=np.random.default_rng(seed)
+    c=100*np.exp(np.cumsum(r.normal(0,0.004,n)))
+    o=np.r_[c[0],c[:-1]]; h=np.maximum(o,c)*(1+r.random(n)*0.003); l=np.minimum(o,c)*(1-r.random(n)*0.003)
+    return h,l,c,r.lognormal(3,0.7,n)
+
+def _flat(n):
+    c=np.full(n,42.5); return c,c.copy(),c.copy(),np.full(n,7.0)
+
+def _close(a,b):
+    return abs(float(a)-float(b))<=TOL*max(1.0,abs(float(a)))
+
+def _cases():
+    for n in (1,2,13,14,15,19,20,25,26,27,34,35,36,49,50,51,80,200):
+        yield f"walk{n}",_walk(n,n)
+    yield 'flat',_flat(80)
+    yield 'flat_short',_flat(20)
+    h,l,c,v=_walk(80,7); v[-30:]=0
+    yield 'zero_volume',(h,l,c,v)
+    h,l,c,v=_walk(80,8); c[-20:]=c[-21]
+    yield 'flat_tail',(h,l,c,v)
+    c=np.linspace(100,140,80)
+    yield 'monotonic',(c+0.5,c-0.5,c,np.ones(80))
+
+@pytest.mark.parametrize('name,hlcv',list(_cases()),ids=[x[0] for x in _cases()])
+def test_indicators_match_ta(name,hlcv):
+    diff=bot.TAVec.parity(*hlcv)
+    ref=bot.TA.indicators(*(x.tolist() for x in hlcv))
+    bad={k:(ref[k],d) for k,d in diff.items() if d>TOL*max(1.0,abs(float(ref[k])))}
+    assert not bad, bad
+
+@pytest.mark.parametrize('seed',range(4))
+def test_series_matches_ta_on_every_prefix(seed):
+    h,l,c,v=_walk(90,100+seed)
+    ser=bot.TAVec.series(h,l,c,v)
+    for t in range(1,len(c)+1):
+        ref=bot.TA.indicators(*(x[:t].tolist() for x in (h,l,c,v)))
+        for k in ref:
+            assert _close(ref[k],ser[k][t-1]),(k,t,ref[k],ser[k][t-1])
+
+def test_batch_matches_single_symbol():
+    cols=[np.stack(x) for x in zip(*(_walk(80,s) for s in range(6)))]
+    out=bot.TAVec.indicators(*cols)
+    for i in range(6):
+        one=bot.TAVec.indicators(*(x[i] for x in cols))
+        for k,x in one.items(): assert _close(x,out[k][i]),(k,i)
@@ -0,0 +1,69 @@
+import os, time
+
+import bench
+import trading_bot_v5 as bot
+
+IV=300000
+
+def _kline(sym,t,c):
+    return {'stream':f"{sym.lower()}@kline_5m",'data':{'e':'kline','s':sym,
+            'k':{'t':t,'i':'5m','o':str(c),'h':str(c+1),'l':str(c-1),'c':str(c),'v':'5'}}}
+
+def _wait(cond,timeout=10):
+    end=time.time()+timeout
+    while time.time()<end:
+        if cond(): return True
+        time.sleep(0.02)
+    return False
+
+def test_kline_stream_reconnect_and_rest_fallback(tmp_path,monkeypatch):
+    monkeypatch.setattr(bot.BinanceClient,'BASE',bot.BinanceClient.BASE)
+    monkeypatch.setattr(bot.BinanceClient,'WS',bot.BinanceClient.WS)
+    rest=bench.serve(['AUSDT','BUSDT'])
+    bc=bot.BinanceClient(warm=False)
+    buf=bc.candles('AUSDT','5m',80,max_age=0); last=buf.last_t(); key='AUSDT_5m'
+    assert len(buf)==80
+    # Kayıt: oluşan mumun güncellemesi, yeni mum, bir mum atlayan (kopukluk) mesaj
+    path=str(tmp_path/'rec.jsonl.gz'); rec=bot.MarketRecorder(path)
+    for m in (_kline('AUSDT',last,150.0),_kline('AUSDT',last+IV,151.0),_kline('AUSDT',last+4*IV,160.0)):
+        rec.ws(bot.json.dumps(m))
+    rec.close()
+    ws=bench.ws_serve(bench.ws_frames(path),drop=True)
+    calls=[]; get=bc._get_klines
+    bc._get_klines=lambda *a,**kw: calls.append(a) or get(*a,**kw)
+    try:
+        bc.start_stream()
+        assert _wait(lambda: bc.ws_stats['msgs']>=3)
+        t,o,h,l,c,v=bc.cached('AUSDT').view()
+        assert len(t)==81 and (t[1:]>t[:-1]).all()
+        assert t[-1]==last+IV and c[-2]==150.0 and c[-1]==151.0  # kopukluk mesajı yazılmadı
+        assert bc._cache_ts[key]==0 and key not in bc._kline_live
+        # Sunucu bağlantıyı kapattı: stream_ok False, mumlar REST'ten (artımlı) istenir
+        assert _wait(lambda: not bc.stream_ok())
+        bc.candles('AUSDT','5m',80,max_age=10)
+        assert calls and calls[-1][3]==last+IV
+        # Yeniden bağlanınca kline abonelikleri yenilenir; tekrar gelen mesajlar tamponu bozmaz
+        assert _wait(lambda: len(ws.received)>=2 and ws.received[1],timeout=15)
+        assert bc.ws_stats['reconnects']>=1
+        assert any('ausdt@kline_5m' in m['params'] for m in ws.received[1] if m.get('method')=='SUBSCRIBE')
+        assert _wait(lambda: bc.ws_stats['msgs']>=6)
+        t,o,h,l,c,v=bc.cached('AUSDT').view()
+        assert len(t)==81 and t[-1]==last+IV and c[-1]==151.0
+    finally:
+        bc.stop_stream(); ws.stopped=True; ws.shutdown(); rest.shutdown()
+
+def test_kline_gap_while_stream_live_refetches(monkeypatch):
+    monkeypatch.setattr(bot.BinanceClient,'BASE',bot.BinanceClient.BASE)
+    rest=bench.serve(['AUSDT'])
+    bc=bot.BinanceClient(warm=False)
+    try:
+        buf=bc.candles('AUSDT','5m',80,max_age=0); last=buf.last_t()
+        bc._ws_connected=True; bc._ws_last=time.time()
+        bc._ws_dispatch(_kline('AUSDT',last,150.0))
+        assert bc.candles('AUSDT','5m',80,max_age=0) is buf and buf.view()[4][-1]==150.0  # push canlı: REST yok
+        calls=[]; get=bc._get_klines
+        bc._get_klines=lambda *a,**kw: calls.append(a) or get(*a,**kw)
+        bc._ws_dispatch(_kline('AUSDT',last+3*IV,160.0))
+        bc.candles('AUSDT','5m',80,max_age=10)
+        assert len(calls)==1  # stream bağlı olsa da kaçan mumlar REST ile tamamlanır
+    finally: rest.shutdown()
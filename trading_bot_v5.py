@@ -1,11 +1,35 @@
 #!/usr/bin/env python3
 """AI Trading Bot v5.0 — Elite Dashboard - Enhanced with Risk Management"""
 
-import random, time, json, threading, requests, math, os
+import random, time, json, threading, requests, math, os, gzip, bisect, asyncio, contextlib, atexit, signal
+import multiprocessing as mp
+import numpy as np
+from collections import deque, OrderedDict
+from collections.abc import Mapping, MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 
+BOOT_T0 = time.perf_counter()
+
+# ── WEBSOCKET MARKET DATA (opsiyonel) ──────────────────────
+try:
+    import websocket  # websocket-client
+    WS_ENABLED = True
+except ImportError:
+    websocket = None
+    WS_ENABLED = False
+
+# ── ASYNC HTTP (opsiyonel, BOT_ENGINE=async) ────────────────
+try:
+    import aiohttp
+    AIOHTTP_ENABLED = True
+except ImportError:
+    aiohttp = None
+    AIOHTTP_ENABLED = False
+
 # ── RISK MANAGEMENT & PERFORMANCE MODULES ──────────────────
 try:
     from trading_bot_improvements import (
@@ -23,32 +47,332 @@ except ImportError as e:
     print("   Bot temel modda çalışacak. Gelişmiş özellikler devre dışı.")
     IMPROVEMENTS_ENABLED = False
 
+# ── CANDLE STORE ───────────────────────────────────────────
+class CandleBuffer:
+    """Sabit kapasiteli OHLCV halka tamponu (kolon başına float64/int64).
+
+    Her değer hem i hem i+cap konumuna yazılır; böylece son n mum her zaman
+    bitişik bir dilimdir ve view() kopyasız numpy görünümleri döndürür.
+    """
+    __slots__=('cap','n','_w','t','o','h','l','c','v')
+    COLS=('t','o','h','l','c','v')
+
+    def __init__(self,cap=500):
+        self.cap=cap; self.n=0; self._w=0
+        self.t=np.zeros(2*cap,np.int64)
+        self.o=np.zeros(2*cap); self.h=np.zeros(2*cap); self.l=np.zeros(2*cap)
+        self.c=np.zeros(2*cap); self.v=np.zeros(2*cap)
+
+    def __len__(self): return self.n
+
+    def last_t(self):
+        return int(self.t[(self._w-1)%self.cap]) if self.n else None
+
+    def _write(self,j,t,o,h,l,c,v):
+        for a,x in ((self.t,t),(self.o,o),(self.h,h),(self.l,l),(self.c,c),(self.v,v)):
+            a[j]=x; a[j+self.cap]=x
+
+    def put(self,t,o,h,l,c,v):
+        # Aynı açılış zamanı: oluşan mum yerinde güncellenir; daha yenisi eklenir
+        last=self.last_t()
+        if last is not None and t<last: return False
+        if last is not None and t==last: self._write((self._w-1)%self.cap,t,o,h,l,c,v)
+        else:
+            self._write(self._w,t,o,h,l,c,v)
+            self._w=(self._w+1)%self.cap; self.n=min(self.n+1,self.cap)
+        return True
+
+    def load(self,t,ohlcv):
+        # Kolonları doğrudan doldurur (snapshot'tan açılış); son cap mum tutulur
+        n=min(len(t),self.cap); t=t[len(t)-n:]; ohlcv=ohlcv[len(ohlcv)-n:]
+        for j,a in enumerate((self.t,self.o,self.h,self.l,self.c,self.v)):
+            col=t if j==0 else ohlcv[:,j-1]
+            a[:n]=col; a[self.cap:self.cap+n]=col
+        self.n=n; self._w=n%self.cap
+
+    def extend_raw(self,rows):
+        # Binance REST kline satırları: [t, o, h, l, c, v, ...] (string fiyatlar)
+        last=self.last_t()
+        for k in rows:
+            t=int(k[0])
+            if last is not None and t<last: continue
+            self.put(t,float(k[1]),float(k[2]),float(k[3]),float(k[4]),float(k[5]))
+            last=t
+
+    def view(self,n=None):
+        # Son n mumun kolon görünümleri (t, o, h, l, c, v) - kopya yok
+        n=self.n if n is None else min(n,self.n)
+        e=(self._w-1)%self.cap+self.cap+1 if self.n else self.cap
+        return tuple(getattr(self,k)[e-n:e] for k in self.COLS)
+
+    def col(self,name,n=None):
+        n=self.n if n is None else min(n,self.n)
+        e=(self._w-1)%self.cap+self.cap+1 if self.n else self.cap
+        return getattr(self,name)[e-n:e]
+
+    def to_dicts(self,n=None):
+        # /api/klines ve dashboard için eski {'t','o','h','l','c','v'} listesi
+        t,o,h,l,c,v=(a.tolist() for a in self.view(n))
+        return [{'t':t[i],'o':o[i],'h':h[i],'l':l[i],'c':c[i],'v':v[i]} for i in range(len(t))]
+
+# ── SYMBOL REGISTRY ────────────────────────────────────────
+class SymbolRegistry:
+    """Sembol listesi + sym->slot indeksi ve önceden ayrılmış fiyat/ticker kolonları.
+
+    exchangeInfo değiştiğinde yenisi kurulur (eski değerler taşınır) ve istemcide
+    tek atamayla değiştirilir; okuyucular hiçbir zaman yarım bir kayıt görmez.
+    """
+    COLS=('change','volume','high','low','quoteVolume','openPrice','count')
+    __slots__=('symbols','idx','px','tk','has')
+
+    def __init__(self,symbols,prev=None):
+        self.symbols=sorted(symbols); self.idx={s:i for i,s in enumerate(self.symbols)}
+        n=len(self.symbols)
+        self.px=np.zeros(n); self.tk=np.zeros((n,len(self.COLS))); self.has=np.zeros(n,bool)
+        if prev is not None:
+            pairs=[(i,prev.idx[s]) for s,i in self.idx.items() if s in prev.idx]
+            if pairs:
+                new,old=(list(x) for x in zip(*pairs))
+                self.px[new]=prev.px[old]; self.tk[new]=prev.tk[old]; self.has[new]=prev.has[old]
+
+    def __contains__(self,s): return s in self.idx
+    def __len__(self): return len(self.symbols)
+
+    def set_prices(self,ii,vals):
+        if ii: self.px[ii]=vals
+
+    def set_tickers(self,ii,prices,rows):
+        if ii: self.px[ii]=prices; self.tk[ii]=rows; self.has[ii]=True
+
+    def price(self,s):
+        i=self.idx.get(s)
+        return float(self.px[i]) if i is not None else 0
+
+    def info(self,s):
+        i=self.idx.get(s)
+        if i is None or not self.has[i]: return {}
+        d=dict(zip(self.COLS,self.tk[i].tolist())); d['count']=int(d['count'])
+        d['price']=float(self.px[i])
+        return d
+
+class _PriceView(Mapping):
+    # Eski bc.prices sözlüğünün salt-okunur görünümü
+    def __init__(self,bc): self.bc=bc
+    def __getitem__(self,s):
+        reg=self.bc.reg; i=reg.idx[s]
+        return float(reg.px[i])
+    def __iter__(self):
+        reg=self.bc.reg; return (reg.symbols[i] for i in np.flatnonzero(reg.px))
+    def __len__(self): return int(np.count_nonzero(self.bc.reg.px))
+
+class _TickerView(Mapping):
+    # Eski bc.ticker sözlüğünün salt-okunur görünümü
+    def __init__(self,bc): self.bc=bc
+    def __getitem__(self,s):
+        d=self.bc.reg.info(s)
+        if not d: raise KeyError(s)
+        return d
+    def __iter__(self):
+        reg=self.bc.reg; return (reg.symbols[i] for i in np.flatnonzero(reg.has))
+    def __len__(self): return int(np.count_nonzero(self.bc.reg.has))
+
+# ── REQUEST SCHEDULER ──────────────────────────────────────
+class RequestScheduler:
+    """Binance REST ağırlık bütçesi.
+
+    Bütçe borsanın dakika penceresine hizalıdır ve X-MBX-USED-WEIGHT-1M başlığı
+    ile senkronlanır. Her öncelik bütçenin ancak CEIL kadarını kullanabilir ve
+    daha yüksek öncelikli bekleyen varken sıra almaz; böylece pozisyon kline'ları
+    tarama kline'larından, onlar da ticker tazelemesinden önce gelir.
+    418/429 yanıtlarında Retry-After süresince hiçbir istek gönderilmez.
+    """
+    PRIO_POS, PRIO_SCAN, PRIO_TICKER = 0, 1, 2
+    CEIL = (1.0, 0.9, 0.75)     # öncelik başına kullanılabilir bütçe oranı
+    MAX_WAIT = (60, 5, 0)       # öncelik başına bütçe bekleme süresi (s)
+    WEIGHTS = {'/fapi/v1/exchangeInfo':1,'/fapi/v1/ticker/24hr':40,'/fapi/v1/ticker/price':2}
+
+    def __init__(self,limit=2400,share=1.0):
+        # share<1: bütçenin bir dilimi (ShardedEngine işçileri aynı IP bütçesini bölüşür)
+        self.limit=int(limit*share); self.share=share; self.used=0; self.window=int(time.time()//60)
+        self.cond=threading.Condition(); self.waiting=[0,0,0]; self.banned_until=0
+        self.stats={'requests':0,'throttled':0,'rejected':0,'backoffs':0}
+
+    @classmethod
+    def weight(cls,path,params=None):
+        if path=='/fapi/v1/klines':
+            n=int((params or {}).get('limit',500))
+            return 1 if n<100 else 2 if n<500 else 5 if n<=1000 else 10
+        return cls.WEIGHTS.get(path,1)
+
+    def _roll(self):
+        m=int(time.time()//60)
+        if m!=self.window: self.window=m; self.used=0; self.cond.notify_all()
+
+    def acquire(self,w,prio):
+        deadline=time.time()+self.MAX_WAIT[prio]; waited=False
+        with self.cond:
+            self.waiting[prio]+=1
+            try:
+                while True:
+                    self._roll(); now=time.time()
+                    if now<self.banned_until:
+                        self.stats['rejected']+=1; return False
+                    if not any(self.waiting[:prio]) and self.used+w<=self.limit*self.CEIL[prio]:
+                        self.used+=w; self.stats['requests']+=1; return True
+                    if not waited: self.stats['throttled']+=1; waited=True
+                    wait=min(60-now%60+0.05,deadline-now)
+                    if wait<=0:
+                        self.stats['rejected']+=1; return False
+                    self.cond.wait(wait)
+            finally:
+                self.waiting[prio]-=1; self.cond.notify_all()
+
+    def try_acquire(self,w,prio):
+        # Beklemeden bütçe ayırmayı dener (asyncio yolu); sıra/bütçe yoksa False
+        with self.cond:
+            self._roll()
+            if time.time()<self.banned_until or any(self.waiting[:prio+1]) or self.used+w>self.limit*self.CEIL[prio]:
+                return False
+            self.used+=w; self.stats['requests']+=1; return True
+
+    def observe(self,r):
+        with self.cond:
+            self._roll()
+            try: self.used=max(self.used,int(int(r.headers.get('X-MBX-USED-WEIGHT-1M',0))*self.share))
+            except (TypeError,ValueError): pass
+            if r.status_code in (418,429):
+                try: ra=float(r.headers.get('Retry-After',60))
+                except (TypeError,ValueError): ra=60
+                self.banned_until=max(self.banned_until,time.time()+ra)
+                self.stats['backoffs']+=1
+                print(f"⚠️  Binance {r.status_code} - {ra:.0f}s istek gonderilmeyecek")
+
+    def snapshot(self):
+        with self.cond:
+            self._roll()
+            return dict(used=self.used,limit=self.limit,pct=round(self.used/self.limit*100,1),
+                        queue=sum(self.waiting),queue_by_prio=list(self.waiting),
+                        banned_for=max(0,round(self.banned_until-time.time())),**self.stats)
+
+# ── CLOCK & MARKET-DATA RECORDER ───────────────────────────
+class WallClock:
+    speed=1.0
+    def now(self): return time.time()
+    def sleep(self,s): time.sleep(s)
+    def dt(self): return datetime.now()
+
+class VirtualClock(WallClock):
+    # Kayıt zamanında t0'dan başlar, duvar saatinin `speed` katı hızla ilerler
+    def __init__(self,t0,speed=1.0):
+        self.t0=t0; self.speed=max(float(speed),1e-6); self.w0=time.monotonic()
+    def now(self): return self.t0+(time.monotonic()-self.w0)*self.speed
+    def sleep(self,s): time.sleep(s/self.speed)
+    def dt(self): return datetime.fromtimestamp(self.now())
+
+class ManualClock(WallClock):
+    # Zamanı dışarıdan ayarlanan saat (shard işçileri koordinatörün sanal saatini izler)
+    def __init__(self,t=0.0): self.t=t
+    def now(self): return self.t
+    def sleep(self,s): pass
+    def dt(self): return datetime.fromtimestamp(self.t)
+
+class MarketRecorder:
+    # BinanceClient'ın aldığı her piyasa verisini gzip JSONL olarak sona ekler:
+    #   {"t":ts,"k":"rest","p":path,"q":params,"b":<gövde>}  |  {"t":ts,"k":"ws","b":<mesaj>}
+    # Gövdeler ham metin olarak gömülür (yeniden kodlama yok); her açılış yeni bir gzip üyesi
+    FLUSH_S=5
+    def __init__(self,path):
+        self.path=path; self.lock=threading.Lock(); self.n=0; self.bytes=0
+        self.f=gzip.open(path,'at',encoding='utf-8',compresslevel=6); self._flushed=time.time()
+    def _write(self,head,body):
+        line=head+body+'}\n'
+        with self.lock:
+            if not self.f: return
+            self.f.write(line); self.n+=1; self.bytes+=len(line)
+            if time.time()-self._flushed>self.FLUSH_S: self.f.flush(); self._flushed=time.time()
+    def rest(self,path,params,text):
+        self._write(f'{{"t":{time.time():.3f},"k":"rest","p":{json.dumps(path)},"q":{json.dumps(params or {})},"b":',text)
+    def ws(self,msg):
+        self._write(f'{{"t":{time.time():.3f},"k":"ws","b":',msg)
+    def close(self):
+        with self.lock:
+            if self.f: self.f.close(); self.f=None
+    def stats(self): return dict(path=self.path,records=self.n,raw_bytes=self.bytes)
+
 # ── BINANCE CLIENT ─────────────────────────────────────────
 class BinanceClient:
-    BASE = "https://fapi.binance.com"
-    def __init__(self):
-        self.symbols=[]; self.ticker={}; self.prices={}
+    BASE = os.environ.get('BINANCE_REST', "https://fapi.binance.com")
+    WS = os.environ.get('BINANCE_WS', "wss://fstream.binance.com")
+    WS_STALE = 10        # saniye - bu süre mesaj gelmezse REST'e düş
+    WS_MAX_STREAMS = 200 # tek bağlantıdaki kline stream sınırı
+    KL_CAP = 500         # (sembol, interval) başına kline tampon kapasitesi
+    KL_INC_LIMIT = 99    # artımlı istek limiti (<100 = weight 1)
+    POOL = 20            # paralel kline isteği (scan_size kadar; tek bağlantı havuzu)
+    SNAPSHOT = os.environ.get('BOT_SNAPSHOT','bot_snapshot.npz')
+    SNAP_CANDLES = 120   # snapshot'a yazılan tampon başına mum
+    SNAP_MAX_AGE = 86400 # daha eski snapshot ile sıcak başlatma yapılmaz
+    FALLBACK_SYMBOLS = ['BTCUSDT','ETHUSDT','BNBUSDT','SOLUSDT','XRPUSDT','ADAUSDT','DOGEUSDT','MATICUSDT','AVAXUSDT','LINKUSDT']
+    IV_MS = {'1m':60000,'3m':180000,'5m':300000,'15m':900000,'30m':1800000,
+             '1h':3600000,'4h':14400000,'1d':86400000}
+    def __init__(self,warm=True,recorder=None,symbols=None):
+        # symbols: sabit sembol dilimi (shard işçisi) - borsa listesi/ticker çekilmez
+        self.clock=getattr(self,'clock',None) or WallClock()
+        self.recorder=recorder
+        self.reg=SymbolRegistry([])
+        self.prices=_PriceView(self); self.ticker=_TickerView(self)
         self._klines_cache={}; self._cache_ts={}
         self.session = requests.Session()
+        self.rl=RequestScheduler()
+        ad=HTTPAdapter(pool_connections=2,pool_maxsize=self.POOL)
+        self.session.mount('https://',ad); self.session.mount('http://',ad)
+        self.pool=ThreadPoolExecutor(max_workers=self.POOL,thread_name_prefix='klines')
         # Proxy kullan (geo-block bypass)
         self.proxies = None  # Railway'de proxy gerekirse buraya ekleriz
-        self._fetch_symbols(); self._fetch_tickers()
+        # Stream durumu
+        self._ws=None; self._ws_thread=None; self._ws_run=False
+        self._ws_connected=False; self._ws_last=0; self._ws_id=0
+        self._kline_subs=set(); self._kline_live={}
+        self.recv_ts={}  # sym -> son push mesajının yerel alış zamanı
+        self.ws_stats={'msgs':0,'reconnects':0,'errors':0}
+        self.listeners=[]  # yeni piyasa verisi geldiğinde çağrılır (AsyncEngine uyandırma)
+        self.kl_gen=0      # REST ile mum tamponu değiştikçe artar (MarketHub önbellek anahtarı)
+        self.startup={'warm':False,'snapshot_age_s':None,'revalidated_ms':None}
+        # Snapshot varsa hemen ondan başla, ağ doğrulamasını arka planda yap
+        if symbols is not None:
+            if warm: self.load_snapshot()
+            self._set_symbols(list(symbols)); keep={f"{s}_5m" for s in symbols}
+            for k in [k for k in self._klines_cache if k not in keep]: del self._klines_cache[k]
+        elif warm and self.load_snapshot():
+            threading.Thread(target=self._revalidate,args=(time.perf_counter(),),daemon=True).start()
+        else:
+            self._fetch_symbols(); self._fetch_tickers()
 
-    def _fetch_symbols(self):
+    def _get(self,path,params=None,timeout=10,prio=RequestScheduler.PRIO_SCAN,base=None):
+        # Tüm REST istekleri buradan geçer; bütçe yoksa None döner
+        if not self.rl.acquire(self.rl.weight(path,params),prio): return None
+        r=self.session.get(f"{base or self.BASE}{path}",params=params,timeout=timeout,proxies=self.proxies)
+        self.rl.observe(r)
+        if self.recorder and r.status_code==200: self.recorder.rest(path,params,r.text)
+        return r
+
+    def _fetch_symbols(self,fallback=True):
         try:
             # Try main endpoint first
-            r=self.session.get(f"{self.BASE}/fapi/v1/exchangeInfo",timeout=15,proxies=self.proxies)
+            r=self._get("/fapi/v1/exchangeInfo",timeout=15,prio=RequestScheduler.PRIO_POS)
+            if r is None: raise RuntimeError("rate limit")
             
             # If geo-blocked, try alternative public endpoint
             if r.status_code==451:
                 print("Main API geo-blocked, trying alternative...")
-                r=self.session.get("https://fapi.binance.com/fapi/v1/exchangeInfo",timeout=15)
+                r=self._get("/fapi/v1/exchangeInfo",timeout=15,prio=RequestScheduler.PRIO_POS,
+                            base="https://fapi.binance.com")
+                if r is None: raise RuntimeError("rate limit")
             
             data=r.json()
             
             if not isinstance(data,dict) or 'symbols' not in data:
                 print(f"symbols error: invalid response - using fallback minimal list")
-                self.symbols=['BTCUSDT','ETHUSDT','BNBUSDT','SOLUSDT','XRPUSDT','ADAUSDT','DOGEUSDT','MATICUSDT','AVAXUSDT','LINKUSDT']
+                if fallback or not self.symbols: self._set_symbols(self.FALLBACK_SYMBOLS)
                 return
             
             # Get ALL USDT perpetual futures
@@ -57,139 +381,531 @@ class BinanceClient:
                    and s.get('contractType')=='PERPETUAL'
                    and s.get('status')=='TRADING']
             
-            self.symbols=sorted(valid)
+            self._set_symbols(valid)
             print(f"✓ {len(self.symbols)} pairs loaded (LIVE BINANCE DATA)")
         except Exception as e:
             print(f"symbols error: {e} - using minimal fallback")
-            self.symbols=['BTCUSDT','ETHUSDT','BNBUSDT','SOLUSDT','XRPUSDT','ADAUSDT','DOGEUSDT','MATICUSDT','AVAXUSDT','LINKUSDT']
+            if fallback or not self.symbols: self._set_symbols(self.FALLBACK_SYMBOLS)
+
+    @property
+    def symbols(self): return self.reg.symbols
+
+    def _set_symbols(self,syms):
+        if set(syms)!=set(self.reg.symbols): self.reg=SymbolRegistry(syms,self.reg)
+
+    def _apply_tickers(self,data,keys=('lastPrice','priceChangePercent','volume','highPrice',
+                                        'lowPrice','quoteVolume','openPrice','count'),sym='symbol'):
+        # 24hr ticker satırlarını tek geçişte kolon dizilerine yazar: O(n)
+        reg=self.reg; get=reg.idx.get; ii=[]; px=[]; rows=[]
+        kp,rest=keys[0],keys[1:]
+        for t in data:
+            if not isinstance(t,dict): continue
+            i=get(t.get(sym))
+            if i is None: continue
+            try:
+                row=[float(t.get(k,0)) for k in rest]; p=float(t.get(kp,0))
+            except (ValueError,TypeError): continue
+            ii.append(i); px.append(p); rows.append(row)
+        reg.set_tickers(ii,px,rows)
+        return ii
 
-    def _fetch_tickers(self):
+    def _fetch_tickers(self,fallback=True):
         if not self.symbols:
             print("ticker error: no symbols loaded")
             return
+        data=None
         try:
-            r=self.session.get(f"{self.BASE}/fapi/v1/ticker/24hr",timeout=15,proxies=self.proxies)
+            r=self._get("/fapi/v1/ticker/24hr",timeout=15,prio=RequestScheduler.PRIO_POS)
+            if r is None: raise RuntimeError("rate limit")
             data=r.json()
             
             if not isinstance(data,list):
                 print(f"ticker error: expected list, got {type(data)}")
                 return
             
-            for t in data:
-                if not isinstance(t,dict): continue
-                s=t.get('symbol')
-                if not s or s not in self.symbols: continue
-                try:
-                    self.ticker[s]={
-                        'price':float(t.get('lastPrice',0)),
-                        'change':float(t.get('priceChangePercent',0)),
-                        'volume':float(t.get('volume',0)),
-                        'high':float(t.get('highPrice',0)),
-                        'low':float(t.get('lowPrice',0)),
-                        'quoteVolume':float(t.get('quoteVolume',0)),
-                        'openPrice':float(t.get('openPrice',0)),
-                        'count':int(t.get('count',0)),
-                    }
-                    self.prices[s]=float(t.get('lastPrice',0))
-                except (ValueError,TypeError): continue
+            self._apply_tickers(data)
             print(f"✓ {len(self.ticker)} live prices loaded")
         except Exception as e:
             print(f"ticker error: {e}")
-            if not isinstance(data, list):
+            if not isinstance(data, list) and (fallback or not len(self.ticker)):
                 print(f"ticker error: unexpected response type - {type(data)}")
                 # Fallback: simulated data for development
-                for s in self.symbols[:10]:
-                    self.ticker[s]={'price':100.0,'change':0.5,'volume':1000,'high':105,'low':95,'quoteVolume':100000,'openPrice':99,'count':100}
-                    self.prices[s]=100.0
+                reg=self.reg; ii=[reg.idx[s] for s in self.symbols[:10]]
+                reg.set_tickers(ii,[100.0]*len(ii),[[0.5,1000,105,95,100000,99,100]]*len(ii))
                 print(f"ok {len(self.ticker)} prices loaded (fallback)")
-                return
-            for t in data:
-                if not isinstance(t, dict):
-                    continue
-                s=t.get('symbol')
-                if not s or s not in self.symbols:
-                    continue
-                try:
-                    self.ticker[s]={
-                        'price':float(t.get('lastPrice',0)),
-                        'change':float(t.get('priceChangePercent',0)),
-                        'volume':float(t.get('volume',0)),
-                        'high':float(t.get('highPrice',0)),
-                        'low':float(t.get('lowPrice',0)),
-                        'quoteVolume':float(t.get('quoteVolume',0)),
-                        'openPrice':float(t.get('openPrice',0)),
-                        'count':int(t.get('count',0)),
-                    }
-                    self.prices[s]=float(t.get('lastPrice',0))
-                except (ValueError, TypeError) as e:
-                    continue
-            print(f"ok {len(self.ticker)} prices loaded")
-        except Exception as e: print(f"ticker error: {e}")
+
+    # ── WARM START SNAPSHOT ────────────────────────────────
+    def _revalidate(self,t0):
+        # Snapshot ile açıldıktan sonra: taze exchangeInfo + ticker, ardından yeni snapshot
+        self._fetch_symbols(fallback=False); self._fetch_tickers(fallback=False)
+        self.startup['revalidated_ms']=round((time.perf_counter()-t0)*1000)
+        print(f"✓ Snapshot dogrulandi ({self.startup['revalidated_ms']}ms)")
+        self.save_snapshot()
+
+    def save_snapshot(self,path=None):
+        path=path or self.SNAPSHOT
+        try:
+            reg=self.reg; keys=[]; ts=[np.zeros(0,np.int64)]; cols=[np.zeros((0,5))]
+            for k,buf in list(self._klines_cache.items()):
+                if not len(buf): continue
+                v=buf.view(self.SNAP_CANDLES)
+                keys.append(k); ts.append(v[0]); cols.append(np.column_stack(v[1:]))
+            tmp=path+'.tmp'
+            with open(tmp,'wb') as f:
+                np.savez_compressed(f,ts=np.float64(time.time()),symbols=np.array(reg.symbols,dtype=str),
+                    px=reg.px,tk=reg.tk,has=reg.has,kl_keys=np.array(keys,dtype=str),
+                    kl_len=np.array([len(x) for x in ts[1:]],np.int64),
+                    kl_t=np.concatenate(ts),kl_ohlcv=np.concatenate(cols))
+            os.replace(tmp,path)
+            return True
+        except Exception as e:
+            print(f"snapshot save error: {e}")
+            return False
+
+    def load_snapshot(self,path=None):
+        path=path or self.SNAPSHOT
+        if not os.path.exists(path): return False
+        try:
+            with np.load(path) as z:
+                age=time.time()-float(z['ts'])
+                if age>self.SNAP_MAX_AGE:
+                    print(f"snapshot cok eski ({age/3600:.0f}h) - soguk baslatma"); return False
+                reg=SymbolRegistry(z['symbols'].tolist())
+                reg.px[:]=z['px']; reg.tk[:]=z['tk']; reg.has[:]=z['has']
+                t,a=z['kl_t'],z['kl_ohlcv']; off=0; cache={}
+                for k,n in zip(z['kl_keys'].tolist(),z['kl_len'].tolist()):
+                    buf=CandleBuffer(self.KL_CAP); buf.load(t[off:off+n],a[off:off+n]); off+=n
+                    cache[k]=buf
+            # Tamponlar bayat sayılır (_cache_ts yok): ilk kullanımda artımlı tazelenir
+            self.reg=reg; self._klines_cache.update(cache)
+            self.startup.update(warm=True,snapshot_age_s=round(age))
+            print(f"✓ Snapshot yuklendi: {len(reg)} cift, {len(cache)} mum tamponu ({age:.0f}s once)")
+            return True
+        except Exception as e:
+            print(f"snapshot load error: {e}")
+            return False
+
+    def _apply_prices(self,data):
+        reg=self.reg; get=reg.idx.get; ii=[]; px=[]
+        for t in data:
+            i=get(t['symbol'])
+            if i is None: continue
+            ii.append(i); px.append(float(t['price']))
+        reg.set_prices(ii,px); self._notify()
+
+    def _notify(self):
+        for f in self.listeners:
+            try: f()
+            except Exception: pass
 
     def refresh_prices(self):
         try:
-            r=self.session.get(f"{self.BASE}/fapi/v1/ticker/price",timeout=5,proxies=self.proxies)
-            for t in r.json():
-                if t['symbol'] in self.symbols:
-                    p=float(t['price'])
-                    self.prices[t['symbol']]=p
-                    if t['symbol'] in self.ticker:
-                        self.ticker[t['symbol']]['price']=p
+            r=self._get("/fapi/v1/ticker/price",timeout=5,prio=RequestScheduler.PRIO_TICKER)
+            if r is None: return
+            self._apply_prices(r.json())
         except: pass
 
     def refresh_tickers(self):
         try:
-            r=self.session.get(f"{self.BASE}/fapi/v1/ticker/24hr",timeout=10,proxies=self.proxies)
+            r=self._get("/fapi/v1/ticker/24hr",timeout=10,prio=RequestScheduler.PRIO_TICKER)
+            if r is None: return
             data=r.json()
             if not isinstance(data,list): return
-            for t in data:
-                if not isinstance(t,dict): continue
-                s=t.get('symbol')
-                if not s or s not in self.symbols or s not in self.ticker: continue
-                try:
-                    self.ticker[s].update({
-                        'price':float(t.get('lastPrice',0)),
-                        'change':float(t.get('priceChangePercent',0)),
-                        'volume':float(t.get('volume',0)),
-                        'high':float(t.get('highPrice',0)),
-                        'low':float(t.get('lowPrice',0)),
-                        'quoteVolume':float(t.get('quoteVolume',0)),
-                    })
-                    self.prices[s]=float(t.get('lastPrice',0))
-                except (ValueError,TypeError): continue
+            self._apply_tickers(data); self._notify()
         except: pass
 
-    def klines(self, symbol, interval='5m', limit=80):
+    def cached(self, symbol, interval='5m'):
+        # Bellekteki CandleBuffer (yoksa None); ağ isteği yapmaz
+        return self._klines_cache.get(f"{symbol}_{interval}")
+
+    def klines(self, symbol, interval='5m', limit=80, max_age=10):
+        buf=self.candles(symbol,interval,limit,max_age)
+        return buf.to_dicts(limit) if buf else []
+
+    def candles(self, symbol, interval='5m', limit=80, max_age=10, prio=RequestScheduler.PRIO_SCAN):
+        # Her (sembol, interval) için KL_CAP mumluk bir CandleBuffer tutulur.
+        # Tampon bayatladığında tüm pencere yerine sadece son açılış zamanından
+        # (startTime) sonraki mumlar istenir; oluşan mum yerinde güncellenir.
+        buf,req,now=self._kl_plan(symbol,interval,limit,max_age)
+        if req is None: return buf
+        return self._kl_apply(symbol,interval,buf,req,self._get_klines(symbol,interval,*req,prio=prio),now)
+
+    def _kl_plan(self,symbol,interval,limit,max_age):
+        # -> (tampon, istek, now); istek None ise tampon yeterince taze,
+        # aksi halde (limit, startTime) — artımlı ya da tam pencere
+        cache_key=f"{symbol}_{interval}"
+        now=self.clock.now()
+        if interval=='5m': self.watch(symbol)
+        buf=self._klines_cache.get(cache_key)
+        limit=min(limit,self.KL_CAP)
+        if buf and len(buf)>=limit:
+            # Stream canlıysa ve bu sembolün kline'ı push ediliyorsa REST'e gitme
+            if self.stream_ok() and now-self._kline_live.get(cache_key,0)<self.WS_STALE:
+                return buf,None,now
+            if now-self._cache_ts.get(cache_key,0)<max_age:
+                return buf,None,now
+            iv=self.IV_MS.get(interval,300000)
+            missing=int(now*1000-buf.last_t())//iv+1
+            if missing<self.KL_INC_LIMIT: return buf,(self.KL_INC_LIMIT,buf.last_t()),now
+        # Tampon yok, yetersiz ya da çok eski: tam pencere
+        return buf,(max(limit,len(buf) if buf else 0),None),now
+
+    def _kl_apply(self,symbol,interval,buf,req,rows,now):
         cache_key=f"{symbol}_{interval}"
-        now=time.time()
-        if cache_key in self._klines_cache and now-self._cache_ts.get(cache_key,0)<10:
-            return self._klines_cache[cache_key]
+        if rows: self.kl_gen+=1
+        if req[1] is not None:
+            if rows:
+                buf.extend_raw(rows)
+                self._cache_ts[cache_key]=now
+            return buf
+        if not rows: return buf
+        nb=CandleBuffer(self.KL_CAP); nb.extend_raw(rows)
+        self._klines_cache[cache_key]=nb
+        self._cache_ts[cache_key]=now
+        return nb
+
+    def _get_klines(self,symbol,interval,limit,start=None,prio=RequestScheduler.PRIO_SCAN):
         try:
-            r=self.session.get(f"{self.BASE}/fapi/v1/klines",
-                params={'symbol':symbol,'interval':interval,'limit':limit},
-                timeout=10,proxies=self.proxies)
-            
+            params={'symbol':symbol,'interval':interval,'limit':limit}
+            if start is not None: params['startTime']=start
+            r=self._get("/fapi/v1/klines",params=params,timeout=10,prio=prio)
+            if r is None: return []
+
             if r.status_code!=200:
                 print(f"Klines API error for {symbol}: status {r.status_code}")
-                return self._klines_cache.get(cache_key,[])
-            
-            data=[{'t':k[0],'o':float(k[1]),'h':float(k[2]),
-                   'l':float(k[3]),'c':float(k[4]),'v':float(k[5])}
-                  for k in r.json()]
-            
+                return []
+
+            data=r.json()
             if len(data)==0:
                 print(f"Klines API returned empty data for {symbol}")
-                return self._klines_cache.get(cache_key,[])
-            
-            self._klines_cache[cache_key]=data
-            self._cache_ts[cache_key]=now
             return data
         except Exception as e:
             print(f"Klines fetch error for {symbol}: {e}")
-            return self._klines_cache.get(cache_key,[])
+            return []
+
+    def refresh_stale(self, symbols, interval='5m', budget=20, max_age=10):
+        # Stream'de olmayan ve bayatlamış tamponları en eskiden başlayarak
+        # en fazla `budget` sembol için tazeler (REST ağırlığı sabit kalır)
+        stale=self.stale(symbols,interval,max_age)
+        self.prefetch(stale[:budget],interval,80,max_age)
+        return len(stale)
+
+    def stale(self, symbols, interval='5m', max_age=10):
+        # Bayat tamponların sembolleri, en eskiden yeniye
+        now=self.clock.now(); stale=[]
+        for s in symbols:
+            key=f"{s}_{interval}"
+            if self.stream_ok() and now-self._kline_live.get(key,0)<self.WS_STALE: continue
+            ts=self._cache_ts.get(key,0)
+            if now-ts>=max_age: stale.append((ts,s))
+        stale.sort()
+        return [s for _,s in stale]
+
+    def prefetch(self, symbols, interval='5m', limit=80, max_age=10, prio=RequestScheduler.PRIO_SCAN):
+        # Kline tamponlarını sınırlı iş parçacığı havuzunda paralel tazeler;
+        # tick süresi N istek yerine yaklaşık tek bir round-trip olur
+        syms=list(dict.fromkeys(symbols))
+        if not syms: return 0
+        if len(syms)==1: self.candles(syms[0],interval,limit,max_age,prio); return 1
+        futs=[self.pool.submit(self.candles,s,interval,limit,max_age,prio) for s in syms]
+        for f in futs:
+            try: f.result()
+            except Exception as e: print(f"prefetch error: {e}")
+        return len(futs)
+
+    def stack(self, symbols, interval='5m', n=50):
+        # En az n mumu olan sembollerin son n mumu: (semboller, o, h, l, c, v) (S x n)
+        syms=[]; cols=([],[],[],[],[])
+        for s in symbols:
+            buf=self._klines_cache.get(f"{s}_{interval}")
+            if not buf or len(buf)<n: continue
+            syms.append(s)
+            for dst,a in zip(cols,buf.view(n)[1:]): dst.append(a)
+        if not syms: return [],None,None,None,None,None
+        return (syms,)+tuple(np.stack(c) for c in cols)
+
+    def price(self,s): return self.reg.price(s)
+    def info(self,s): return self.reg.info(s)
+
+    # ── STREAMING ──────────────────────────────────────────
+    # Combined stream: !markPrice@arr + !ticker@arr + <sym>@kline_5m
+    # Bağlantı koparsa yeniden bağlanır ve tüm kline aboneliklerini yeniler;
+    # bu sırada Engine'in REST döngüleri stream_ok() False olduğu için devreye girer.
+    def start_stream(self):
+        if not WS_ENABLED:
+            print("⚠️  websocket-client yok - REST polling ile devam")
+            return
+        if self._ws_run: return
+        self._ws_run=True
+        self._ws_thread=threading.Thread(target=self._ws_loop,daemon=True)
+        self._ws_thread.start()
+
+    def exhausted(self): return False  # canlı veri bitmez; ReplayClient kaydın sonunda True döner
+
+    def stop_stream(self):
+        self._ws_run=False; self._ws_connected=False
+        try:
+            if self._ws: self._ws.close()
+        except Exception: pass
+
+    def stream_ok(self):
+        return self._ws_connected and self.clock.now()-self._ws_last<self.WS_STALE
 
-    def price(self,s): return self.prices.get(s,0)
-    def info(self,s): return self.ticker.get(s,{})
+    def watch(self,symbol):
+        st=f"{symbol.lower()}@kline_5m"
+        if st in self._kline_subs or len(self._kline_subs)>=self.WS_MAX_STREAMS: return
+        self._kline_subs.add(st)
+        if self._ws_connected: self._ws_send('SUBSCRIBE',[st])
+
+    def _ws_send(self,method,params):
+        try:
+            self._ws_id+=1
+            self._ws.send(json.dumps({'method':method,'params':params,'id':self._ws_id}))
+        except Exception as e:
+            self.ws_stats['errors']+=1; print(f"ws send error: {e}")
+
+    def _ws_loop(self):
+        backoff=1
+        while self._ws_run:
+            url=f"{self.WS}/stream?streams=!markPrice@arr/!ticker@arr"
+            self._ws=websocket.WebSocketApp(url,on_open=self._ws_open,
+                on_message=self._ws_message,on_error=self._ws_error,on_close=self._ws_close)
+            t0=time.time()
+            try: self._ws.run_forever(ping_interval=60,ping_timeout=20)
+            except Exception as e: self._ws_error(self._ws,e)
+            self._ws_connected=False
+            if not self._ws_run: break
+            self.ws_stats['reconnects']+=1
+            backoff=1 if time.time()-t0>60 else min(backoff*2,30)
+            print(f"ws koptu - {backoff}s sonra yeniden baglaniliyor (REST fallback aktif)")
+            time.sleep(backoff)
+
+    def _ws_open(self,ws):
+        self._ws_connected=True; self._ws_last=self.clock.now()
+        subs=sorted(self._kline_subs)
+        for i in range(0,len(subs),50): self._ws_send('SUBSCRIBE',subs[i:i+50])
+        print(f"✓ Market stream bagli ({len(subs)} kline aboneligi)")
+
+    def _ws_error(self,ws,e):
+        self.ws_stats['errors']+=1; print(f"ws error: {e}")
+
+    def _ws_close(self,ws,*a):
+        self._ws_connected=False
+
+    def _ws_message(self,ws,msg):
+        if self.recorder: self.recorder.ws(msg)
+        try: self._ws_dispatch(json.loads(msg))
+        except Exception as e:
+            self.ws_stats['errors']+=1; print(f"ws message error: {e}")
+
+    def _ws_dispatch(self,m):
+        now=self.clock.now(); self._ws_last=now; self.ws_stats['msgs']+=1
+        try:
+            st=m.get('stream',''); data=m.get('data')
+            if data is None: return
+            if st=='!markPrice@arr': self._on_mark(data,now)
+            elif st=='!ticker@arr': self._on_ticker(data,now)
+            elif '@kline_' in st: self._on_kline(data,now)
+            else: return
+        except Exception as e:
+            self.ws_stats['errors']+=1; print(f"ws message error: {e}"); return
+        self._notify()
+
+    def _on_mark(self,data,now):
+        reg=self.reg; get=reg.idx.get; ii=[]; px=[]
+        for t in data:
+            i=get(t.get('s'))
+            if i is None: continue
+            try: px.append(float(t['p']))
+            except (KeyError,ValueError,TypeError): continue
+            ii.append(i); self.recv_ts[t['s']]=now
+        reg.set_prices(ii,px)
+
+    def _on_ticker(self,data,now):
+        self._apply_tickers(data,('c','P','v','h','l','q','o','n'),'s')
+
+    def _on_kline(self,data,now):
+        k=data.get('k') or {}; s=data.get('s') or k.get('s')
+        if not s: return
+        key=f"{s}_{k.get('i','5m')}"
+        buf=self._klines_cache.get(key)
+        if not buf: return  # ilk pencere REST ile gelir, stream sadece günceller
+        try:
+            t=int(k['t'])
+            if t-buf.last_t()>self.IV_MS.get(k.get('i'),300000):
+                # kopukluk sırasında mum kaçtı - tampon canlı sayılmaz, REST ile tamamlanır
+                self._cache_ts[key]=0; self._kline_live.pop(key,None); return
+            if not buf.put(t,float(k['o']),float(k['h']),float(k['l']),float(k['c']),float(k['v'])): return
+        except (KeyError,ValueError,TypeError): return
+        self._kline_live[key]=now; self.recv_ts[s]=now
+
+# ── REPLAY ─────────────────────────────────────────────────
+class _ReplayResponse:
+    status_code=200; headers={}
+    def __init__(self,body): self._b=body
+    def json(self): return self._b
+    @property
+    def text(self): return json.dumps(self._b)
+
+class ReplayClient(BinanceClient):
+    # MarketRecorder dosyasını sanal saatle oynatır: REST istekleri o anki (<= now)
+    # son yanıttan, WS mesajları kayıt sırasıyla pompalanarak karşılanır. Ağ yok.
+    # Kayıttaki kline yanıtları çoğunlukla artımlıdır (startTime, küçük limit); bu yüzden
+    # tüm satırlar (sembol, interval) başına açılış zamanına göre tek tabloda birleştirilir
+    # ve her yanıt o tablodan kurulur (mum başına now anındaki son kayıtlı hali).
+    def __init__(self,path,speed=1.0,**kw):
+        self.path=path; rest={}; ws=[]
+        with gzip.open(path,'rt',encoding='utf-8') as f:
+            for line in f:
+                try: rec=json.loads(line)
+                except ValueError: continue  # yarım kalmış son satır
+                if rec.get('k')=='ws': ws.append((rec['t'],rec['b'])); continue
+                rest.setdefault(self._key(rec['p'],rec.get('q') or {}),([],[]))
+                ts,bs=rest[self._key(rec['p'],rec.get('q') or {})]; ts.append(rec['t']); bs.append(rec['b'])
+        if not rest and not ws: raise ValueError(f"bos kayit: {path}")
+        t0=min([v[0][0] for v in rest.values()]+[t for t,_ in ws[:1]])
+        self.t_end=max([v[0][-1] for v in rest.values()]+[t for t,_ in ws[-1:]])
+        self._rest=rest; self._wsrec=ws; self._kl={}
+        for (p,sym,iv),(ts,bs) in rest.items():
+            if p!='/fapi/v1/klines': continue
+            tab={}
+            for t,b in zip(ts,bs):
+                for k in b if isinstance(b,list) else ():
+                    v=tab.setdefault(int(k[0]),([],[])); v[0].append(t); v[1].append(k)
+            ot=sorted(tab); self._kl[(sym,iv)]=(ot,[tab[x] for x in ot])
+        self.clock=VirtualClock(t0,speed)
+        self.replay_stats={'served':0,'missing':0,'ws':len(ws)}
+        print(f"▶ Replay: {path} | {sum(len(v[0]) for v in rest.values())} REST + {len(ws)} WS kaydi | "
+              f"{(self.t_end-t0)/60:.1f}dk @ x{self.clock.speed:g}")
+        kw['warm']=False
+        super().__init__(**kw)
+
+    @staticmethod
+    def _key(path,q):
+        return (path,q.get('symbol',''),q.get('interval',''))
+
+    def _get(self,path,params=None,timeout=10,prio=RequestScheduler.PRIO_SCAN,base=None):
+        params=params or {}; now=self.clock.now()
+        if path=='/fapi/v1/klines': return self._replay_klines(params,now)
+        rec=self._rest.get(self._key(path,params))
+        if not rec: self.replay_stats['missing']+=1; return None
+        ts,bs=rec
+        i=bisect.bisect_right(ts,now)-1
+        if i<0: self.replay_stats['missing']+=1; return None
+        self.replay_stats['served']+=1
+        return _ReplayResponse(bs[i])
+
+    def _replay_klines(self,params,now):
+        # Gelecekteki mumlar asla sızmaz; startTime/limit canlı API gibi uygulanır
+        # (startTime varsa ondan itibaren ilk `limit`, yoksa son `limit` mum)
+        tab=self._kl.get((params.get('symbol',''),params.get('interval','')))
+        if not tab: self.replay_stats['missing']+=1; return None
+        ot,vers=tab; limit=int(params.get('limit',500)); st=params.get('startTime')
+        hi=bisect.bisect_right(ot,now*1000)
+        if st is None: lo=max(0,hi-limit)
+        else: lo=bisect.bisect_left(ot,int(st)); hi=min(hi,lo+limit)
+        body=[]
+        for ts,rows in vers[lo:hi]:
+            j=bisect.bisect_right(ts,now)-1
+            if j<0:
+                # now'dan önce kaydı yok: kapanmış mum değişmez (ilk kaydı kullanılır);
+                # oluşan mumun sonraki hali gelecektir, atlanır (tablo sıralı, sonuncusudur)
+                if int(rows[0][6])>now*1000: break
+                j=0
+            body.append(rows[j])
+        self.replay_stats['served']+=1
+        return _ReplayResponse(body)
+
+    def start_stream(self):
+        if not self._wsrec or self._ws_run: return
+        self._ws_run=True
+        self._ws_thread=threading.Thread(target=self._ws_pump,daemon=True); self._ws_thread.start()
+
+    def _ws_pump(self):
+        ts=[t for t,_ in self._wsrec]
+        i=bisect.bisect_right(ts,self.clock.now())
+        self._ws_connected=True
+        while self._ws_run and i<len(ts):
+            wait=ts[i]-self.clock.now()
+            if wait>0: self.clock.sleep(min(wait,1.0)); continue
+            self._ws_dispatch(self._wsrec[i][1]); i+=1
+        self._ws_connected=False
+
+    def _ws_send(self,method,params): pass  # kayıttaki tüm stream'ler zaten oynatılıyor
+    def exhausted(self): return self.clock.now()>self.t_end
+    def save_snapshot(self,path=None): return False
+
+# ── ASYNC REST ─────────────────────────────────────────────
+class _AsyncResponse:
+    # aiohttp yanıtının requests benzeri kabuğu (RequestScheduler.observe / recorder için)
+    def __init__(self,status,headers,text): self.status_code=status; self.headers=headers; self.text=text
+    def json(self): return json.loads(self.text)
+
+class AsyncRest:
+    """BinanceClient REST uçlarının asyncio karşılığı.
+
+    Aynı ağırlık bütçesi (RequestScheduler), kayıt (MarketRecorder) ve kline
+    tamponları kullanılır; sadece taşıma değişir. aiohttp yoksa ya da istemci
+    ReplayClient ise istekler iş parçacığında BinanceClient._get ile yapılır.
+    """
+    def __init__(self,bc):
+        self.bc=bc; self.session=None
+
+    async def open(self):
+        if AIOHTTP_ENABLED and type(self.bc)._get is BinanceClient._get:
+            self.session=aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.bc.POOL))
+        return self
+
+    async def close(self):
+        if self.session: await self.session.close(); self.session=None
+
+    async def get(self,path,params=None,timeout=10,prio=RequestScheduler.PRIO_SCAN):
+        bc=self.bc
+        if self.session is None: return await asyncio.to_thread(bc._get,path,params,timeout,prio)
+        w=bc.rl.weight(path,params)
+        # Bütçe hemen varsa döngüyü bırakmadan al; yoksa bekleme iş parçacığında
+        if not bc.rl.try_acquire(w,prio) and not await asyncio.to_thread(bc.rl.acquire,w,prio): return None
+        q={k:str(v) for k,v in (params or {}).items()}
+        async with self.session.get(f"{bc.BASE}{path}",params=q,proxy=bc.proxies,
+                                    timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            r=_AsyncResponse(resp.status,resp.headers,await resp.text())
+        bc.rl.observe(r)
+        if bc.recorder and r.status_code==200: bc.recorder.rest(path,params,r.text)
+        return r
+
+    async def refresh_prices(self):
+        try:
+            r=await self.get("/fapi/v1/ticker/price",timeout=5,prio=RequestScheduler.PRIO_TICKER)
+            if r is not None: self.bc._apply_prices(r.json())
+        except Exception: pass
+
+    async def refresh_tickers(self):
+        try:
+            r=await self.get("/fapi/v1/ticker/24hr",timeout=10,prio=RequestScheduler.PRIO_TICKER)
+            data=r.json() if r is not None else None
+            if isinstance(data,list): self.bc._apply_tickers(data); self.bc._notify()
+        except Exception: pass
+
+    async def candles(self,symbol,interval='5m',limit=80,max_age=10,prio=RequestScheduler.PRIO_SCAN):
+        bc=self.bc
+        buf,req,now=bc._kl_plan(symbol,interval,limit,max_age)
+        if req is None: return buf
+        params={'symbol':symbol,'interval':interval,'limit':req[0]}
+        if req[1] is not None: params['startTime']=req[1]
+        rows=[]
+        try:
+            r=await self.get("/fapi/v1/klines",params,10,prio)
+            if r is not None and r.status_code==200: rows=r.json()
+            elif r is not None: print(f"Klines API error for {symbol}: status {r.status_code}")
+        except Exception as e: print(f"Klines fetch error for {symbol}: {e}")
+        return bc._kl_apply(symbol,interval,buf,req,rows,now)
+
+    async def prefetch(self,symbols,interval='5m',limit=80,max_age=10,prio=RequestScheduler.PRIO_SCAN):
+        # BinanceClient.prefetch gibi, ama iş parçacığı havuzu yerine tek döngüde eşzamanlı
+        syms=list(dict.fromkeys(symbols))
+        for e in await asyncio.gather(*(self.candles(s,interval,limit,max_age,prio) for s in syms),return_exceptions=True):
+            if isinstance(e,Exception): print(f"prefetch error: {e}")
+        return len(syms)
 
 # ── TECHNICAL ANALYSIS ─────────────────────────────────────
 class TA:
@@ -205,7 +921,7 @@ class TA:
 
     @staticmethod
     def ema(p,n):
-        if not p or len(p)<n: return p[-1] if p else 0
+        if len(p)<n: return p[-1] if len(p) else 0
         m=2/(n+1); e=sum(p[-n:])/n
         for x in p[-n+1:]: e=(x-e)*m+e
         return e
@@ -226,12 +942,12 @@ class TA:
         return mid+2*std,mid,mid-2*std
 
     @staticmethod
-    def atr(klines,n=14):
-        if len(klines)<n+1: return 0
+    def atr(h,l,c,n=14):
+        if len(c)<n+1: return 0
         trs=[]
-        for i in range(1,len(klines)):
-            h,l,pc=klines[i]['h'],klines[i]['l'],klines[i-1]['c']
-            trs.append(max(h-l,abs(h-pc),abs(l-pc)))
+        for i in range(1,len(c)):
+            pc=c[i-1]
+            trs.append(max(h[i]-l[i],abs(h[i]-pc),abs(l[i]-pc)))
         return sum(trs[-n:])/n
 
     @staticmethod
@@ -242,34 +958,731 @@ class TA:
         return (p[-1]-lo)/(hi-lo)*100
 
     @staticmethod
-    def vwap(klines):
-        if not klines: return 0
-        tv=sum((k['h']+k['l']+k['c'])/3*k['v'] for k in klines)
-        v=sum(k['v'] for k in klines)
-        return tv/v if v>0 else 0
+    def vwap(h,l,c,v):
+        if not len(c): return 0
+        tv=sum((h[i]+l[i]+c[i])/3*v[i] for i in range(len(c)))
+        vs=sum(v)
+        return tv/vs if vs>0 else 0
+
+    @staticmethod
+    def indicators(h,l,c,v):
+        # Agent.analyze'ın kullandığı son değerler (saf Python motoru)
+        macd,msig=TA.macd(c); bbu,bbm,bbl=TA.bb(c)
+        avg_v=sum(v[-20:])/20
+        return dict(rsi=TA.rsi(c),stoch=TA.stoch(c),macd=macd,msig=msig,
+                    e20=TA.ema(c,20),e50=TA.ema(c,50),bbu=bbu,bbm=bbm,bbl=bbl,
+                    atr=TA.atr(h,l,c),vwap=TA.vwap(h[-20:],l[-20:],c[-20:],v[-20:]),
+                    vr=v[-1]/avg_v if avg_v>0 else 1)
+
+# ── VECTORIZED TECHNICAL ANALYSIS ──────────────────────────
+class TAVec:
+    """TA ile aynı tanımların NumPy sürümü: tüm seri tek geçişte, son eksen boyunca.
+
+    series()[k][..., t] == TA'nın c[:t+1] üzerindeki sonucu (kenar durumları dahil),
+    bu yüzden girdi 1-D (tek sembol) ya da 2-D (sembol x mum) olabilir. TA.ema'nın
+    "son n değer, SMA tohumu" tanımı sabit ağırlıklı bir FIR filtresidir; MACD
+    sinyali de bu sayede karesel değil doğrusal maliyetle hesaplanır.
+    parity() iki motoru aynı pencerede çalıştırıp farkları döndürür; beklenen fark
+    yalnızca toplama sırasından gelen ~1e-12 göreli sapmadır.
+    """
+    _W={}
+
+    @staticmethod
+    def _win(x,n): return np.lib.stride_tricks.sliding_window_view(x,n,axis=-1)
+
+    @classmethod
+    def _ema_w(cls,n):
+        w=cls._W.get(n)
+        if w is None:
+            m=2/(n+1); k=np.arange(1,n)
+            w=np.full(n,(1-m)**(n-1)/n); w[1:]+=m*(1-m)**(n-1-k)
+            cls._W[n]=w
+        return w
+
+    @classmethod
+    def ema(cls,p,n):
+        out=p.astype(float,copy=True)  # TA: len<n ise son fiyat
+        if p.shape[-1]>=n: out[...,n-1:]=cls._win(p,n)@cls._ema_w(n)
+        return out
+
+    @classmethod
+    def rsi(cls,p,n=14):
+        out=np.full(p.shape,50.0)
+        if p.shape[-1]<n+1: return out
+        d=np.diff(p,axis=-1)
+        ag=cls._win(np.maximum(d,0),n).sum(-1)/n; al=cls._win(np.maximum(-d,0),n).sum(-1)/n
+        with np.errstate(divide='ignore',invalid='ignore'):
+            out[...,n:]=np.where(al==0,100.0,100-100/(1+ag/al))
+        return out
+
+    @classmethod
+    def macd(cls,p):
+        L=p.shape[-1]; m=np.zeros(p.shape); sig=np.zeros(p.shape)
+        if L<26: return m,sig
+        m[...,25:]=(cls.ema(p,12)-cls.ema(p,26))[...,25:]
+        sig[...,25:]=m[...,25:]*0.9  # sinyal için 9 değer yoksa
+        if L>=35:
+            # TA.macd: sinyal, mevcut mum hariç önceki MACD değerlerinin EMA9'u
+            sig[...,34:]=(cls._win(m[...,25:],9)@cls._ema_w(9))[...,:-1]
+        return m,sig
+
+    @classmethod
+    def bb(cls,p,n=20):
+        up=p.astype(float,copy=True); mid=up.copy(); lo=up.copy()
+        if p.shape[-1]>=n:
+            w=cls._win(p,n); mu=w.mean(-1); sd=w.std(-1)
+            up[...,n-1:]=mu+2*sd; mid[...,n-1:]=mu; lo[...,n-1:]=mu-2*sd
+        return up,mid,lo
+
+    @classmethod
+    def atr(cls,h,l,c,n=14):
+        out=np.zeros(c.shape)
+        if c.shape[-1]<n+1: return out
+        pc=c[...,:-1]; hh=h[...,1:]; ll=l[...,1:]
+        tr=np.maximum(hh-ll,np.maximum(np.abs(hh-pc),np.abs(ll-pc)))
+        out[...,n:]=cls._win(tr,n).sum(-1)/n
+        return out
+
+    @classmethod
+    def stoch(cls,p,n=14):
+        out=np.full(p.shape,50.0)
+        if p.shape[-1]<n: return out
+        w=cls._win(p,n); lo=w.min(-1); hi=w.max(-1); rng=hi-lo
+        with np.errstate(divide='ignore',invalid='ignore'):
+            out[...,n-1:]=np.where(rng==0,50.0,(p[...,n-1:]-lo)/rng*100)
+        return out
+
+    @classmethod
+    def _rsum(cls,x,n):
+        # Son n değerin toplamı; ilk n-1 konumda mevcut olanların toplamı
+        out=np.cumsum(x,axis=-1)
+        if x.shape[-1]>=n: out[...,n-1:]=cls._win(x,n).sum(-1)
+        return out
+
+    @classmethod
+    def vwap(cls,h,l,c,v,n=20):
+        tv=cls._rsum((h+l+c)/3*v,n); vs=cls._rsum(v,n)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            return np.where(vs>0,tv/vs,0.0)
+
+    @classmethod
+    def vr(cls,v,n=20):
+        avg=cls._rsum(v,n)/n
+        with np.errstate(divide='ignore',invalid='ignore'):
+            return np.where(avg>0,v/avg,1.0)
+
+    @classmethod
+    def series(cls,h,l,c,v):
+        macd,msig=cls.macd(c); bbu,bbm,bbl=cls.bb(c)
+        return dict(rsi=cls.rsi(c),stoch=cls.stoch(c),macd=macd,msig=msig,
+                    e20=cls.ema(c,20),e50=cls.ema(c,50),bbu=bbu,bbm=bbm,bbl=bbl,
+                    atr=cls.atr(h,l,c),vwap=cls.vwap(h,l,c,v),vr=cls.vr(v))
+
+    @classmethod
+    def indicators(cls,h,l,c,v):
+        # TA.indicators ile aynı anahtarlar, sadece son değerler. Her gösterge
+        # son <=50 muma bağlı olduğundan tam seri yerine kuyruk üzerinde çalışır.
+        L=c.shape[-1]
+        if L<50: out={k:s[...,-1] for k,s in cls.series(h,l,c,v).items()}
+        else:
+            c50=c[...,-50:]; e12=c50[...,-12:]@cls._ema_w(12)
+            d=np.diff(c[...,-15:],axis=-1); ag=np.maximum(d,0).sum(-1)/14; al=np.maximum(-d,0).sum(-1)/14
+            m=cls.ema(c[...,-35:-1],12)[...,-9:]-cls.ema(c[...,-35:-1],26)[...,-9:]
+            w14=c[...,-14:]; lo=w14.min(-1); rng=w14.max(-1)-lo
+            w20=c[...,-20:]; mu=w20.mean(-1); sd=w20.std(-1)
+            hh,ll,pc=h[...,-14:],l[...,-14:],c[...,-15:-1]
+            tr=np.maximum(hh-ll,np.maximum(np.abs(hh-pc),np.abs(ll-pc)))
+            v20=v[...,-20:]; vs=v20.sum(-1); tv=((h[...,-20:]+l[...,-20:]+w20)/3*v20).sum(-1)
+            with np.errstate(divide='ignore',invalid='ignore'):
+                out=dict(rsi=np.where(al==0,100.0,100-100/(1+ag/al)),
+                         stoch=np.where(rng==0,50.0,(c[...,-1]-lo)/rng*100),
+                         macd=e12-c[...,-26:]@cls._ema_w(26),msig=m@cls._ema_w(9),
+                         e20=w20@cls._ema_w(20),e50=c50@cls._ema_w(50),
+                         bbu=mu+2*sd,bbm=mu,bbl=mu-2*sd,atr=tr.sum(-1)/14,
+                         vwap=np.where(vs>0,tv/vs,0.0),vr=np.where(vs>0,v[...,-1]/(vs/20),1.0))
+        return {k:float(x) for k,x in out.items()} if c.ndim==1 else out
+
+    @classmethod
+    def parity(cls,h,l,c,v):
+        """Aynı pencere için |TA - TAVec| farkları; A/B karşılaştırması için."""
+        ref=TA.indicators(*(np.asarray(x,float).tolist() for x in (h,l,c,v)))
+        vec=cls.indicators(*(np.asarray(x,float) for x in (h,l,c,v)))
+        return {k:abs(float(ref[k])-vec[k]) for k in ref}
+
+# ── INCREMENTAL TECHNICAL ANALYSIS ─────────────────────────
+class _Roll:
+    # Son n değerin kayan toplamı
+    __slots__=('q','n','s')
+    def __init__(self,n): self.q=deque(); self.n=n; self.s=0.0
+    def push(self,x):
+        self.q.append(x); self.s+=x
+        if len(self.q)>self.n: self.s-=self.q.popleft()
+    def full(self): return len(self.q)==self.n
+    def resync(self): self.s=math.fsum(self.q)
+
+class _Fir:
+    # TA.ema(p,n) = A*Σ(son n) + m*Σ r^j x_(t-j) (j<n-1); kapanmış son n-1 değer tutulur
+    __slots__=('n','m','r','A','rn','q','S','G')
+    def __init__(self,n):
+        self.n=n; self.m=2/(n+1); self.r=1-self.m
+        self.A=self.r**(n-1)/n; self.rn=self.r**(n-2)
+        self.q=deque(); self.S=0.0; self.G=0.0
+    def push(self,x):
+        self.q.append(x); self.S+=x; self.G=x+self.r*self.G
+        if len(self.q)>self.n-1: self.S-=self.q.popleft()
+        if len(self.q)==self.n-1: self.G-=self.rn*self.q[0]
+    def ready(self): return len(self.q)==self.n-1
+    def peek(self,x): return self.A*(self.S+x)+self.m*(x+self.r*self.G)
+    def resync(self):
+        self.S=math.fsum(self.q); g=0.0
+        for x in list(self.q)[1:] if len(self.q)==self.n-1 else self.q: g=x+self.r*g
+        self.G=g
+
+class IncTA:
+    """Tek (sembol, interval) için O(1) artımlı gösterge durumu.
+
+    Kapanmış mumlar push() ile bir kez işlenir; oluşan mum peek() ile durumu
+    değiştirmeden hesaba katılır. Tanımlar TA ile birebir aynıdır (RSI dahil:
+    Wilder değil, TA.rsi'deki son 14 farkın basit ortalaması), bu yüzden mum
+    kapanışında sonuçlar tam hesaplamayla aynıdır; kayan toplamlar birikmiş
+    kayan nokta hatasını önlemek için RESYNC mumda bir baştan toplanır.
+    """
+    WARM=49      # en uzun pencere EMA50: 49 kapanmış mum + oluşan mum
+    REBUILD=64   # yeniden kurulumda işlenecek kapanmış mum sayısı
+    RESYNC=64
+
+    def __init__(self):
+        self.t=None; self.n=0; self.prev=None
+        self.g=_Roll(13); self.ls=_Roll(13); self.tr=_Roll(13)
+        self.c1=_Roll(19); self.c2=_Roll(19); self.K=None
+        self.tpv=_Roll(19); self.vol=_Roll(19)
+        self.mn=deque(); self.mx=deque()
+        self.e12=_Fir(12); self.e20=_Fir(20); self.e26=_Fir(26); self.e50=_Fir(50)
+        self.mq=deque(maxlen=9); self.sig=None
+
+    def ready(self): return self.e50.ready()
+
+    def push(self,t,h,l,c,v):
+        pc=self.prev
+        if pc is not None:
+            d=c-pc; self.g.push(d if d>0 else 0.0); self.ls.push(-d if d<0 else 0.0)
+            self.tr.push(max(h-l,abs(h-pc),abs(l-pc)))
+        if self.e26.ready():
+            # Bu mumda biten pencerenin MACD'si - sinyal hattı bunlardan oluşur
+            self.mq.append(self.e12.peek(c)-self.e26.peek(c))
+            if len(self.mq)==9: self.sig=float(np.dot(self.mq,TAVec._ema_w(9)))
+        for e in (self.e12,self.e20,self.e26,self.e50): e.push(c)
+        if self.K is None: self.K=c
+        self.c1.push(c-self.K); self.c2.push((c-self.K)**2)
+        self.tpv.push((h+l+c)/3*v); self.vol.push(v)
+        i=self.n
+        while self.mn and self.mn[-1][1]>=c: self.mn.pop()
+        while self.mx and self.mx[-1][1]<=c: self.mx.pop()
+        self.mn.append((i,c)); self.mx.append((i,c))
+        while self.mn[0][0]<=i-13: self.mn.popleft()
+        while self.mx[0][0]<=i-13: self.mx.popleft()
+        self.t=t; self.prev=c; self.n+=1
+        if self.n%self.RESYNC==0: self._resync()
+
+    def _resync(self):
+        cs=[x+self.K for x in self.c1.q]; self.K=self.prev
+        self.c1=_Roll(19); self.c2=_Roll(19)
+        for x in cs: self.c1.push(x-self.K); self.c2.push((x-self.K)**2)
+        for r in (self.g,self.ls,self.tr,self.c1,self.c2,self.tpv,self.vol): r.resync()
+        for e in (self.e12,self.e20,self.e26,self.e50): e.resync()
+
+    def sync(self,buf):
+        # Tampondaki yeni kapanmış mumları işler (son mum oluşan mumdur)
+        t,o,h,l,c,v=buf.view(); n=len(t)-1
+        if n<=0: return
+        i=int(np.searchsorted(t[:n],self.t,'right')) if self.t is not None else 0
+        if self.t is None or i==0 or int(t[i-1])!=self.t or n-i>self.REBUILD:
+            self.__init__(); i=max(0,n-self.REBUILD)
+        for j in range(i,n):
+            self.push(int(t[j]),float(h[j]),float(l[j]),float(c[j]),float(v[j]))
+
+    def peek(self,h,l,c,v):
+        pc=self.prev; d=c-pc
+        ag=(self.g.s+(d if d>0 else 0.0))/14; al=(self.ls.s+(-d if d<0 else 0.0))/14
+        lo=min(self.mn[0][1],c); hi=max(self.mx[0][1],c)
+        x=c-self.K; mu=(self.c1.s+x)/20; var=(self.c2.s+x*x)/20-mu*mu
+        sd=math.sqrt(var) if var>0 else 0.0; mu+=self.K
+        tv=self.tpv.s+(h+l+c)/3*v; vs=self.vol.s+v
+        macd=self.e12.peek(c)-self.e26.peek(c)
+        return dict(rsi=100.0 if al==0 else 100-100/(1+ag/al),
+                    stoch=50.0 if hi==lo else (c-lo)/(hi-lo)*100,
+                    macd=macd,msig=self.sig if self.sig is not None else macd*0.9,
+                    e20=self.e20.peek(c),e50=self.e50.peek(c),
+                    bbu=mu+2*sd,bbm=mu,bbl=mu-2*sd,
+                    atr=(self.tr.s+max(h-l,abs(h-pc),abs(l-pc)))/14,
+                    vwap=tv/vs if vs>0 else 0.0,vr=v/(vs/20) if vs>0 else 1.0)
+
+# ── ANALYSIS CACHE ─────────────────────────────────────────
+class AnalysisCache:
+    """analyze() sonuçları için sınırlı LRU önbellek.
+
+    Anahtar (sym, interval, son mum açılış zamanı, son kapanış) olduğundan aynı
+    mum ve fiyat için decide(), update() ve /api/debug tek bir analizi paylaşır.
+    """
+    MISS=object()
+
+    def __init__(self,cap=1024):
+        self.cap=cap; self._d=OrderedDict(); self._lock=threading.Lock()
+        self.hits=0; self.misses=0
+
+    @staticmethod
+    def key(sym,interval,buf):
+        return (sym,interval,buf.last_t(),float(buf.col('c',1)[0]))
+
+    def get(self,key,count=True):
+        with self._lock:
+            val=self._d.get(key,self.MISS)
+            if val is not self.MISS: self._d.move_to_end(key)
+            if count:
+                if val is self.MISS: self.misses+=1
+                else: self.hits+=1
+            return val
+
+    def put(self,key,val):
+        with self._lock:
+            self._d[key]=val; self._d.move_to_end(key)
+            while len(self._d)>self.cap: self._d.popitem(last=False)
+
+    def clear(self):
+        with self._lock: self._d.clear()
+
+    def stats(self):
+        n=self.hits+self.misses
+        return dict(hits=self.hits,misses=self.misses,size=len(self._d),
+                    hit_rate=round(self.hits/n*100,1) if n else 0.0)
+
+# ── RING BUFFER & TRADE LOG ────────────────────────────────
+class RingBuffer:
+    """Sabit kapasiteli halka tampon: O(1) ekleme, dolunca en eski kayıt düşer.
+
+    newest_first=True iken indeks 0 en yeni kayıttır (history, events); False iken
+    kronolojik sıradır (PnL eğrisi). list gibi indekslenir, dilimlenir ve yinelenir;
+    dilimler list döndürür, böylece history[:60] doğrudan JSON'a yazılır.
+    """
+    __slots__=('cap','newest_first','_a','_w','n')
+
+    def __init__(self,cap,newest_first=True,items=()):
+        self.cap=cap; self.newest_first=newest_first; self._a=[None]*cap; self._w=0; self.n=0
+        for x in items: self.append(x)  # kronolojik sırayla
+
+    def append(self,x):
+        self._a[self._w]=x; self._w=(self._w+1)%self.cap
+        if self.n<self.cap: self.n+=1
+
+    def clear(self): self._a=[None]*self.cap; self._w=0; self.n=0
+    def __len__(self): return self.n
+    def __iter__(self): return iter(self[:])
+
+    def _at(self,k):
+        return self._a[(self._w-1-k)%self.cap if self.newest_first else (self._w-self.n+k)%self.cap]
+
+    def __getitem__(self,k):
+        if isinstance(k,slice): return [self._at(i) for i in range(*k.indices(self.n))]
+        if k<0: k+=self.n
+        if not 0<=k<self.n: raise IndexError('RingBuffer index out of range')
+        return self._at(k)
+
+class TradeLog:
+    """Kapanan işlemler (Agent.all_trades): son `keep` kayıt bellekte, hepsi diskte.
+
+    Yol verilmişse her kayıt JSONL olarak eklenir ve eski kayıtlar sadece oradan
+    okunur; bellek kullanımı işlem sayısından bağımsızdır (kayıt başına sadece
+    8 baytlık pnl kolonu tutulur, Monte Carlo için). Bellekte olmayan eski kayıtlar
+    dict olarak döner. Yol yoksa `keep`ten eski kayıtlar düşer. Dosya kırpılmaz:
+    önceki çalıştırmaların kayıtları başta kalır, bu çalıştırmanınkiler `_base`
+    ofsetinden başlar (journal ile kurtarmada restore() konumlandırır).
+    """
+    def __init__(self,path=None,keep=5000):
+        self.path=path; self.tail=RingBuffer(keep,newest_first=False); self.n=0
+        self._offs=RingBuffer(keep,newest_first=False)  # tail kayıtlarının dosya ofsetleri
+        self._pnl=np.zeros(1024); self._f=open(path,'ab',buffering=1<<16) if path else None
+        self._base=self._f.tell() if self._f else 0  # bu çalıştırmanın ilk kaydının ofseti
+
+    def __len__(self): return self.n
+
+    def append(self,t):
+        self.tail.append(t)
+        if self.n==len(self._pnl): self._pnl=np.concatenate((self._pnl,np.zeros(self.n)))
+        self._pnl[self.n]=t['pnl'] if isinstance(t,dict) else t.pnl; self.n+=1
+        if self._f:
+            self._offs.append(self._f.tell())
+            self._f.write(json.dumps(t if isinstance(t,dict) else vars(t),default=_jsonable).encode()+b'\n')
+
+    def pnls(self): return self._pnl[:self.n].copy()
+
+    def _disk(self,stop):
+        # İlk `stop` kayıt diskten (bellekte tutulmayanlar)
+        if not self._f or not stop: return []
+        self._f.flush(); out=[]
+        with open(self.path,'rb') as f:
+            f.seek(self._base)
+            for line in f:
+                if len(out)>=stop: break
+                out.append(json.loads(line))
+        return out
+
+    def __getitem__(self,k):
+        n=self.n; first=n-len(self.tail)  # bellekteki ilk kaydın sıra numarası
+        if isinstance(k,slice):
+            idx=range(*k.indices(n))
+            if not idx: return []
+            lo=min(idx[0],idx[-1])
+            old=self._disk(first) if lo<first else []
+            return [old[i] if i<first else self.tail[i-first] for i in idx]
+        if k<0: k+=n
+        if not 0<=k<n: raise IndexError('TradeLog index out of range')
+        return self.tail[k-first] if k>=first else self._disk(k+1)[k]
+
+    def __iter__(self):
+        first=self.n-len(self.tail)
+        yield from self._disk(first)
+        yield from self.tail
+
+    # ── Journal snapshot/recovery ──
+    def mark(self):
+        # Anlık konum: (kayıt sayısı, dosya sonu, tail başlangıcı, ilk kayıt); snapshot'a yazılır
+        self.flush()
+        end=self._f.tell() if self._f else 0
+        return dict(n=self.n,end=end,tail=self._offs[0] if len(self._offs) else end,base=self._base)
+
+    def restore(self,m,pnl,tail=()):
+        # Dosyayı snapshot anına kırpar (sonrası journal'dan yeniden eklenir), tail'i okur
+        self.n=m['n']; self._pnl=np.zeros(max(1024,2*self.n)); self._pnl[:self.n]=pnl[:self.n]
+        self._base=m.get('base',0); self.tail.clear(); self._offs.clear()
+        if not self._f:
+            for t in tail: self.tail.append(t)
+            return
+        self._f.close(); self._f=open(self.path,'r+b'); self._f.truncate(m['end'])
+        self._f.seek(m['tail']); off=m['tail']
+        for line in self._f.read(m['end']-m['tail']).splitlines(keepends=True):
+            self.tail.append(json.loads(line)); self._offs.append(off); off+=len(line)
+        self._f.close(); self._f=open(self.path,'ab',buffering=1<<16)
+
+    def flush(self):
+        if self._f: self._f.flush()
+
+    def sync(self):
+        if self._f: self._f.flush(); os.fsync(self._f.fileno())
+
+    def close(self):
+        if self._f: self._f.close(); self._f=None
+
+def _jsonable(o):
+    # numpy skalerleri ve datetime'lar için json.dumps default'u
+    if hasattr(o,'item'): return o.item()
+    return o.isoformat() if hasattr(o,'isoformat') else str(o)
+
+# ── JOURNAL ────────────────────────────────────────────────
+class Journal:
+    """Agent durumunun write-ahead günlüğü (satır başına bir JSON olay) ve kurtarma.
+
+    Olaylar: o=pozisyon açıldı, m=pozisyon işaretleri (en fazla MARK_S'de bir),
+    c=pozisyon kapandı (kayıt + bakiye/sayaçlar/strateji ağırlığı sonrası),
+    r=risk ayarı. Yazımlar tamponlanır, fsync en fazla SYNC_S'de bir yapılır: log()
+    içinde ya da yeni olay gelmezse motorun her tick çağırdığı Engine.flush() ile;
+    çökmede en çok son SYNC_S saniyelik olaylar kaybolur (SIGTERM/çıkışta hiçbiri).
+    SNAP_EVENTS olay ya da SNAP_S saniyede bir tüm durum atomik olarak
+    <path>.snap.json'a (pnl kolonu <path>.pnl.npy) yazılır ve günlük kırpılır.
+    Kurtarma: snapshot + sırası snapshot'tan büyük olayların yeniden oynatılması;
+    yarım yazılmış son satır yok sayılır.
+    """
+    SYNC_S=1.0; MARK_S=5.0; SNAP_EVENTS=5000; SNAP_S=300.0
+
+    def __init__(self,path):
+        self.path=path; self.snap_path=path+'.snap.json'; self.pnl_path=path+'.pnl.npy'
+        self.seq=0; self.since=0; self._f=None; self.lock=threading.Lock(); self._dirty=False
+        self._synced=self._snapped=self._marked=time.monotonic()
+        self.stats={'events':0,'syncs':0,'snapshots':0,'replayed':0,'recover_ms':None,'snapshot_ms':None}
+
+    def log(self,e,**kw):
+        kw['e']=e
+        with self.lock:
+            if not self._f: return
+            self.seq+=1; kw['n']=self.seq; self.since+=1; self.stats['events']+=1
+            self._f.write(json.dumps(kw,separators=(',',':'),default=_jsonable).encode()+b'\n'); self._dirty=True
+            if time.monotonic()-self._synced>=self.SYNC_S: self._sync()
+
+    def _sync(self):
+        self._f.flush(); os.fsync(self._f.fileno())
+        self._synced=time.monotonic(); self._dirty=False; self.stats['syncs']+=1
+
+    def sync(self):
+        # Bekleyen olay varsa diske (fsync); boşta maliyetsiz
+        with self.lock:
+            if self._f and self._dirty: self._sync()
+
+    def mark_due(self):
+        now=time.monotonic()
+        if now-self._marked<self.MARK_S: return False
+        self._marked=now; return True
+
+    def due(self): return self.since>=self.SNAP_EVENTS or time.monotonic()-self._snapped>=self.SNAP_S
+
+    @staticmethod
+    def _atomic(path,write):
+        tmp=path+'.tmp'
+        with open(tmp,'wb') as f: write(f); f.flush(); os.fsync(f.fileno())
+        os.replace(tmp,path)
+
+    def snapshot(self,agent):
+        # Agent'ın sahibi olan iş parçacığından çağrılmalı (motor döngüsü)
+        t0=time.perf_counter()
+        with self.lock:
+            tl=agent.all_trades; tl.sync(); m=tl.mark()
+            if not tl.path: m['rows']=tl.tail[:]
+            # pnl kolonu sadece büyür: eski snapshot + yeni kolon da tutarlıdır
+            self._atomic(self.pnl_path,lambda f: np.save(f,tl.pnls()))
+            snap=dict(n=self.seq,t=time.time(),agent=agent.state_dict(),trades=m)
+            self._atomic(self.snap_path,lambda f: f.write(json.dumps(snap,separators=(',',':'),default=_jsonable).encode()))
+            if self._f: self._f.close()
+            self._f=open(self.path,'wb',buffering=1<<16)  # <= n olaylar artık snapshot'ta
+            self.since=0; self._snapped=self._synced=time.monotonic(); self._dirty=False
+        self.stats['snapshots']+=1; self.stats['snapshot_ms']=round((time.perf_counter()-t0)*1000,1)
+
+    def recover(self,agent):
+        # Snapshot + günlük kuyruğundan Agent durumunu kurar; sonra sıkıştırılmış snapshot alır.
+        # Bir şey kurtarıldıysa True döndürür.
+        t0=time.perf_counter(); seq=0; n=0; found=False
+        try:
+            with open(self.snap_path,'rb') as f: snap=json.loads(f.read())
+        except (OSError,ValueError): snap=None
+        if snap:
+            found=True; seq=snap['n']; agent.load_state(snap['agent'])
+            try: pnl=np.load(self.pnl_path)
+            except (OSError,ValueError): pnl=np.zeros(0)
+            agent.all_trades.restore(snap['trades'],pnl,snap['trades'].get('rows',()))
+        else:
+            agent.all_trades.restore(agent.all_trades.mark(),np.zeros(0))  # önceki kayıtlar korunur
+        try:
+            with open(self.path,'rb') as f:
+                for line in f:
+                    try: ev=json.loads(line)
+                    except ValueError: break  # yarım kalmış son satır
+                    if ev['n']<=seq: continue
+                    agent.replay(ev); seq=ev['n']; n+=1
+        except OSError: pass
+        self.seq=seq; found|=n>0
+        self.stats['replayed']=n; self.stats['recover_ms']=round((time.perf_counter()-t0)*1000,1)
+        self.snapshot(agent)
+        return found
+
+    def close(self):
+        with self.lock:
+            if self._f: self._sync(); self._f.close(); self._f=None
+
+# ── TP/SL TRIGGER INDEX ────────────────────────────────────
+class TriggerIndex:
+    """Sembol başına sıralı fiyat bantları; fiyat güncellemesi sadece bandı aşılan anahtarları döndürür.
+
+    Her anahtarın (pozisyonun) sessiz bandı (lo, hi): lo<p<hi iken hiçbir çıkış
+    kuralı tetiklenemez ve durum değişmez. Alt ve üst kenarlar sembol başına iki
+    sıralı listede tutulur; bir fiyat için aşılan kenarlar bisect ile bulunur
+    (O(log n + k)). lo=inf / hi=-inf her fiyatta tetiklenir. Bandı olmayan
+    sembollerin hiçbir maliyeti yoktur.
+
+    İş parçacığı güvenli DEĞİLDİR: set/_remove/heat liste ve sözlükleri birden çok
+    adımda değiştirir. Sadece ajanı süren iş parçacığından (tick içinde) ya da
+    Engine._tick kilidi tutulurken çağrılmalıdır (ör. HTTP risk güncellemesi).
+    """
+    HOT=(math.inf,-math.inf)
+
+    def __init__(self):
+        self._lo={}; self._hi={}; self._band={}  # sym -> [(lo,key)] / [(hi,key)] ; (sym,key) -> (lo,hi)
+        self.stats={'checks':0,'fired':0}
+
+    def __len__(self): return len(self._band)
+
+    def set(self,sym,key,lo,hi):
+        self._remove(sym,key)  # sembol sırası korunur: due() açılış sırasıyla döner
+        bisect.insort(self._lo.setdefault(sym,[]),(lo,key)); bisect.insort(self._hi.setdefault(sym,[]),(hi,key))
+        self._band[sym,key]=(lo,hi)
+
+    def discard(self,sym,key):
+        if self._remove(sym,key) and not self._lo[sym]: del self._lo[sym],self._hi[sym]
+
+    def _remove(self,sym,key):
+        b=self._band.pop((sym,key),None)
+        if b is None: return False
+        for lst,v in ((self._lo[sym],b[0]),(self._hi[sym],b[1])):
+            del lst[bisect.bisect_left(lst,(v,key))]
+        return True
+
+    def heat(self):
+        # Tüm anahtarları bir sonraki fiyatta tetiklenecek şekilde işaretle (risk ayarı değişti)
+        for sym,key in list(self._band): self.set(sym,key,*self.HOT)
+
+    def fired(self,sym,p):
+        lo=self._lo.get(sym)
+        if not lo: return []
+        hi=self._hi[sym]; self.stats['checks']+=1
+        out=[k for _,k in lo[bisect.bisect_left(lo,(p,)):]]                        # lo >= p
+        out+=[k for _,k in hi[:bisect.bisect_left(hi,(math.nextafter(p,math.inf),))]]  # hi <= p
+        if out: out=list(dict.fromkeys(out)); self.stats['fired']+=len(out)
+        return out
+
+    def due(self,price):
+        # price(sym) -> güncel fiyat (0 = bilinmiyor); [(sym,key)] bandı aşılanlar
+        out=[]
+        for sym in list(self._lo):
+            p=price(sym)
+            if p: out+=[(sym,k) for k in self.fired(sym,p)]
+        return out
+
+# ── POSITION BOOK ──────────────────────────────────────────
+class _PosRow(MutableMapping):
+    # Tek pozisyonun eski dict arayüzü; sayısal alanlar defterin dizilerine yazılır
+    __slots__=('book','i','sym')
+    def __init__(self,book,i,sym): self.book=book; self.i=i; self.sym=sym
+    def __getitem__(self,k):
+        b=self.book; a=b.cols.get(k)
+        if a is not None: return b.TYPES[k](a[self.i])
+        if k=='type': return 'LONG' if b.side[self.i]>0 else 'SHORT'
+        if k=='klines': return b.klines(self.sym)
+        return b.obj[self.i][k]
+    def __setitem__(self,k,v):
+        b=self.book; a=b.cols.get(k)
+        if a is not None: a[self.i]=v
+        elif k=='type': b.side[self.i]=1 if v=='LONG' else -1
+        elif k!='klines': b.obj[self.i][k]=v
+    def __delitem__(self,k): del self.book.obj[self.i][k]
+    def __iter__(self): return iter(('type',*self.book.COLS,'klines',*self.book.obj[self.i]))
+    def __len__(self): return len(self.book.COLS)+2+len(self.book.obj[self.i])
+
+class PositionBook(MutableMapping):
+    """Açık pozisyonlar: sayısal alanlar paralel dizilerde (struct-of-arrays), sym -> slot.
+
+    positions[sym] eski dict arayüzünü taşıyan bir satır görünümü döndürür; böylece
+    exit_reason/close/state değişmeden çalışır. mark() tüm pozisyonları tek vektörel
+    adımda işaretler (pnl, %, MFE/MAE, tick) ve TP/SL'ye değenleri döndürür.
+    'klines' kopyalanmaz: klines(sym) ortak mum deposundan okur.
+    """
+    COLS=('entry','cur','tp','sl','sz','lev','pnl','pnl_pct','max_pnl','min_pnl','ticks')
+    TYPES={**{k:float for k in COLS},'lev':int,'ticks':int}
+
+    def __init__(self,klines=None,cap=16):
+        self.klines=klines or (lambda sym: [])
+        self.cols={k:np.zeros(cap) for k in self.COLS}; self.side=np.zeros(cap)
+        self.obj=[None]*cap; self._slot={}; self._free=list(range(cap-1,-1,-1))
+        self._ri=None; self._ri_key=None  # registry slot önbelleği
+
+    def __len__(self): return len(self._slot)
+    def __iter__(self): return iter(list(self._slot))
+    def __contains__(self,sym): return sym in self._slot
+    def __getitem__(self,sym): return _PosRow(self,self._slot[sym],sym)
+
+    def __setitem__(self,sym,pos):
+        if sym in self._slot: del self[sym]
+        if not self._free: self._grow()
+        i=self._free.pop(); self._slot[sym]=i; self._ri=None
+        self.obj[i]={k:v for k,v in pos.items() if k not in self.cols and k not in ('type','klines')}
+        for k,a in self.cols.items(): a[i]=pos.get(k,0)
+        self.side[i]=1 if pos.get('type','LONG')=='LONG' else -1
+
+    def __delitem__(self,sym):
+        i=self._slot.pop(sym); self.obj[i]=None; self._free.append(i); self._ri=None
+
+    def _grow(self):
+        n=len(self.side)
+        for k,a in self.cols.items(): self.cols[k]=np.concatenate((a,np.zeros(n)))
+        self.side=np.concatenate((self.side,np.zeros(n))); self.obj+=[None]*n
+        self._free+=range(2*n-1,n-1,-1)
+
+    def slots(self): return np.fromiter(self._slot.values(),np.intp,len(self._slot))
+
+    def to_dict(self,sym):
+        # Kalıcı kayıt için düz dict (klines hariç)
+        i=self._slot[sym]
+        return dict({k:self.TYPES[k](a[i]) for k,a in self.cols.items()},
+                    type='LONG' if self.side[i]>0 else 'SHORT',**self.obj[i])
+
+    def prices(self,reg):
+        # Açılış sırasındaki pozisyonların güncel fiyatları (registry'de yoksa 0)
+        if self._ri is None or self._ri_key is not reg:
+            self._ri=np.array([reg.idx.get(s,-1) for s in self._slot],np.intp); self._ri_key=reg
+        return np.where(self._ri>=0,reg.px[self._ri],0.0) if len(self._ri) else np.zeros(0)
+
+    def mark(self,px):
+        # px: açılış sırasındaki fiyatlar; 0 fiyatlılar atlanır. Agent.mark ile aynı
+        # aritmetik; açılış sırasında TP/SL'ye değenlerin maskesini döndürür
+        ok=px>0; i=self.slots()[ok]; p=px[ok]; c=self.cols; d=self.side[i]
+        E=c['entry'][i]; pct=d*(p-E)/E*100*c['lev'][i]; pnl=c['sz'][i]*pct/100
+        c['cur'][i]=p; c['ticks'][i]+=1; c['pnl'][i]=pnl; c['pnl_pct'][i]=pct
+        c['max_pnl'][i]=np.maximum(c['max_pnl'][i],pnl); c['min_pnl'][i]=np.minimum(c['min_pnl'][i],pnl)
+        hit=np.zeros(len(px),bool); hit[ok]=(d*(p-c['tp'][i])>=0)|(d*(p-c['sl'][i])<=0)
+        return hit
+
+# ── MARKET HUB ─────────────────────────────────────────────
+class MarketHub:
+    """Aynı BinanceClient'ı kullanan birden çok Agent için paylaşılan analiz durumu.
+
+    Mum tamponları, fiyatlar ve stream zaten istemcide ortaktır; hub bunlara
+    ek olarak IncTA durumlarını (sadece mumlara bağlı), analiz sonuçlarını ve
+    toplu tarama puanlarını paylaştırır. analyze() sonucu ta_engine ve
+    max_atr_pct'ye bağlı olduğundan bu ikisi aynı olan ajanlar aynı
+    AnalysisCache'i kullanır; toplu puanlar eşiklerden bağımsızdır ve tick
+    (gen) ile REST mum güncellemesi (bc.kl_gen) başına bir kez hesaplanır.
+    Ajanlar aynı tick döngüsünde sırayla çalıştırılmalıdır.
+    """
+    def __init__(self,bc):
+        self.bc=bc; self.inc={}; self._caches={}; self.gen=0; self._scores=(None,None)
+        self.stats_={'scores':0,'scores_shared':0}
+
+    def cache(self,risk):
+        return self._caches.setdefault((risk.get('ta_engine'),risk['max_atr_pct']),AnalysisCache())
+
+    def advance(self): self.gen+=1
+
+    def scores(self,agent):
+        key=(self.gen,self.bc.kl_gen)
+        if self._scores[0]!=key:
+            self._scores=(key,agent._scores(self.bc.symbols)); self.stats_['scores']+=1
+        else: self.stats_['scores_shared']+=1
+        return self._scores[1]
+
+    def stats(self):
+        return dict(inc_states=len(self.inc),**self.stats_,
+                    caches={f"{k[0]}/{k[1]}":c.stats() for k,c in self._caches.items()})
 
 # ── AI AGENT ───────────────────────────────────────────────
 class Agent:
-    def __init__(self,bc):
-        self.bc=bc
+    MIN_CANDLES = 35  # analiz için gereken en az mum (MACD sinyali: 26 + 9); skaler ve toplu yol aynı
+
+    def __init__(self,bc,seed=None,trade_log=None,journal=None,hub=None,name='main',risk=None):
+        # hub: MarketHub (çok ajanlı Engine); risk: varsayılanların üzerine yazılan ayarlar
+        self.bc=bc; self.rng=random.Random(seed); self.hub=hub; self.name=name
         self.balance=10000; self.start_balance=10000; self.peak_balance=10000
-        self.positions={}; self.history=[]
+        self.positions=PositionBook(self._klines); self.history=RingBuffer(200)
         self.trades=0; self.wins=0
         self.total_profit=0; self.total_loss=0
-        self.pnl_curve=[10000]; self.pnl_times=[datetime.now().strftime('%H:%M')]
+        self.pnl_curve=RingBuffer(100,False,[10000]); self.pnl_times=RingBuffer(100,False,[bc.clock.dt().strftime('%H:%M')])
         self.strategies={'Trend Following':1.0,'Mean Reversion':1.0,'Breakout':1.0,'Scalping':1.0,'VWAP Bounce':1.0}
         self.strat_trades={s:{'wins':0,'total':0} for s in self.strategies}
         self._last_analyzed={}
+        self._inc={}  # f"{sym}_{interval}" -> IncTA
+        self.acache=AnalysisCache()
+        self.triggers=TriggerIndex()  # açık pozisyonların sessiz fiyat bantları
         self.risk={
             'max_positions':7,'position_size_pct':9,'leverage':0,
             'tp_pct':2.0,'sl_pct':0.8,'min_score':4,'min_conf':50,
             'max_atr_pct':6,'scan_size':20,'scan_interval':2,
+            'scan_mode':'batch',        # 'batch' (tüm evren tek geçiş) | 'random' (scan_size örneklem)
             # Dinamik Exit Ayarları
             'profit_protect':True,      # Kâr koruma aktif
-            'max_pnl_drawdown':0.4,     # Max PnL'den %40 geri çekilme = çık
+            'max_pnl_drawdown':0.5,     # Max PnL'den %50 geri çekilme = çık
             'loss_recovery':True,        # Zarar toparlanma sinyali bekle
-            'smart_exit_score':-2,       # Bu skorun altında kârda çık (LONG için)
+            'smart_exit_score':-3,       # Bu skorun altında kârda çık (LONG için; SHORT için ters işaret)
+            'loss_cut_pct':2.0,          # Kaldıraçlı zarar bu %'yi geçerse acil kes
+            'sl_near_pct':25,            # Zarardayken girişteki SL mesafesinin bu %'si kaldıysa erken kes
+            'ta_engine':'incremental',   # 'incremental' (IncTA) | 'numpy' (TAVec) | 'python' (TA)
+            'tick_budget_ms':1000,       # tick süre bütçesi; aşılırsa önce tarama kısılır (TickScheduler)
         }
+        if risk: self.risk.update(risk)
+        if hub: self._inc=hub.inc; self.acache=hub.cache(self.risk)
         
         # ── ENHANCED RISK MANAGEMENT ──────────────────────────────
         if IMPROVEMENTS_ENABLED:
@@ -280,24 +1693,52 @@ class Agent:
                 max_correlation=0.7,           # Max 0.7 correlation between positions
                 max_drawdown_limit=0.20        # %20 max drawdown before stopping
             )
-            self.all_trades = []  # Track all trades as Trade objects
+            self.all_trades = TradeLog(trade_log)  # Track all trades as Trade objects
             self.performance_update_counter = 0
             print("✅ Risk Manager başlatıldı: Max risk %2 | Portfolio heat %10 | Max DD %20")
         else:
             self.risk_manager = None
-            self.all_trades = []
+            self.all_trades = TradeLog(trade_log)
+        
+        # ── JOURNAL (crash recovery) ──────────────────────────────
+        self.journal=None; self.recovered=False
+        if journal:
+            j=Journal(journal); self.recovered=j.recover(self); self.journal=j
+            if hub: self.acache=hub.cache(self.risk)  # kurtarılan risk ayarları
 
     def analyze(self,sym):
         try:
-            kl=self.bc.klines(sym,'5m',80)
-            if len(kl)<35: return None
-            c=[k['c'] for k in kl]; v=[k['v'] for k in kl]; price=c[-1]
-            rsi=TA.rsi(c); stoch=TA.stoch(c)
-            macd,msig=TA.macd(c)
-            e20,e50=TA.ema(c,20),TA.ema(c,50)
-            bbu,bbm,bbl=TA.bb(c)
-            atr=TA.atr(kl); vwap=TA.vwap(kl[-20:])
-            avg_v=sum(v[-20:])/20; vr=v[-1]/avg_v if avg_v>0 else 1
+            buf=self.bc.candles(sym,'5m',80)
+            if not buf or len(buf)<self.MIN_CANDLES: return None
+            key=AnalysisCache.key(sym,'5m',buf)
+            a=self.acache.get(key)
+            if a is AnalysisCache.MISS:
+                a=self._analyze(sym,buf); self.acache.put(key,a)
+            return a
+        except: return None
+
+    def _klines(self,sym):
+        # Pozisyon grafiği: ortak mum deposundan, ağ isteği yapmadan
+        buf=self.bc.cached(sym,'5m')
+        return buf.to_dicts(50) if buf else []
+
+    def cached_analysis(self,sym):
+        # Sadece bellekten: ağ isteği yapmaz, sayaçları etkilemez
+        buf=self.bc.cached(sym,'5m')
+        if not buf or len(buf)<self.MIN_CANDLES: return None
+        a=self.acache.get(AnalysisCache.key(sym,'5m',buf),count=False)
+        return None if a is AnalysisCache.MISS else a
+
+    def _analyze(self,sym,buf):
+        try:
+            t,o,h,l,c,v=buf.view(80); price=float(c[-1])
+            eng=self.risk.get('ta_engine')
+            if eng=='python': ind=TA.indicators(h.tolist(),l.tolist(),c.tolist(),v.tolist())
+            elif eng=='incremental': ind=self._inc_indicators(f"{sym}_5m",buf)
+            else: ind=TAVec.indicators(h,l,c,v)
+            rsi,stoch,macd,msig=ind['rsi'],ind['stoch'],ind['macd'],ind['msig']
+            e20,e50,bbu,bbl=ind['e20'],ind['e50'],ind['bbu'],ind['bbl']
+            atr,vwap,vr=ind['atr'],ind['vwap'],ind['vr']
             score=0; reasons=[]
 
             if rsi<23: score+=3; reasons.append(f"RSI asiri satim ({rsi:.0f})")
@@ -324,9 +1765,9 @@ class Agent:
             if vr>3.0: score+=2; reasons.append(f"Hacim patlamasi x{vr:.1f}")
             elif vr>2.0: score+=1; reasons.append(f"Hacim artisi x{vr:.1f}")
             body=abs(c[-1]-c[-2]) if len(c)>1 else 0
-            wick=kl[-1]['h']-kl[-1]['l']
-            lower_wick=min(c[-1],kl[-1]['o'])-kl[-1]['l']
-            upper_wick=kl[-1]['h']-max(c[-1],kl[-1]['o'])
+            wick=h[-1]-l[-1]
+            lower_wick=min(c[-1],o[-1])-l[-1]
+            upper_wick=h[-1]-max(c[-1],o[-1])
             if wick>0:
                 if lower_wick/wick>0.6 and c[-1]>c[-2]: score+=1; reasons.append("Hammer formasyonu")
                 if upper_wick/wick>0.6 and c[-1]<c[-2]: score+=1; reasons.append("Shooting star")
@@ -340,85 +1781,158 @@ class Agent:
                         bbu=round(bbu,6),bbl=round(bbl,6),
                         vwap=round(vwap,6),atr=round(atr,8),
                         atr_pct=round(atr_pct,2),vr=round(vr,2),
-                        reasons=reasons,klines=kl[-50:])
+                        reasons=reasons,klines=buf.to_dicts(50))
         except: return None
 
+    @staticmethod
+    def score_arrays(ind,o,h,l,c,pc):
+        # analyze() puanlamasının vektörel karşılığı (gerekçe metinleri olmadan).
+        # ind: TAVec.indicators/series çıktısı; o,h,l,c: son mum, pc: önceki kapanış
+        rsi,stoch,macd,msig=ind['rsi'],ind['stoch'],ind['macd'],ind['msig']
+        e20,e50,bbu,bbl,vwap,vr=ind['e20'],ind['e50'],ind['bbu'],ind['bbl'],ind['vwap'],ind['vr']
+        sel=np.select
+        score=sel([rsi<23,rsi<30,rsi>77,rsi>70],[3,2,-3,-2],0)
+        score+=sel([stoch<20,stoch>80],[1,-1],0)
+        score+=sel([(macd>msig)&(macd>0),macd>msig,(macd<msig)&(macd<0),macd<msig],[2,1,-2,-1],0)
+        score+=sel([(c>e20)&(e20>e50),(c<e20)&(e20<e50)],[1,-1],0)
+        score+=sel([(pc<e20)&(c>e20),(pc>e20)&(c<e20)],[1,-1],0)
+        score+=sel([c<bbl,c<bbl*1.005,c>bbu,c>bbu*0.995],[2,1,-2,-1],0)
+        score+=sel([c<vwap*0.998,c>vwap*1.002],[1,-1],0)
+        score+=sel([vr>3.0,vr>2.0],[2,1],0)
+        wick=h-l
+        with np.errstate(divide='ignore',invalid='ignore'):
+            lw=(np.minimum(c,o)-l)/wick; uw=(h-np.maximum(c,o))/wick
+        score+=((wick>0)&(lw>0.6)&(c>pc)).astype(int)
+        score+=((wick>0)&(uw>0.6)&(c<pc)).astype(int)
+        return score
+
+    def analyze_batch(self,symbols):
+        # Tüm evrenin son mumlarını (S x 50) tek matriste puanlar; decide()
+        # için eşikleri geçebilecek adayları |skor| ve güvene göre sıralı döndürür
+        if self.hub:
+            syms,score,conf,atr_pct=self.hub.scores(self)
+            keep=set(symbols); sel=np.fromiter((x in keep for x in syms),bool,len(syms))
+        else:
+            syms,score,conf,atr_pct=self._scores(symbols); sel=True
+        if not syms: return []
+        ok=sel&(np.abs(score)>=self.risk['min_score'])&(conf>=self.risk['min_conf'])&(atr_pct<=self.risk['max_atr_pct'])
+        idx=np.flatnonzero(ok)
+        idx=idx[np.lexsort((-conf[idx],-np.abs(score[idx])))]
+        return [dict(sym=syms[i],score=int(score[i]),conf=float(conf[i])) for i in idx]
+
+    def _scores(self,symbols):
+        # Eşiklerden bağımsız kısım: (semboller, skor, güven, ATR %). analyze() gibi
+        # MIN_CANDLES+ mumu olan her sembol puanlanır: 50+ mumlular tek matriste,
+        # daha kısa (yeni listelenmiş) tamponlar uzunluklarına göre gruplanarak
+        short={}
+        for s in symbols:
+            b=self.bc.cached(s,'5m')
+            if b and self.MIN_CANDLES<=len(b)<50: short.setdefault(len(b),[]).append(s)
+        out=([],[],[],[])
+        for syms,o,h,l,c,v in [self.bc.stack(symbols,'5m',50)]+[self.bc.stack(ss,'5m',n) for n,ss in sorted(short.items())]:
+            if not syms: continue
+            ind=TAVec.indicators(h,l,c,v)
+            price=c[:,-1]
+            score=self.score_arrays(ind,o[:,-1],h[:,-1],l[:,-1],price,c[:,-2])
+            with np.errstate(divide='ignore',invalid='ignore'):
+                atr_pct=np.where(price>0,ind['atr']/price*100,0)
+            for dst,x in zip(out,(syms,score,np.minimum(np.abs(score)/8*100,97),atr_pct)): dst.append(x)
+        if not out[0]: return [],None,None,None
+        return [s for ss in out[0] for s in ss],*(np.concatenate(x) for x in out[1:])
+
+    def risk_changed(self):
+        # Eşikler (max_atr_pct, ta_engine) analiz sonucunu, çıkış eşikleri bantları değiştirir
+        if self.hub: self.acache=self.hub.cache(self.risk)
+        else: self.acache.clear()
+        self.triggers.heat()
+
+    def _inc_indicators(self,key,buf):
+        st=self._inc.get(key)
+        if st is None: st=self._inc[key]=IncTA()
+        st.sync(buf)
+        t,o,h,l,c,v=buf.view(1)
+        if not st.ready():
+            return TAVec.indicators(*buf.view(80)[2:])
+        return st.peek(float(h[0]),float(l[0]),float(c[0]),float(v[0]))
+
     def decide(self,sym):
         if sym in self.positions: return None
-        now=time.time()
+        now=self.bc.clock.now()
         if now-self._last_analyzed.get(sym,0)<10: return None
         self._last_analyzed[sym]=now
         a=self.analyze(sym)
         if not a: return None
         
+        action,why=self.entry_action(a)
+        if not action:
+            if why: print(f"{sym}: {why}")
+            return None
+        
+        strat=self._pick_strat()
+        lev=self._pick_lev()
+        
+        return dict(action=action,sym=sym,price=a['price'],conf=a['conf'],
+                    reasons=a['reasons'],strat=strat,lev=lev,atr=a['atr'],score=a['score'],
+                    ind=dict(rsi=a['rsi'],stoch=a['stoch'],macd=a['macd'],e20=a['e20'],
+                             e50=a['e50'],bbu=a['bbu'],bbl=a['bbl'],vwap=a['vwap'],
+                             vr=a['vr'],atr_pct=a['atr_pct']),
+                    klines=a['klines'])
+
+    def entry_action(self,a):
+        # decide() giriş filtreleri; (LONG/SHORT/None, ret gerekçesi) döndürür
+        r=self.risk
         # ENHANCED ENTRY FILTERS - Sadece güçlü sinyallere gir
         
         # 1. Minimum score threshold - Daha yüksek
-        if a['score']>=self.risk['min_score']: action='LONG'
-        elif a['score']<=-self.risk['min_score']: action='SHORT'
-        else: return None
+        if a['score']>=r['min_score']: action='LONG'
+        elif a['score']<=-r['min_score']: action='SHORT'
+        else: return None,None
         
         # 2. Confidence çok düşükse REDDET
-        if a['conf']<self.risk['min_conf']: return None
+        if a['conf']<r['min_conf']: return None,None
         
         # 3. Volume çok düşükse REDDET (pump-dump önleme)
-        if a['vr']<0.5:
-            print(f"{sym}: Volume cok dusuk (VR:{a['vr']:.1f}) - atla")
-            return None
+        if a['vr']<0.5: return None,f"Volume cok dusuk (VR:{a['vr']:.1f}) - atla"
         
         # 4. ATR çok yüksekse REDDET (volatilite riski)
-        if a['atr_pct']>self.risk['max_atr_pct']:
-            print(f"{sym}: ATR cok yuksek ({a['atr_pct']:.2f}%) - atla")
-            return None
+        if a['atr_pct']>r['max_atr_pct']: return None,f"ATR cok yuksek ({a['atr_pct']:.2f}%) - atla"
         
         # 5. RSI EXTREME ZONES - Aşırı bölgede giriş yapma
-        if action=='LONG' and a['rsi']>75:
-            print(f"{sym}: RSI asiri yuksek ({a['rsi']}) - overbought, atla")
-            return None
-        if action=='SHORT' and a['rsi']<25:
-            print(f"{sym}: RSI asiri dusuk ({a['rsi']}) - oversold, atla")
-            return None
+        if action=='LONG' and a['rsi']>75: return None,f"RSI asiri yuksek ({a['rsi']}) - overbought, atla"
+        if action=='SHORT' and a['rsi']<25: return None,f"RSI asiri dusuk ({a['rsi']}) - oversold, atla"
         
         # 6. Momentum confirmation - Birden fazla indicator onaylamalı
         confirmations=0
-        
-        # RSI confirms trend
-        if action=='LONG' and 40<a['rsi']<70: confirmations+=1
+        if action=='LONG' and 40<a['rsi']<70: confirmations+=1   # RSI confirms trend
         if action=='SHORT' and 30<a['rsi']<60: confirmations+=1
-        
-        # MACD confirms
-        if action=='LONG' and a['macd']>0: confirmations+=1
+        if action=='LONG' and a['macd']>0: confirmations+=1      # MACD confirms
         if action=='SHORT' and a['macd']<0: confirmations+=1
-        
-        # Stochastic confirms
-        if action=='LONG' and a['stoch']>20: confirmations+=1
+        if action=='LONG' and a['stoch']>20: confirmations+=1    # Stochastic confirms
         if action=='SHORT' and a['stoch']<80: confirmations+=1
-        
-        # Need at least 2 confirmations
-        if confirmations<2:
-            print(f"{sym}: Yetersiz onay ({confirmations}/3) - atla")
-            return None
+        if confirmations<2: return None,f"Yetersiz onay ({confirmations}/3) - atla"
         
         # 7. Fiyat Bollinger bandın ortasında mı? (çok uçlarda girme)
-        bb_mid=(a['bbu']+a['bbl'])/2
         price_pos=(a['price']-a['bbl'])/(a['bbu']-a['bbl']) if a['bbu']>a['bbl'] else 0.5
-        
-        if action=='LONG' and price_pos>0.95:
-            print(f"{sym}: Fiyat BB ustunde ({price_pos:.0%}) - atla")
-            return None
-        if action=='SHORT' and price_pos<0.05:
-            print(f"{sym}: Fiyat BB altinda ({price_pos:.0%}) - atla")
-            return None
-        
-        strat=self._pick_strat()
-        lev=random.choice([2,3,5,10]) if self.risk['leverage']==0 else self.risk['leverage']
-        
-        return dict(action=action,sym=sym,price=a['price'],conf=a['conf'],
-                    reasons=a['reasons'],strat=strat,lev=lev,atr=a['atr'],score=a['score'],
-                    ind=dict(rsi=a['rsi'],stoch=a['stoch'],macd=a['macd'],e20=a['e20'],
-                             e50=a['e50'],bbu=a['bbu'],bbl=a['bbl'],vwap=a['vwap'],
-                             vr=a['vr'],atr_pct=a['atr_pct']),
-                    klines=a['klines'])
+        if action=='LONG' and price_pos>0.95: return None,f"Fiyat BB ustunde ({price_pos:.0%}) - atla"
+        if action=='SHORT' and price_pos<0.05: return None,f"Fiyat BB altinda ({price_pos:.0%}) - atla"
+        return action,None
+
+    @staticmethod
+    def entry_arrays(risk,score,conf,rsi,macd,stoch,vr,atr_pct,bbu,bbl,price):
+        # entry_action() filtrelerinin vektörel karşılığı: +1 LONG, -1 SHORT, 0 giriş yok.
+        # Girdiler analyze() ile aynı yuvarlanmış olmalı (rsi/stoch 1, vr/atr_pct 2 hane...)
+        ms=risk['min_score']
+        side=np.where(score>=ms,1,np.where(score<=-ms,-1,0))
+        L=side==1; S=side==-1
+        ok=(conf>=risk['min_conf'])&(vr>=0.5)&(atr_pct<=risk['max_atr_pct'])
+        ok&=~(L&(rsi>75))&~(S&(rsi<25))
+        n=np.where(L,((40<rsi)&(rsi<70)).astype(int)+(macd>0)+(stoch>20),
+                     ((30<rsi)&(rsi<60)).astype(int)+(macd<0)+(stoch<80))
+        ok&=n>=2
+        with np.errstate(divide='ignore',invalid='ignore'):
+            pp=np.where(bbu>bbl,(price-bbl)/(bbu-bbl),0.5)
+        ok&=~(L&(pp>0.95))&~(S&(pp<0.05))
+        return np.where(ok,side,0).astype(np.int8)
 
     def _pick_strat(self):
         # Ensure all strategies get chances - boost unused ones
@@ -426,12 +1940,15 @@ class Agent:
             if self.strat_trades[s]['total'] == 0:
                 self.strategies[s] = max(self.strategies[s], 1.0)  # Minimum score
         
-        t=sum(self.strategies.values()); r=random.uniform(0,t); c=0
+        t=sum(self.strategies.values()); r=self.rng.uniform(0,t); c=0
         for s,v in self.strategies.items():
             c+=v
             if r<=c: return s
         return 'Trend Following'
 
+    def _pick_lev(self):
+        return self.rng.choice([2,3,5,10]) if self.risk['leverage']==0 else self.risk['leverage']
+
     def open(self,d):
         p,lev=d['price'],d['lev']
         
@@ -446,13 +1963,14 @@ class Agent:
             
             # Get historical performance for Kelly Criterion
             if len(self.all_trades) > 10:
-                recent_trades = self.all_trades[-50:]
-                winning = [t for t in recent_trades if t.pnl > 0]
-                losing = [t for t in recent_trades if t.pnl <= 0]
+                # TradeLog'un pnl kolonundan: diskten/journal'dan dönen kayıtlar dict'tir, Trade değil
+                recent = self.all_trades.pnls()[-50:]
+                winning = recent[recent > 0]
+                losing = recent[recent <= 0]
                 
-                win_rate = len(winning) / len(recent_trades) if recent_trades else 0.5
-                avg_win = sum(t.pnl for t in winning) / len(winning) if winning else 0
-                avg_loss = abs(sum(t.pnl for t in losing) / len(losing)) if losing else 0
+                win_rate = len(winning) / len(recent) if len(recent) else 0.5
+                avg_win = float(winning.mean()) if len(winning) else 0
+                avg_loss = abs(float(losing.mean())) if len(losing) else 0
                 
                 # Risk-adjusted position sizing
                 position_data = self.risk_manager.calculate_position_size(
@@ -491,17 +2009,16 @@ class Agent:
             sz=self.balance*(self.risk['position_size_pct']/100)
         
         # Calculate TP/SL
-        tp_m=self.risk['tp_pct']/100*(lev/3)
-        sl_m=self.risk['sl_pct']/100*(lev/3)
-        if d['action']=='LONG': tp=p*(1+tp_m); sl=p*(1-sl_m)
-        else: tp=p*(1-tp_m); sl=p*(1+sl_m)
+        tp,sl=self.levels(p,lev,d['action'])
         
         # Open position
         self.positions[d['sym']]=dict(
             type=d['action'],entry=p,cur=p,tp=tp,sl=sl,sz=sz,lev=lev,
             pnl=0,pnl_pct=0,strat=d['strat'],reasons=d['reasons'],ind=d['ind'],
-            klines=d.get('klines',[]),t0=datetime.now().isoformat(),
+            t0=self.bc.clock.dt().isoformat(),
             conf=d['conf'],score=d['score'],max_pnl=0,min_pnl=0,ticks=0)
+        self.triggers.set(d['sym'],d['sym'],*TriggerIndex.HOT)
+        if self.journal: self._journal('o',s=d['sym'],p=self.positions.to_dict(d['sym']))
         
         # Register with risk manager
         if IMPROVEMENTS_ENABLED and self.risk_manager:
@@ -513,116 +2030,167 @@ class Agent:
                 leverage=lev
             )
 
+    def levels(self,p,lev,action):
+        # TP/SL fiyatları: risk yüzdeleri kaldıraçla ölçeklenir (3x = nominal)
+        tp_m=self.risk['tp_pct']/100*(lev/3)
+        sl_m=self.risk['sl_pct']/100*(lev/3)
+        if action=='LONG': return p*(1+tp_m),p*(1-sl_m)
+        return p*(1-tp_m),p*(1+sl_m)
+
     def update(self):
-        close=[]
-        for sym,pos in self.positions.items():
+        # Tüm pozisyonlar tek vektörel adımda işaretlenir (PositionBook.mark); çıkış kuralları
+        # sadece TP/SL'ye değen ya da fiyatı sessiz bandından çıkanlar için çalışır (TriggerIndex)
+        due=self.due()
+        if not due: return
+        # Değerlendirilecek pozisyonların mumlarını tek seferde paralel tazele (analiz + grafik)
+        self.bc.prefetch(due,'5m',80,max_age=2,prio=RequestScheduler.PRIO_POS)
+        self.settle(due)
+
+    def due(self):
+        # İşaretle ve çıkış kuralı değerlendirilecek pozisyonları açılış sırasıyla döndür
+        book=self.positions
+        if self.journal: self._journal_tick()
+        if not book: return []
+        keys=list(book); hit=book.mark(book.prices(self.bc.reg))
+        due={keys[j] for j in np.flatnonzero(hit)}
+        due.update(sym for sym,_ in self.triggers.due(self.bc.price) if sym in book)
+        return [s for s in keys if s in due]
+
+    def settle(self,due):
+        book=self.positions; close=[]
+        for sym in due:
+            if sym not in book: continue
+            pos=book[sym]
             try:
-                p=self.bc.price(sym)
-                if p==0: continue
-                pos['cur']=p; pos['ticks']+=1; m=pos['lev']
-                if pos['type']=='LONG': pct=(p-pos['entry'])/pos['entry']*100*m
-                else: pct=(pos['entry']-p)/pos['entry']*100*m
-                pnl=pos['sz']*pct/100
-                pos['pnl']=pnl; pos['pnl_pct']=pct
-                pos['max_pnl']=max(pos['max_pnl'],pnl); pos['min_pnl']=min(pos['min_pnl'],pnl)
-                
-                # Force fresh klines every update
-                cache_key=f"{sym}_5m"
-                self.bc._cache_ts[cache_key]=0
-                new_kl=self.bc.klines(sym,'5m',50)
-                if new_kl and len(new_kl)>0:
-                    pos['klines']=new_kl
-                    if pos['ticks']%5==0:
-                        print(f"Updated {sym} klines: {len(new_kl)} candles, last close: ${new_kl[-1]['c']:.6f}")
-                else:
-                    print(f"WARNING: {sym} klines fetch failed or empty")
-                
-                # DYNAMIC EXIT LOGIC - Akıllı Çıkış Sistemi
-                tp_distance_pct=abs(pos['tp']-p)/p*100
-                sl_distance_pct=abs(p-pos['sl'])/p*100
-                
-                # 1. PROFIT PROTECTION - Karda ise momentum kayboldu mu kontrol et
-                if pnl>0 and pos['ticks']>5:  # En az 5 tick geçmiş olmalı (önceden 3'tü)
-                    should_exit=False
-                    
-                    # Re-analyze current market conditions
-                    a=self.analyze(sym)
-                    if a:
-                        current_score=a['score']
-                        
-                        # Sadece GÜÇLÜ ters sinyal varsa çık (daha yüksek threshold)
-                        if pos['type']=='LONG' and current_score<=-3:  # Önceden -2
-                            should_exit=True
-                            reason=f"Guclu ters momentum (skor:{current_score})"
-                        elif pos['type']=='SHORT' and current_score>=3:  # Önceden 2
-                            should_exit=True
-                            reason=f"Guclu ters momentum (skor:{current_score})"
-                        
-                        # Max PnL'den geri çekilme threshold'ı daha yüksek
-                        if pos['max_pnl']>0 and pnl<pos['max_pnl']*0.5:  # %50 geri çekilme (önceden %40)
-                            should_exit=True
-                            reason=f"Max PnL'den %50+ geri cekilme"
-                        
-                        # TP'ye çok yakınsa (<%0.5) ve momentum zayıfsa çık
-                        if tp_distance_pct<0.5 and abs(current_score)<1:
-                            should_exit=True
-                            reason="TP'ye cok yakin - guvenli kar al"
-                    
-                    if should_exit:
-                        close.append((sym,f"Smart Exit: {reason}"))
-                        continue
-                
-                # 2. LOSS PREVENTION - Zarar büyümeden erken kes
-                if pnl<0 and pos['ticks']>2:
-                    should_exit=False
-                    
-                    # KRITIK: Zarar %2'yi geçtiyse direkt çık
-                    if abs(pnl_pct)>2.0:
-                        should_exit=True
-                        reason=f"Zarar %2'yi gecti ({pnl_pct:.1f}%) - acil kes"
-                    
-                    # SL'ye %1.5 kaldıysa çık
-                    elif sl_distance_pct<1.5:
-                        should_exit=True
-                        reason="SL'ye cok yakin - erken kes"
-                    
-                    # Zarar %1.5'i geçtiyse ve toparlanma sinyali yoksa çık
-                    elif abs(pnl_pct)>1.5:
-                        a=self.analyze(sym)
-                        if a:
-                            current_score=a['score']
-                            # Toparlanma sinyali yok - çık
-                            if pos['type']=='LONG' and current_score<2:
-                                should_exit=True
-                                reason=f"Zarar buyuyor, toparlanma yok (skor:{current_score})"
-                            elif pos['type']=='SHORT' and current_score>-2:
-                                should_exit=True
-                                reason=f"Zarar buyuyor, toparlanma yok (skor:{current_score})"
-                    
-                    if should_exit:
-                        close.append((sym,f"Loss Cut: {reason}"))
-                        continue
-                
-                # 3. STANDARD TP/SL CHECKS
-                if pos['type']=='LONG':
-                    if p>=pos['tp']: close.append((sym,'TP'))
-                    elif p<=pos['sl']: close.append((sym,'SL'))
-                else:
-                    if p<=pos['tp']: close.append((sym,'TP'))
-                    elif p>=pos['sl']: close.append((sym,'SL'))
-                    
+                # DYNAMIC EXIT LOGIC - analiz sadece kural gerektirirse yapılır
+                def score(sym=sym):
+                    a=self.analyze(sym); return a['score'] if a else None
+                why=self.exit_reason(pos,pos['cur'],pos['pnl'],pos['pnl_pct'],score)
+                if why: close.append((sym,why))
+                else: self.triggers.set(sym,sym,*self.band(pos))
             except Exception as e:
                 print(f"Position update error for {sym}: {e}")
         
         for sym,why in close: self.close(sym,why)
 
+    def band(self,pos):
+        # exit_reason() için sessiz fiyat bandı (lo, hi): lo<p<hi iken hiçbir kural
+        # tetiklenmez. Kenarlar içe doğru yuvarlanır (fazladan değerlendirme zararsız,
+        # eksik değerlendirme değil).
+        r=self.risk; E=pos['entry']; m=pos['lev']; L=pos['type']=='LONG'
+        if pos['ticks']<=5: return TriggerIndex.HOT  # tick kapıları (>2, >5) her güncellemeyi sayar
+        d=1 if L else -1
+        # 3. TP/SL
+        win,loss=pos['tp'],pos['sl']
+        # 1. Profit protection: kârdaki her fiyat skor ister
+        if r['profit_protect']: win=E
+        # 2. Loss prevention: zarar kesme, SL'ye yakınlık ve toparlanma kontrolü eşikleri
+        cuts=[E*(1-d*r['loss_cut_pct']/100/m),loss+(E-loss)*r['sl_near_pct']/100]
+        if r['loss_recovery']: cuts.append(E*(1-d*1.5/100/m))
+        cut=max(cuts) if L else min(cuts)
+        loss=max(loss,min(E,cut)) if L else min(loss,max(E,cut))
+        lo,hi=(loss,win) if L else (win,loss)
+        eps=1e-9*E
+        return lo+eps,hi-eps
+
+    @staticmethod
+    def quote(pos,p):
+        # p fiyatında (pnl, kaldıraçlı %) — pozisyonu değiştirmez
+        m=pos['lev']
+        if pos['type']=='LONG': pct=(p-pos['entry'])/pos['entry']*100*m
+        else: pct=(pos['entry']-p)/pos['entry']*100*m
+        return pos['sz']*pct/100,pct
+
+    @staticmethod
+    def mark(pos,p):
+        # Pozisyonu p fiyatına işaretler (tick sayacı dahil); (pnl, kaldıraçlı %) döndürür
+        pos['cur']=p; pos['ticks']+=1
+        pnl,pct=Agent.quote(pos,p)
+        pos['pnl']=pnl; pos['pnl_pct']=pct
+        pos['max_pnl']=max(pos['max_pnl'],pnl); pos['min_pnl']=min(pos['min_pnl'],pnl)
+        return pnl,pct
+
+    def exit_reason(self,pos,p,pnl,pct,score):
+        # update() çıkış kuralları; score() güncel analiz skorunu (yoksa None) verir ve
+        # sadece gerektiğinde çağrılır. Çıkış gerekçesi ya da None döndürür.
+        
+        # DYNAMIC EXIT LOGIC - Akıllı Çıkış Sistemi
+        r=self.risk
+        tp_distance_pct=abs(pos['tp']-p)/p*100
+        # SL'ye kalan mesafe, girişteki SL mesafesinin yüzdesi olarak (100=girişte, 0=SL'de)
+        sl_distance_pct=abs(p-pos['sl'])/(abs(pos['entry']-pos['sl']) or p)*100
+        
+        # 1. PROFIT PROTECTION - Karda ise momentum kayboldu mu kontrol et
+        if r['profit_protect'] and pnl>0 and pos['ticks']>5:  # En az 5 tick geçmiş olmalı (önceden 3'tü)
+            reason=None
+            current_score=score()  # Re-analyze current market conditions
+            if current_score is not None:
+                # Sadece GÜÇLÜ ters sinyal varsa çık (daha yüksek threshold)
+                if pos['type']=='LONG' and current_score<=r['smart_exit_score']:  # Önceden -2
+                    reason=f"Guclu ters momentum (skor:{current_score})"
+                elif pos['type']=='SHORT' and current_score>=-r['smart_exit_score']:  # Önceden 2
+                    reason=f"Guclu ters momentum (skor:{current_score})"
+                
+                # Max PnL'den geri çekilme threshold'ı daha yüksek
+                if pos['max_pnl']>0 and pnl<pos['max_pnl']*(1-r['max_pnl_drawdown']):  # %50 geri çekilme (önceden %40)
+                    reason=f"Max PnL'den %{r['max_pnl_drawdown']*100:.0f}+ geri cekilme"
+                
+                # TP'ye çok yakınsa (<%0.5) ve momentum zayıfsa çık
+                if tp_distance_pct<0.5 and abs(current_score)<1:
+                    reason="TP'ye cok yakin - guvenli kar al"
+            if reason: return f"Smart Exit: {reason}"
+        
+        # 2. LOSS PREVENTION - Zarar büyümeden erken kes
+        if pnl<0 and pos['ticks']>2:
+            reason=None
+            
+            # KRITIK: Zarar %2'yi geçtiyse direkt çık
+            if abs(pct)>r['loss_cut_pct']:
+                reason=f"Zarar %{r['loss_cut_pct']:g}'yi gecti ({pct:.1f}%) - acil kes"
+            
+            # SL mesafesinin son %25'ine girdiyse çık
+            elif sl_distance_pct<r['sl_near_pct']:
+                reason="SL'ye cok yakin - erken kes"
+            
+            # Zarar %1.5'i geçtiyse ve toparlanma sinyali yoksa çık
+            elif r['loss_recovery'] and abs(pct)>1.5:
+                current_score=score()
+                if current_score is not None:
+                    # Toparlanma sinyali yok - çık
+                    if pos['type']=='LONG' and current_score<2:
+                        reason=f"Zarar buyuyor, toparlanma yok (skor:{current_score})"
+                    elif pos['type']=='SHORT' and current_score>-2:
+                        reason=f"Zarar buyuyor, toparlanma yok (skor:{current_score})"
+            
+            if reason: return f"Loss Cut: {reason}"
+        
+        # 3. STANDARD TP/SL CHECKS
+        if pos['type']=='LONG':
+            if p>=pos['tp']: return 'TP'
+            if p<=pos['sl']: return 'SL'
+        else:
+            if p<=pos['tp']: return 'TP'
+            if p>=pos['sl']: return 'SL'
+        return None
+
+    @staticmethod
+    def costs(sz,lev):
+        # (komisyon, kayma): giriş+çıkış Binance Futures taker + ortalama %0.05 kayma
+        return sz*lev*0.0004*2, sz*0.0005
+
+    def _learn(self,s,won):
+        # Strateji ağırlığı: kazanç +0.18, kayıp -0.06, [0.1, 3.0] aralığında
+        self.strategies[s]=min(3.0,self.strategies[s]+(0.18 if won else -0.06))
+        self.strategies[s]=max(0.1,self.strategies[s])
+        st=self.strat_trades[s]; st['total']+=1
+        if won: st['wins']+=1
+
     def close(self,sym,why='Manual'):
         if sym not in self.positions: return
         pos=self.positions[sym]
         
         # ── CALCULATE COSTS (Commission + Slippage) ──────────────
-        commission = pos['sz'] * pos['lev'] * 0.0004 * 2  # Entry + Exit, Binance Futures
-        slippage = pos['sz'] * 0.0005  # 0.05% average slippage
+        commission, slippage = self.costs(pos['sz'],pos['lev'])  # Entry + Exit, Binance Futures; 0.05% slippage
         net_pnl = pos['pnl'] - commission - slippage
         
         # Update balance
@@ -632,14 +2200,10 @@ class Agent:
         else: self.total_loss+=abs(net_pnl)
         
         # Update strategy scores
-        s=pos['strat']
-        self.strategies[s]=min(3.0,self.strategies[s]+(0.18 if won else -0.06))
-        self.strategies[s]=max(0.1,self.strategies[s])
-        st=self.strat_trades[s]; st['total']+=1
-        if won: st['wins']+=1
+        self._learn(pos['strat'],won)
         
         # Calculate duration
-        delta=datetime.now()-datetime.fromisoformat(pos['t0']); secs=delta.total_seconds()
+        delta=self.bc.clock.dt()-datetime.fromisoformat(pos['t0']); secs=delta.total_seconds()
         ht=f"{int(secs)}s" if secs<60 else f"{int(secs/60)}m" if secs<3600 else f"{int(secs/3600)}h"
         
         # ── ENHANCED TRADE TRACKING ──────────────────────────────
@@ -648,7 +2212,7 @@ class Agent:
                 # Create Trade object with full details
                 trade_obj = Trade(
                     entry_time=datetime.fromisoformat(pos['t0']),
-                    exit_time=datetime.now(),
+                    exit_time=self.bc.clock.dt(),
                     symbol=sym,
                     direction=pos['type'],
                     entry_price=pos['entry'],
@@ -686,19 +2250,81 @@ class Agent:
         rec=dict(id=self.trades,sym=sym,type=pos['type'],entry=pos['entry'],exit=pos['cur'],
                  tp=pos['tp'],sl=pos['sl'],pnl=round(net_pnl,2),pnl_pct=round((net_pnl/pos['sz'])*100,2),
                  lev=pos['lev'],strat=pos['strat'],reasons=pos['reasons'],why=why,
-                 time=datetime.now().strftime('%H:%M:%S'),ht=ht,won=won,
+                 time=self.bc.clock.dt().strftime('%H:%M:%S'),ht=ht,won=won,
                  max_pnl=round(pos['max_pnl'],2),min_pnl=round(pos['min_pnl'],2),score=pos['score'],
                  commission=round(commission,2),slippage=round(slippage,2))
-        self.history.insert(0,rec)
-        if len(self.history)>200: self.history.pop()
+        self.history.append(rec)
+        if not IMPROVEMENTS_ENABLED: self.all_trades.append(rec)  # Monte Carlo için tam işlem dizisi
         
         # Update PnL curve
-        self.pnl_curve.append(round(self.balance,2)); self.pnl_times.append(datetime.now().strftime('%H:%M'))
-        if len(self.pnl_curve)>100: self.pnl_curve.pop(0); self.pnl_times.pop(0)
+        self.pnl_curve.append(round(self.balance,2)); self.pnl_times.append(self.bc.clock.dt().strftime('%H:%M'))
+        if self.journal:
+            s=pos['strat']
+            self._journal('c',s=sym,r=rec,a={k:getattr(self,k) for k in self.SCALARS},
+                          st=[s,self.strategies[s],self.strat_trades[s]],tm=self.pnl_times[-1])
         
-        del self.positions[sym]
+        del self.positions[sym]; self.triggers.discard(sym,sym)
         print(f"[{'WIN' if won else 'LOSS'}] {sym} {pos['type']} | ${net_pnl:.2f} ({(net_pnl/pos['sz'])*100:.2f}%) | {why} | Costs: ${commission+slippage:.2f}")
 
+    # ── JOURNAL STATE ──────────────────────────────────────────
+    SCALARS=('balance','start_balance','peak_balance','trades','wins','total_profit','total_loss')
+
+    def _journal(self,e,**kw):
+        # Olayı günlüğe yazar; kuyruk SNAP_EVENTS'i aşarsa snapshot alır (kurtarma süresi sınırlı kalır)
+        self.journal.log(e,**kw)
+        if self.journal.due(): self.journal.snapshot(self)
+
+    def _journal_tick(self):
+        # update() başında: pozisyon işaretleri (MFE/MAE kurtarmada korunur) ve periyodik snapshot
+        j=self.journal
+        if self.positions and j.mark_due():
+            c=self.positions.cols
+            j.log('m',p={s:[float(c[k][i]) for k in ('cur','pnl','pnl_pct','max_pnl','min_pnl')]+[int(c['ticks'][i])]
+                         for s,i in self.positions._slot.items()})
+        if j.due(): j.snapshot(self)
+
+    def state_dict(self):
+        # Journal snapshot'ı: tüm kalıcı Agent durumu (kronolojik sırada)
+        return dict({k:getattr(self,k) for k in self.SCALARS},strategies=self.strategies,
+                    strat_trades=self.strat_trades,risk=self.risk,
+                    positions={s:self.positions.to_dict(s) for s in self.positions},
+                    history=self.history[::-1],pnl_curve=self.pnl_curve[:],pnl_times=self.pnl_times[:])
+
+    def load_state(self,d):
+        for k in self.SCALARS: setattr(self,k,d[k])
+        self.strategies.update(d['strategies']); self.strat_trades.update(d['strat_trades']); self.risk.update(d['risk'])
+        for s in list(self.positions): del self.positions[s]; self.triggers.discard(s,s)
+        for s,p in d['positions'].items(): self.positions[s]=p; self.triggers.set(s,s,*TriggerIndex.HOT)
+        for ring,k in ((self.history,'history'),(self.pnl_curve,'pnl_curve'),(self.pnl_times,'pnl_times')):
+            ring.clear()
+            for x in d[k]: ring.append(x)
+
+    def replay(self,ev):
+        # Tek bir Journal olayını uygular (kurtarma)
+        e=ev['e']
+        if e=='o':
+            self.positions[ev['s']]=ev['p']; self.triggers.set(ev['s'],ev['s'],*TriggerIndex.HOT)
+        elif e=='m':
+            for s,v in ev['p'].items():
+                if s in self.positions:
+                    pos=self.positions[s]
+                    for k,x in zip(('cur','pnl','pnl_pct','max_pnl','min_pnl','ticks'),v): pos[k]=x
+        elif e=='c':
+            s=ev['s']; rec=ev['r']
+            if s in self.positions: del self.positions[s]
+            self.triggers.discard(s,s)
+            for k,v in ev['a'].items(): setattr(self,k,v)
+            st,w,cnt=ev['st']; self.strategies[st]=w; self.strat_trades[st]=cnt
+            self.history.append(rec); self.all_trades.append(rec)
+            self.pnl_curve.append(round(self.balance,2)); self.pnl_times.append(ev['tm'])
+        elif e=='r': self.risk.update(ev['r'])
+
+    def robustness(self,paths=10000,method='bootstrap',block=20,seed=0):
+        # Kapanan işlem dizisinin Monte Carlo dağılımı (bkz. montecarlo.py)
+        import montecarlo
+        limit=getattr(self.risk_manager,'max_drawdown_limit',montecarlo.MAX_DRAWDOWN_LIMIT)
+        return montecarlo.simulate(self.all_trades.pnls(),self.start_balance,paths,method,block,limit,seed)
+
     def wr(self): return (self.wins/self.trades*100) if self.trades>0 else 50.0
     def total_pnl(self): return round(self.balance-self.start_balance,2)
     def drawdown(self): return round((self.peak_balance-self.balance)/self.peak_balance*100,2) if self.peak_balance>0 else 0
@@ -712,7 +2338,7 @@ class Agent:
             return
         
         try:
-            metrics = PerformanceMetrics(self.all_trades)
+            metrics = PerformanceMetrics(self.all_trades.tail[:])  # bellekteki son işlemler
             
             # Calculate metrics
             sharpe = metrics.sharpe_ratio()
@@ -758,79 +2384,648 @@ class Agent:
         except Exception as e:
             print(f"⚠️  Performance update error: {e}")
 
+# ── TICK SCHEDULER ─────────────────────────────────────────
+class TickScheduler:
+    """Tick aşamalarının süre ölçümü ve bütçeye uyarlanması.
+
+    Her tick'te aşamalar (update, klines, analysis, decide, open) stage() ile
+    ölçülür; fiyat tazeleme ayrı döngüde çalıştığından record() ile eklenir.
+    Bütçe önce taramadan kısılır: pozisyon işleri bütçeyi yediyse tarama o tick
+    atlanır, taranan tick bütçeyi aşarsa tarama genişliği (breadth) daralır,
+    bütçe bitince kalan adaylar için karar verilmez. Pozisyon işleri tek başına
+    bütçeyi aşıyorsa tick aralığı (stretch) uzar. Her aşım overruns'a yazılır.
+    """
+    STAGES = ('prices','update','klines','analysis','decide','open')
+    ALPHA = 0.2         # ortalama (EWMA) ağırlığı
+    MIN_BREADTH = 0.2   # scan_size'ın en az bu oranı taranır
+    MAX_STRETCH = 4.0   # tick aralığı en fazla bu kat uzar
+
+    def __init__(self,budget_ms=1000):
+        self.budget_ms=budget_ms; self.breadth=1.0; self.stretch=1.0
+        self.stats={k:dict(last_ms=0.0,avg_ms=0.0,max_ms=0.0,n=0) for k in self.STAGES}
+        self.total=dict(last_ms=0.0,avg_ms=0.0,max_ms=0.0,n=0)
+        self.overruns=RingBuffer(50); self.counts=dict(ticks=0,overruns=0,scan_skipped=0,shed=0)
+        self._t0=None; self._cur={}; self._core=None
+
+    def begin(self,budget_ms=None):
+        if budget_ms: self.budget_ms=budget_ms
+        self._t0=time.perf_counter(); self._cur={}; self._core=None
+
+    def elapsed_ms(self): return (time.perf_counter()-self._t0)*1000 if self._t0 else 0.0
+
+    @contextlib.contextmanager
+    def stage(self,name):
+        t=time.perf_counter()
+        try: yield
+        finally: self._cur[name]=self._cur.get(name,0.0)+(time.perf_counter()-t)*1000
+
+    def _acc(self,st,ms):
+        st['n']+=1; st['last_ms']=ms; st['max_ms']=max(st['max_ms'],ms)
+        st['avg_ms']+=(ms-st['avg_ms'])*(1.0 if st['n']==1 else self.ALPHA)
+
+    def record(self,name,ms): self._acc(self.stats[name],ms)
+
+    def add(self,name,ms): self._cur[name]=self._cur.get(name,0.0)+ms  # başka süreçte ölçülen aşama
+
+    def scan_ok(self):
+        # Pozisyon işlerinden sonra bütçe kaldıysa tarama yapılır
+        self._core=self.elapsed_ms()
+        if self._core<self.budget_ms: return True
+        self.counts['scan_skipped']+=1; self._core=-self._core; return False
+
+    def scan_size(self,n): return max(1,round(n*self.breadth))
+
+    def over(self): return self.elapsed_ms()>=self.budget_ms
+
+    def shed(self,n): self.counts['shed']+=n
+
+    def end(self,when=''):
+        ms=self.elapsed_ms(); cur=self._cur; B=self.budget_ms; self._t0=None
+        scanned=self._core is not None and self._core>=0
+        core=ms if self._core is None else abs(self._core)
+        for k,v in cur.items(): self._acc(self.stats[k],v)
+        self._acc(self.total,ms); self.counts['ticks']+=1
+        if ms>B:
+            self.counts['overruns']+=1
+            self.overruns.append(dict(t=when,ms=round(ms,1),budget=B,core_ms=round(core,1),
+                                      stages={k:round(v,1) for k,v in cur.items()},
+                                      breadth=round(self.breadth,2),stretch=round(self.stretch,2)))
+        if scanned:
+            if ms>B: self.breadth=max(self.MIN_BREADTH,self.breadth*0.7)
+            elif ms<B*0.5: self.breadth=min(1.0,self.breadth+0.1)
+        if core>B: self.stretch=min(self.MAX_STRETCH,self.stretch*1.25)
+        elif core<B*0.5: self.stretch=max(1.0,self.stretch/1.25)
+        return ms
+
+    def snapshot(self):
+        rnd=lambda st: dict(last_ms=round(st['last_ms'],1),avg_ms=round(st['avg_ms'],1),max_ms=round(st['max_ms'],1),n=st['n'])
+        return dict(budget_ms=self.budget_ms,breadth=round(self.breadth,2),stretch=round(self.stretch,2),
+                    tick=rnd(self.total),stages={k:rnd(v) for k,v in self.stats.items()},
+                    **self.counts,recent_overruns=self.overruns[:10])
+
+# ── STATE SNAPSHOT ─────────────────────────────────────────
+class StateSnapshot:
+    """Engine durumunun bir tick sonundaki değişmez görüntüsü.
+
+    Engine her tick sonunda (en sık PUBLISH_S'de bir) ajan durumlarını ve debug
+    verisini toplayıp JSON baytlarına çevirir ve tek atama ile engine.snap'e koyar.
+    Salt okunur uç noktalar (/api/status, /api/debug, /api/ticks) bu baytları kilit
+    almadan yazar: istek başına yeniden hesap yok, yarım güncellenmiş durum ya da
+    'dictionary changed size during iteration' yok.
+    """
+    __slots__=('ver','at','default','_b')
+
+    def __init__(self,ver,at,default,state,debug,ticks):
+        self.ver=ver; self.at=at; self.default=default
+        enc=lambda x: json.dumps(x).encode()
+        self._b=dict(state={k:enc(v) for k,v in state.items()},debug={k:enc(v) for k,v in debug.items()},ticks=enc(ticks))
+
+    def body(self,kind,agent=None):
+        # agent=None: varsayılan ajan; bilinmeyen ajan için None
+        b=self._b[kind]
+        return b if kind=='ticks' else b.get(self.default if agent is None else agent)
+
 # ── ENGINE ─────────────────────────────────────────────────
 class Engine:
-    def __init__(self):
+    MODE = 'thread'
+    TICK_S = 2  # tick aralığı (s); tarama her scan_interval tick'te bir
+    TRADE_LOG = os.environ.get('BOT_TRADE_LOG','bot_trades.jsonl')  # Agent.all_trades diske taşması
+    JOURNAL = os.environ.get('BOT_JOURNAL','bot_journal.jsonl')      # durum günlüğü; '' = kapalı
+    PUBLISH_S = 0.5  # StateSnapshot yayımları arası en kısa süre (s)
+
+    def __init__(self,bc=None,seed=None,persist=True,agents=None):
+        # persist=False (replay/test): trade dosyası ve journal kullanılmaz
+        # agents: {ad: risk ayarları} - hepsi tek MarketHub'ı paylaşır; ilki varsayılan ajandır
         print("Binance baglaniyor...")
-        self.bc=BinanceClient(); self.agent=Agent(self.bc)
-        self.running=False; self.tick=0; self.events=[]; self.start_time=None
+        t0=time.perf_counter()
+        self.bc=bc or BinanceClient(); self.hub=MarketHub(self.bc); self.agents={}
+        for i,(name,risk) in enumerate((agents or {'main':{}}).items()):
+            self.agents[name]=Agent(self.bc,None if seed is None else seed+i,
+                self._path(self.TRADE_LOG,name,i) if persist else None,self._path(self.JOURNAL,name,i) if persist else None,
+                hub=self.hub,name=name,risk=risk)
+        self.agent=next(iter(self.agents.values()))
+        self.bc.startup['init_ms']=round((time.perf_counter()-t0)*1000)
+        self.running=False; self.tick=0; self.events=RingBuffer(500); self.start_time=None
+        self.latency={'last_ms':0,'avg_ms':0,'max_ms':0,'n':0}
+        self.sched=TickScheduler(self.agent.risk['tick_budget_ms'])
+        for ag in self.agents.values():
+            j=ag.journal
+            if ag.recovered:
+                self.log(f"{self._tag(ag)}Journal'dan kurtarildi: {ag.trades} islem, {len(ag.positions)} pozisyon, "
+                         f"${ag.balance:.2f} ({j.stats['recover_ms']}ms, {j.stats['replayed']} olay)","success")
+        # _tick: ticaret döngüsü tick boyunca tutar; dışarıdan publish() tick ile sıralanır
+        self._tick=threading.Lock(); self.snap=None; self._pub_ver=0; self._pub_t=0.0; self._flush_t=0.0
+        self.publish()
+
+    @staticmethod
+    def _path(path,name,i):
+        # İlk ajan eski dosya adlarını kullanır; diğerleri bot_journal.<ad>.jsonl
+        if not path or i==0: return path
+        root,ext=os.path.splitext(path); return f"{root}.{name}{ext}"
+
+    def _tag(self,ag): return f"[{ag.name}] " if len(self.agents)>1 else ''
 
     def log(self,msg,lvl='info'):
-        self.events.insert(0,{'t':datetime.now().strftime('%H:%M:%S'),'msg':msg,'lvl':lvl})
-        if len(self.events)>500: self.events.pop()
+        self.events.append({'t':self.bc.clock.dt().strftime('%H:%M:%S'),'msg':msg,'lvl':lvl})
 
     def start(self):
-        self.running=True; self.start_time=datetime.now().isoformat()
+        self.running=True; self.start_time=self.bc.clock.dt().isoformat()
         self.log("Bot baslatildi - Piyasa taranıyor...","success")
+        self.publish()
+        self.bc.start_stream()
         threading.Thread(target=self._bg_prices,daemon=True).start()
         threading.Thread(target=self._bg_tickers,daemon=True).start()
-        print(f"\n{'='*50}\nBot Baslatildi | ${self.agent.balance:.0f} | {len(self.bc.symbols)} cift\n{'='*50}\n")
+        threading.Thread(target=self._bg_snapshot,daemon=True).start()
+        print(f"\n{'='*50}\nBot Baslatildi | ${self.agent.balance:.0f} | {len(self.bc.symbols)} cift"
+              f"{f' | {len(self.agents)} ajan' if len(self.agents)>1 else ''}\n{'='*50}\n")
+        scan=set()
         while self.running:
+            sch=self.sched; ags=list(self.agents.values())
             try:
-                self.agent.update()
-                r=self.agent.risk
-                if self.tick%r['scan_interval']==0:
-                    n=min(r['scan_size'],len(self.bc.symbols))
-                    syms=random.sample(self.bc.symbols,n)
-                    for s in syms:
-                        if len(self.agent.positions)>=r['max_positions']: break
-                        d=self.agent.decide(s)
-                        if d:
-                            self.agent.open(d)
-                            sz=self.agent.positions[s]['sz']
-                            self.log(f"{s} {d['action']} | ${sz:.0f} pozisyon | {d['lev']}x | @${d['price']:.4f} | AI:{d['conf']:.0f}%","trade")
-                self.tick+=1; time.sleep(2)
-            except Exception as e: self.log(f"Hata: {e}","error"); time.sleep(2)
+                with self._tick:
+                    sch.begin(self.agent.risk['tick_budget_ms']); self.hub.advance()
+                    for ag in ags:
+                        with sch.stage('update'): due=ag.due()
+                        if due:
+                            # Değerlendirilecek pozisyonların mumları (analiz + grafik)
+                            with sch.stage('klines'): self.bc.prefetch(due,'5m',80,max_age=2,prio=RequestScheduler.PRIO_POS)
+                            with sch.stage('update'): ag.settle(due)
+                    # bütçe yüzünden atlanan tarama sonraki tick'e kalır
+                    scan.update(ag.name for ag in ags if self.tick%ag.risk['scan_interval']==0)
+                    if scan and sch.scan_ok():
+                        for ag in ags:
+                            if ag.name in scan: scan.discard(ag.name); self._scan(ag,sch.scan_size(ag.risk['scan_size']))
+                    sch.end(self.bc.clock.dt().strftime('%H:%M:%S'))
+                    self.tick+=1; self._publish(False); self.flush(False)
+                if self.bc.exhausted():
+                    self.log("Replay kaydi bitti","warn"); self.stop(); break
+                self.bc.clock.sleep(self.TICK_S*sch.stretch)
+            except Exception as e: self.log(f"Hata: {e}","error"); self.bc.clock.sleep(self.TICK_S)
+        self.publish()
+
+    def _scan(self,ag,n):
+        sch=self.sched
+        if ag.risk.get('scan_mode')=='batch':
+            # n sembol REST tazeleme + tüm evren vektörel puanlama
+            free=[s for s in self.bc.symbols if s not in ag.positions]
+            with sch.stage('klines'): self.bc.refresh_stale(free,'5m',n)
+            with sch.stage('analysis'): syms=[x['sym'] for x in ag.analyze_batch(free)]
+        else:
+            syms=self._sample(ag,n)
+            with sch.stage('klines'): self.bc.prefetch([s for s in syms if s not in ag.positions])
+        self._enter(ag,syms)
+
+    def _sample(self,ag,n):
+        return ag.rng.sample(self.bc.symbols,min(n,len(self.bc.symbols)))
+
+    def _enter(self,ag,syms):
+        # Aday sembollerde karar ver ve pozisyon aç (max_positions'a ya da tick bütçesinin sonuna kadar)
+        sch=self.sched
+        for k,s in enumerate(syms):
+            if len(ag.positions)>=ag.risk['max_positions']: break
+            if sch.over(): sch.shed(len(syms)-k); break
+            with sch.stage('decide'): d=ag.decide(s)
+            if d: self._take(ag,d)
+
+    def _take(self,ag,d):
+        s=d['sym']
+        self._track_latency(s)
+        with self.sched.stage('open'): ag.open(d)
+        if s not in ag.positions: return  # risk yöneticisi reddetti
+        sz=ag.positions[s]['sz']
+        self.log(f"{self._tag(ag)}{s} {d['action']} | ${sz:.0f} pozisyon | {d['lev']}x | @${d['price']:.4f} | AI:{d['conf']:.0f}%","trade")
 
     def stop(self):
-        self.running=False; self.log("Bot durduruldu","warn")
-
+        self.running=False; self.bc.stop_stream(); self.log("Bot durduruldu","warn")
+        if self.bc.recorder: self.bc.recorder.close()
+        self.flush()
+        self.bc.save_snapshot()  # senkron: süreç kapanırken yarım .tmp dosyası kalmasın
+
+    def flush(self,force=True):
+        # Trade dosyası + journal diske; force=False iken en fazla Journal.SYNC_S'de bir
+        # (olay gelmese de son olaylar bu sürede kalıcı olur)
+        t=time.monotonic()
+        if not force and t-self._flush_t<Journal.SYNC_S: return
+        self._flush_t=t
+        for ag in list(self.agents.values()):
+            ag.all_trades.flush()
+            if ag.journal: ag.journal.sync()
+
+    def _track_latency(self,sym):
+        # Push mesajının alınmasından karar anına kadar geçen süre
+        ts=self.bc.recv_ts.get(sym)
+        if not ts: return
+        ms=(self.bc.clock.now()-ts)*1000; L=self.latency
+        L['n']+=1; L['last_ms']=round(ms,1); L['max_ms']=round(max(L['max_ms'],ms),1)
+        L['avg_ms']=round(L['avg_ms']+(ms-L['avg_ms'])/L['n'],1)
+
+    # REST döngüleri sadece stream yokken/koptuğunda çalışır
     def _bg_prices(self):
-        while self.running: self.bc.refresh_prices(); time.sleep(2)
+        while self.running:
+            if not self.bc.stream_ok():
+                t=time.perf_counter(); self.bc.refresh_prices()
+                self.sched.record('prices',(time.perf_counter()-t)*1000)
+            self.bc.clock.sleep(2)
     def _bg_tickers(self):
-        while self.running: self.bc.refresh_tickers(); time.sleep(15)
+        while self.running:
+            if not self.bc.stream_ok(): self.bc.refresh_tickers()
+            self.bc.clock.sleep(15)
+    def _bg_snapshot(self):
+        while self.running:
+            time.sleep(300)
+            if self.running: self.bc.save_snapshot()
 
-    def state(self):
+    def _coins(self):
         coins={}
         for s in self.bc.symbols:
             t=self.bc.info(s)
             if t: coins[s]=dict(price=t.get('price',0),change=round(t.get('change',0),2),
                 volume=t.get('volume',0),high=t.get('high',0),low=t.get('low',0),
                 quoteVolume=t.get('quoteVolume',0),count=t.get('count',0))
+        return coins
+
+    def state(self,agent=None,coins=None):
+        # agent: ajan adı (?agent=); yoksa varsayılan ajan. Canlı nesnelere referans
+        # tutmaz (kopyalar) - StateSnapshot'ta yayımlandıktan sonra değişmemeli
+        ag=self.agents.get(agent) or self.agent
+        if coins is None: coins=self._coins()
         pos_out={}
-        for s,p in self.agent.positions.items():
+        for s,p in ag.positions.items():
             pos_out[s]=dict(type=p['type'],entry=p['entry'],cur=p['cur'],tp=p['tp'],sl=p['sl'],
                 sz=p['sz'],lev=p['lev'],pnl=round(p['pnl'],2),pnl_pct=round(p['pnl_pct'],2),
                 strat=p['strat'],reasons=p['reasons'],ind=p['ind'],t0=p['t0'],
                 conf=p['conf'],score=p['score'],max_pnl=round(p['max_pnl'],2),
-                min_pnl=round(p['min_pnl'],2),ticks=p['ticks'],klines=p['klines'][-50:])
+                min_pnl=round(p['min_pnl'],2),ticks=p['ticks'],klines=p['klines'])
         strat_detail={}
-        for s,v in self.agent.strategies.items():
-            st=self.agent.strat_trades[s]; wr=st['wins']/st['total']*100 if st['total']>0 else 0
+        for s,v in ag.strategies.items():
+            st=ag.strat_trades[s]; wr=st['wins']/st['total']*100 if st['total']>0 else 0
             strat_detail[s]=dict(score=round(v,3),trades=st['total'],wr=round(wr,1))
         uptime=''
         if self.start_time:
-            d=datetime.now()-datetime.fromisoformat(self.start_time)
+            d=self.bc.clock.dt()-datetime.fromisoformat(self.start_time)
             h,m=divmod(int(d.total_seconds()),3600); m,s=divmod(m,60); uptime=f"{h:02d}:{m:02d}:{s:02d}"
-        return dict(balance=round(self.agent.balance,2),total_pnl=self.agent.total_pnl(),
-            total_pnl_pct=round(self.agent.total_pnl()/self.agent.start_balance*100,2),
-            trades=self.agent.trades,wins=self.agent.wins,wr=round(self.agent.wr(),1),
-            active=len(self.agent.positions),drawdown=self.agent.drawdown(),
-            profit_factor=self.agent.profit_factor(),positions=pos_out,
-            history=self.agent.history[:60],strategies=strat_detail,coins=coins,
-            running=self.running,curve=self.agent.pnl_curve,pnl_times=self.agent.pnl_times,
+        return dict(balance=round(ag.balance,2),total_pnl=ag.total_pnl(),
+            total_pnl_pct=round(ag.total_pnl()/ag.start_balance*100,2),
+            trades=ag.trades,wins=ag.wins,wr=round(ag.wr(),1),
+            active=len(ag.positions),drawdown=ag.drawdown(),
+            profit_factor=ag.profit_factor(),positions=pos_out,
+            history=ag.history[:60],strategies=strat_detail,coins=coins,
+            running=self.running,curve=ag.pnl_curve[:],pnl_times=ag.pnl_times[:],
             events=self.events[:80],uptime=uptime,coin_count=len(self.bc.symbols),
-            risk=self.agent.risk)
+            risk=dict(ag.risk),analysis_cache=ag.acache.stats(),rate=self.bc.rl.snapshot(),
+            startup=dict(self.bc.startup),
+            replay=dict(path=self.bc.path,speed=self.bc.clock.speed,at=round(self.bc.clock.now()),
+                        end=round(self.bc.t_end),**self.bc.replay_stats) if isinstance(self.bc,ReplayClient) else None,
+            recorder=self.bc.recorder.stats() if self.bc.recorder else None,
+            journal=dict(ag.journal.stats) if ag.journal else None,
+            engine=self.MODE,scheduler=self.sched.snapshot(),agent=ag.name,hub=self.hub.stats(),
+            agents=[dict(name=a.name,balance=round(a.balance,2),total_pnl=a.total_pnl(),trades=a.trades,
+                         wr=round(a.wr(),1),active=len(a.positions),drawdown=a.drawdown()) for a in self.agents.values()],
+            stream=dict(live=self.bc.stream_ok(),subs=len(self.bc._kline_subs),
+                        latency=dict(self.latency),**self.bc.ws_stats))
+
+    def debug(self,ag):
+        # /api/debug gövdesi: ajan sağlığı, pozisyon mesafeleri, strateji başarımı
+        now=self.bc.clock.dt()
+        out={
+            'agent':ag.name,
+            'timestamp':datetime.now().isoformat(),
+            'uptime_seconds':int((now-datetime.fromisoformat(self.start_time)).total_seconds()) if self.start_time else 0,
+            'running':self.running,
+            'balance':ag.balance,
+            'start_balance':ag.start_balance,
+            'total_pnl':ag.total_pnl(),
+            'total_pnl_pct':round(ag.total_pnl()/ag.start_balance*100,2),
+            'trades':ag.trades,
+            'wins':ag.wins,
+            'losses':ag.trades-ag.wins,
+            'win_rate':round(ag.wr(),2),
+            'active_positions':len(ag.positions),
+            'drawdown':ag.drawdown(),
+            'profit_factor':ag.profit_factor(),
+            'peak_balance':ag.peak_balance,
+            'total_profit':ag.total_profit,
+            'total_loss':ag.total_loss,
+            'coin_count':len(self.bc.symbols),
+            'risk_config':dict(ag.risk),
+            'analysis_cache':ag.acache.stats(),
+            'positions_detail':{},
+            'recent_trades':ag.history[:10],
+            'strategies':{},
+            'recent_logs':self.events[:20],
+        }
+        
+        # Position details with health indicators
+        for sym,pos in ag.positions.items():
+            tp_dist=abs(pos['tp']-pos['cur'])/pos['cur']*100
+            sl_dist=abs(pos['cur']-pos['sl'])/pos['cur']*100
+            duration_sec=int((now-datetime.fromisoformat(pos['t0'])).total_seconds())
+            a=ag.cached_analysis(sym)
+            
+            out['positions_detail'][sym]={
+                'type':pos['type'],'entry':pos['entry'],'current':pos['cur'],
+                'tp':pos['tp'],'sl':pos['sl'],'leverage':pos['lev'],
+                'size':pos['sz'],'pnl':round(pos['pnl'],2),'pnl_pct':round(pos['pnl_pct'],2),
+                'max_pnl':round(pos['max_pnl'],2),'min_pnl':round(pos['min_pnl'],2),
+                'tp_distance_pct':round(tp_dist,2),'sl_distance_pct':round(sl_dist,2),
+                'duration_seconds':duration_sec,'strategy':pos['strat'],
+                'score_now':a['score'] if a else None,'rsi_now':a['rsi'] if a else None
+            }
+        
+        # Strategy performance
+        for s,v in ag.strategies.items():
+            st=ag.strat_trades[s]
+            wr=st['wins']/st['total']*100 if st['total']>0 else 0
+            out['strategies'][s]={'score':round(v,3),'trades':st['total'],'wins':st['wins'],'wr':round(wr,1)}
+        return out
+
+    def publish(self):
+        # Döngü dışından (başlat/durdur): tick bitene kadar bekler
+        with self._tick: self._publish()
+
+    def update_risk(self,ag,changes):
+        # HTTP iş parçacığından risk güncellemesi: tick'ler arasında uygulanır (risk_changed()
+        # TriggerIndex'i değiştirir, settle() ile yarışmamalı) ve aynı anda yayımlanır
+        with self._tick:
+            for k,v in changes.items():
+                if k in ag.risk: ag.risk[k]=type(ag.risk[k])(v)
+            ag.risk_changed()
+            if ag.journal: ag.journal.log('r',r=ag.risk)
+            self.log(f"{self._tag(ag)}Risk ayarlari guncellendi: {changes}","success")
+            self._publish()
+            return dict(ag.risk)
+
+    def _publish(self,force=True):
+        # Tüm ajanların state/debug görüntüsünü kur ve tek atamayla yayımla (okuyucular kilitsiz)
+        t=time.monotonic()
+        if not force and t-self._pub_t<self.PUBLISH_S: return
+        self._pub_t=t; self._pub_ver+=1; coins=self._coins(); at=round(self.bc.clock.now(),3)
+        state={}
+        for name in self.agents:
+            st=state[name]=self.state(name,coins); st['snapshot']=dict(ver=self._pub_ver,at=at)
+        self.snap=StateSnapshot(self._pub_ver,at,self.agent.name,state,
+                                {name:self.debug(ag) for name,ag in self.agents.items()},self.sched.snapshot())
+
+class AsyncEngine(Engine):
+    """Engine'in asyncio modu (BOT_ENGINE=async).
+
+    Fiyat/ticker tazeleme, pozisyon takibi + tarama ve kalıcılık tek bir olay
+    döngüsünde görev olarak çalışır. Ticaret döngüsü sabit 2 s uyku yerine yeni
+    piyasa verisiyle (stream mesajı ya da REST tazelemesi) uyanır; en sık TICK_MIN,
+    veri gelmese de en geç TICK_MAX saniyede bir. Ağ istekleri AsyncRest ile
+    döngüde eşzamanlı yapılır; analiz/karar/açılış gibi CPU işleri tek iş
+    parçacıklı bir yürütücüde çalışır, böylece Agent durumunu tek yazar değiştirir.
+    Tarama, thread modundaki gibi scan_interval * TICK_S saniyede bir yapılır.
+    """
+    MODE = 'async'
+    TICK_MIN = 0.25  # iki değerlendirme arası en kısa süre (s)
+    TICK_MAX = 2.0   # veri gelmese de bu sürede bir tick
+
+    def __init__(self,*a,**kw):
+        super().__init__(*a,**kw)
+        self._loop=None; self._wake=None; self.rest=None; self.cpu=None
+
+    def start(self):
+        asyncio.run(self._main())
+
+    def stop(self):
+        super().stop()
+        if self._loop:
+            try: self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError: pass  # döngü zaten kapandı
+
+    def _sleep(self,s):
+        # Sanal saatte (replay) süreler hızlandırılır
+        return asyncio.sleep(s/getattr(self.bc.clock,'speed',1.0))
+
+    async def _main(self):
+        self.running=True; self.start_time=self.bc.clock.dt().isoformat()
+        self.log("Bot baslatildi (async) - Piyasa taranıyor...","success")
+        self._loop=loop=asyncio.get_running_loop(); self._wake=asyncio.Event()
+        async with self._ticking(): self._publish()
+        wake=lambda: loop.call_soon_threadsafe(self._wake.set)
+        self.bc.listeners.append(wake)
+        self.rest=await AsyncRest(self.bc).open()
+        self.cpu=ThreadPoolExecutor(1,thread_name_prefix='agent')
+        self.bc.start_stream()
+        print(f"\n{'='*50}\nBot Baslatildi (async{', aiohttp' if self.rest.session else ''}) | "
+              f"${self.agent.balance:.0f} | {len(self.bc.symbols)} cift\n{'='*50}\n")
+        tasks=[asyncio.create_task(c) for c in (self._prices(),self._tickers(),self._persist())]
+        try: await self._trade()
+        finally:
+            for t in tasks: t.cancel()
+            await asyncio.gather(*tasks,return_exceptions=True)
+            self.bc.listeners.remove(wake)
+            await self.rest.close()
+            self.cpu.shutdown(wait=True)
+            async with self._ticking(): self._publish()
+            self._loop=None
+
+    def _run(self,f,*a):
+        return self._loop.run_in_executor(self.cpu,f,*a)
+
+    @contextlib.asynccontextmanager
+    async def _ticking(self):
+        # _tick'i döngüyü bloklamadan alır: HTTP iş parçacığı tutuyorsa (update_risk, publish)
+        # bekleme varsayılan yürütücüde yapılır, fiyat/kalıcılık görevleri çalışmaya devam eder
+        if not self._tick.acquire(blocking=False):
+            fut=self._loop.run_in_executor(None,self._tick.acquire)
+            try: await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                fut.add_done_callback(lambda f: self._tick.release()); raise
+        try: yield
+        finally: self._tick.release()
+
+    async def _trade(self):
+        next_scan={}
+        while self.running:
+            try: await asyncio.wait_for(self._wake.wait(),self.TICK_MAX/getattr(self.bc.clock,'speed',1.0))
+            except asyncio.TimeoutError: pass
+            self._wake.clear()
+            if not self.running: break
+            t0=time.monotonic(); sch=self.sched; r=self.agent.risk
+            try:
+                async with self._ticking():  # dışarıdan publish() bu tick'in sonunu bekler
+                    sch.begin(r['tick_budget_ms']); self.hub.advance()
+                    ags=list(self.agents.values())
+                    for ag in ags: await self._update(ag)
+                    now=self.bc.clock.now()
+                    due=[ag for ag in ags if now>=next_scan.get(ag.name,0)]
+                    if due and sch.scan_ok():
+                        for ag in due:
+                            next_scan[ag.name]=now+ag.risk['scan_interval']*self.TICK_S
+                            await self._scan(ag)
+                    sch.end(self.bc.clock.dt().strftime('%H:%M:%S'))
+                    self.tick+=1; await self._run(self._publish,False)
+                if self.bc.exhausted():
+                    self.log("Replay kaydi bitti","warn"); self.stop(); break
+            except Exception as e: self.log(f"Hata: {e}","error")
+            dt=time.monotonic()-t0
+            if dt<self.TICK_MIN*sch.stretch: await self._sleep(self.TICK_MIN*sch.stretch-dt)
+
+    async def _update(self,ag):
+        sch=self.sched
+        with sch.stage('update'): due=await self._run(ag.due)
+        if not due: return
+        with sch.stage('klines'): await self.rest.prefetch(due,'5m',80,max_age=2,prio=RequestScheduler.PRIO_POS)
+        with sch.stage('update'): await self._run(ag.settle,due)
+
+    async def _scan(self,ag):
+        r=ag.risk; sch=self.sched; n=sch.scan_size(r['scan_size'])
+        if r.get('scan_mode')=='batch':
+            free=[s for s in self.bc.symbols if s not in ag.positions]
+            with sch.stage('klines'): await self.rest.prefetch(self.bc.stale(free,'5m')[:n],'5m',80)
+            with sch.stage('analysis'): syms=[x['sym'] for x in await self._run(ag.analyze_batch,free)]
+        else:
+            syms=await self._run(self._sample,ag,n)
+            with sch.stage('klines'): await self.rest.prefetch([s for s in syms if s not in ag.positions])
+        await self._run(self._enter,ag,syms)
+
+    # REST tazelemeleri sadece stream yokken/koptuğunda; sonuç ticaret döngüsünü uyandırır
+    async def _prices(self):
+        while self.running:
+            if not self.bc.stream_ok():
+                t=time.perf_counter(); await self.rest.refresh_prices()
+                self.sched.record('prices',(time.perf_counter()-t)*1000)
+            await self._sleep(self.TICK_S)
+    async def _tickers(self):
+        while self.running:
+            if not self.bc.stream_ok(): await self.rest.refresh_tickers()
+            await self._sleep(15)
+    async def _persist(self):
+        # Journal/trade dosyası diske (ajan yürütücüsünde, yazımlarla sıralı); 300 s'de bir snapshot
+        last=time.monotonic()
+        while self.running:
+            await asyncio.sleep(Journal.SYNC_S)
+            await self._run(self.flush)
+            if time.monotonic()-last>=300:
+                last=time.monotonic(); await asyncio.to_thread(self.bc.save_snapshot)
+
+
+def _shard_worker(conn,symbols,replay=None,share=1.0,seed=None):
+    # ShardedEngine işçisi: dilimin mum tamponları, IncTA durumu ve analiz önbelleği bu süreçte
+    # yaşar. İstek: (ajan, now, risk, hariç semboller, tazeleme/örneklem sayısı, aday sayısı, bütçe ms)
+    # Koordinatördeki her ajanın burada kendi Agent'ı vardır (decide() kısıtı, risk, önbellek);
+    # hepsi işçinin MarketHub'ını paylaşır, tıpkı süreç içi Engine'deki gibi
+    with open(os.devnull,'w') as null, contextlib.redirect_stdout(null):  # açılış mesajları koordinatörde
+        if replay:
+            bc=ReplayClient(replay,symbols=symbols); bc.clock=ManualClock(bc.clock.now())
+        else:
+            bc=BinanceClient(symbols=symbols); bc.rl=RequestScheduler(share=share); bc.start_stream()
+    hub=MarketHub(bc); ags={}; last=None
+    while True:
+        try: msg=conn.recv()
+        except (EOFError,KeyboardInterrupt): break
+        if msg is None: break
+        name,now,risk,exclude,n,top,budget_ms=msg
+        if replay: bc.clock.t=now
+        if now!=last: hub.advance(); last=now
+        ag=ags.get(name)
+        if ag is None:
+            ag=ags[name]=Agent(bc,None if seed is None else seed+len(ags),hub=hub,name=name,risk=risk)
+        elif ag.risk!=risk: ag.risk.update(risk); ag.risk_changed()
+        ms={}; t0=time.perf_counter()
+        free=[s for s in bc.symbols if s not in exclude]
+        if ag.risk.get('scan_mode')=='batch':
+            t=time.perf_counter(); bc.refresh_stale(free,'5m',n); ms['klines']=(time.perf_counter()-t)*1000
+            t=time.perf_counter(); cand=[x['sym'] for x in ag.analyze_batch(free)]; ms['analysis']=(time.perf_counter()-t)*1000
+        else:
+            cand=ag.rng.sample(free,min(n,len(free)))
+            t=time.perf_counter(); bc.prefetch(cand); ms['klines']=(time.perf_counter()-t)*1000
+        t=time.perf_counter(); out=[]; shed=0
+        for k,sym in enumerate(cand):
+            if len(out)>=top: break
+            if (time.perf_counter()-t0)*1000>=budget_ms: shed=len(cand)-k; break
+            d=ag.decide(sym)
+            if d: d.pop('klines',None); out.append(d)
+        ms['decide']=(time.perf_counter()-t)*1000
+        conn.send(dict(decisions=out,scanned=len(free),shed=shed,ms=ms))
+    bc.stop_stream()
+
+class ShardedEngine(Engine):
+    """Taramayı sembol dilimlerine bölünmüş işçi süreçlerde yapan Engine (BOT_SHARDS=N).
+
+    Evren (BinanceClient.symbols) işçilere sırayla dağıtılır; her işçi kendi
+    diliminin mumlarını tazeler, analiz eder ve decide() adaylarını döndürür.
+    Koordinatör (bu süreç) pozisyonları, bakiyeyi ve risk limitlerini tek başına
+    tutar: adayları |skor|/güvene göre birleştirir, strateji ve kaldıracı kendi
+    durumundan seçer ve max_positions'a kadar açar. Pozisyon takibi ve çıkışlar
+    koordinatörde kalır (sadece açık sembollerin mumları burada tutulur).
+    İşçiler REST ağırlık bütçesini eşit bölüşür; replay'de koordinatörün sanal
+    saatini izler. Evren başlangıçta bölünür; sonradan eklenen semboller taranmaz.
+    """
+    MODE = 'sharded'
+    REPLY_GRACE_S = 5    # tick bütçesinin üstüne işçi yanıtı için bekleme; aşılırsa işçi yeniden başlatılır
+    START_S = 60         # yeni başlatılan işçinin ilk yanıtı için ek süre (import + dilimin ilk mumları)
+
+    def __init__(self,bc=None,seed=None,persist=True,shards=None,replay=None,agents=None):
+        self._procs=[]; self.shard_stats=[]  # Engine.__init__ ilk görüntüyü yayımlar
+        super().__init__(bc,seed,persist,agents)
+        self.n_shards=max(1,shards or os.cpu_count() or 1); self.replay=replay; self.seed=seed
+        syms=list(self.bc.symbols)
+        self.shards=[syms[i::self.n_shards] for i in range(self.n_shards)]
+        self.shard_stats=[dict(symbols=len(sh),scanned=0,decisions=0,shed=0,ms={},restarts=0) for sh in self.shards]
+        self._ctx=mp.get_context('spawn')  # canlı iş parçacıkları (ws, http) varken fork edilmez
+        self._procs=[None]*self.n_shards; self._conns=[None]*self.n_shards; self._ready=[False]*self.n_shards
+        for i in range(self.n_shards): self._spawn(i)
+        self.publish()
+
+    def _spawn(self,i):
+        a,b=self._ctx.Pipe()
+        pr=self._ctx.Process(target=_shard_worker,args=(b,self.shards[i],self.replay,1/self.n_shards,
+                             None if self.seed is None else self.seed+i+1),daemon=True)
+        pr.start(); b.close(); self._procs[i]=pr; self._conns[i]=a; self._ready[i]=False
+
+    def close(self):
+        for c,pr in zip(self._conns,self._procs):
+            try: c.send(None)
+            except Exception: pass
+            pr.join(5)
+
+    def _scan(self,ag,n):
+        r=ag.risk; sch=self.sched
+        slots=r['max_positions']-len(ag.positions)
+        if slots<=0: return
+        req=(ag.name,self.bc.clock.now(),dict(r),set(ag.positions),-(-n//self.n_shards),slots,
+             max(0.0,r['tick_budget_ms']-sch.elapsed_ms()))
+        live=[]
+        for i,c in enumerate(self._conns):
+            try: c.send(req); live.append(i)
+            except Exception as e: self._lost(i,e)
+        # _tick tutuluyor: takılan işçi beklenmez, bu tick onsuz taranır (geç yanıt boruda kalmasın diye yeniden başlatılır)
+        deadline=time.monotonic()+req[-1]/1000+self.REPLY_GRACE_S
+        res=[]
+        for i in live:
+            try:
+                wait=deadline-time.monotonic()+(0 if self._ready[i] else self.START_S)
+                if not self._conns[i].poll(max(0.0,wait)): raise TimeoutError("yanit zaman asimi")
+                res.append(self._conns[i].recv()); self._ready[i]=True
+            except Exception as e: self._lost(i,e); continue
+            st=self.shard_stats[i]; x=res[-1]
+            st['scanned']+=x['scanned']; st['decisions']+=len(x['decisions']); st['shed']+=x['shed']
+            st['ms']={k:round(v,1) for k,v in x['ms'].items()}
+        # İşçiler paralel: aşama süresi en yavaş işçininki
+        for k in ('klines','analysis','decide'):
+            v=[x['ms'][k] for x in res if k in x['ms']]
+            if v: sch.add(k,max(v))
+        ds=sorted((d for x in res for d in x['decisions']),key=lambda d:(-abs(d['score']),-d['conf']))
+        for k,d in enumerate(ds):
+            if len(ag.positions)>=r['max_positions']: break
+            if sch.over(): sch.shed(len(ds)-k); break
+            if d['sym'] in ag.positions: continue
+            d['strat']=ag._pick_strat(); d['lev']=ag._pick_lev()
+            self._take(ag,d)
+
+    def _lost(self,i,e):
+        self.log(f"Shard {i} hatasi: {e} - yeniden baslatiliyor","error")
+        try: self._procs[i].kill()
+        except Exception: pass
+        self.shard_stats[i]['restarts']+=1; self._spawn(i)
+
+    def state(self,agent=None,coins=None):
+        st=super().state(agent,coins)
+        st['shards']=[dict(x,alive=pr.is_alive()) for pr,x in zip(self._procs,self.shard_stats)]
+        return st
 
 
 # ── HTML FRONTEND ──────────────────────────────────────────
@@ -893,6 +3088,9 @@ header{background:rgba(6,12,24,0.96);backdrop-filter:blur(20px);border-bottom:1p
 .btn:active{transform:scale(.97)}.btn:disabled{opacity:.25;cursor:not-allowed}
 .btn-go{border-color:var(--green);color:var(--green)}.btn-stop{border-color:var(--red);color:var(--red)}
 .upt{font-size:9px;color:var(--dim);font-family:var(--dsp);letter-spacing:1px}
+.agsel{display:none;padding:6px 8px;border:1px solid var(--cyan);border-radius:3px;background:none;color:var(--cyan);
+  font-family:var(--mono);font-size:10px;font-weight:700;letter-spacing:1px}
+.agsel option{background:#0a0e14}
 /* MAIN GRID */
 .main{padding:10px 14px;display:grid;gap:8px;
   grid-template-columns:repeat(6,1fr);
@@ -1099,6 +3297,7 @@ header{background:rgba(6,12,24,0.96);backdrop-filter:blur(20px);border-bottom:1p
     <div class="hs"><div class="hs-l">P.Factor</div><div class="hs-v c-teal" id="h-pf">1.0</div></div>
   </div>
   <div class="hdr-ctrl">
+    <select class="agsel" id="agsel" onchange="pickAgent(this.value)"></select>
     <div class="upt" id="upt">00:00:00</div>
     <div class="sdot" id="sdot"></div>
     <div class="stxt c-dim" id="stxt">DURDURULDU</div>
@@ -1279,7 +3478,7 @@ header{background:rgba(6,12,24,0.96);backdrop-filter:blur(20px);border-bottom:1p
 </div>
 
 <script>
-let D={},running=false,chartMode='pnl',curSym=null,curTf='5m',sortMode='change',hFilter='all';
+let D={},AGENT='',running=false,chartMode='pnl',curSym=null,curTf='5m',sortMode='change',hFilter='all';
 let tickerInit=false,cvHover=false,cvMX=0;
 
 const fp=n=>{
@@ -1607,6 +3806,15 @@ function loadRisk(r){
   const btns=document.querySelectorAll('.lev-btn');
   if(btns[idx])btns[idx].classList.add('active');
 }
+const agq=(sep='?')=>AGENT?`${sep}agent=${encodeURIComponent(AGENT)}`:'';
+function pickAgent(a){AGENT=a;firstPoll=true;poll()}
+function buildAgents(){
+  const el=document.getElementById('agsel'),ags=D.agents||[];
+  el.style.display=ags.length>1?'block':'none';
+  if(el.options.length!==ags.length)el.innerHTML=ags.map(a=>`<option value="${a.name}">${a.name}</option>`).join('');
+  ags.forEach((a,i)=>{el.options[i].textContent=`${a.name} · $${a.balance.toFixed(0)} · ${a.trades}`});
+  el.value=D.agent||'';
+}
 async function saveRisk(){
   const payload={
     max_positions:parseInt(document.getElementById('r-maxpos').value),
@@ -1619,7 +3827,7 @@ async function saveRisk(){
     leverage:selectedLev,
   };
   try{
-    const r=await fetch('/api/risk',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(payload)});
+    const r=await fetch('/api/risk'+agq(),{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify(payload)});
     const d=await r.json();
     if(d.ok){
       const s=document.getElementById('risk-status');
@@ -1632,9 +3840,9 @@ async function saveRisk(){
 let firstPoll=true;
 async function poll(){
   try{
-    const r=await fetch('/api/status');if(!r.ok)return;
+    const r=await fetch('/api/status'+agq());if(!r.ok)return;
     D=await r.json();if(D.error)return;
-    syncUI();buildStats();
+    syncUI();buildStats();buildAgents();
     if(firstPoll){buildTicker();loadRisk(D.risk);firstPoll=false;}else updateTicker();
     renderCoins();buildPositions();buildHistory();buildStrategies();buildLog();
     if(chartMode==='pnl')drawPnlChart(D.curve||[]);
@@ -1652,7 +3860,19 @@ window.addEventListener('resize',()=>{if(chartMode==='pnl')drawPnlChart(D.curve|
 # ── HTTP HANDLER ───────────────────────────────────────────
 engine_g=None
 
+def _agent_name(p): return parse_qs(p.query).get('agent',[None])[0]
+
+def _agent(p):
+    # ?agent=<ad> ile seçilen ajan; parametre yoksa varsayılan ajan, bilinmeyen adda None
+    if not engine_g: return None
+    name=_agent_name(p)
+    return engine_g.agent if name is None else engine_g.agents.get(name)
+
 class H(BaseHTTPRequestHandler):
+    def _no_agent(self,p):
+        self.send_response(404); self.send_header('Content-type','application/json'); self.send_header('Access-Control-Allow-Origin','*'); self.end_headers()
+        self.wfile.write(json.dumps({'error':f"bilinmeyen ajan: {_agent_name(p)}"}).encode())
+
     def do_GET(self):
         try:
             p=urlparse(self.path)
@@ -1660,8 +3880,10 @@ class H(BaseHTTPRequestHandler):
                 self.send_response(200); self.send_header('Content-type','text/html;charset=utf-8'); self.end_headers()
                 self.wfile.write(HTML.encode())
             elif p.path=='/api/status':
+                b=engine_g.snap.body('state',_agent_name(p)) if engine_g else b'{}'
+                if b is None: return self._no_agent(p)
                 self.send_response(200); self.send_header('Content-type','application/json'); self.send_header('Access-Control-Allow-Origin','*'); self.end_headers()
-                self.wfile.write(json.dumps(engine_g.state() if engine_g else {}).encode())
+                self.wfile.write(b)
             elif p.path=='/api/start':
                 self.send_response(200); self.send_header('Content-type','text/plain'); self.end_headers()
                 if engine_g and not engine_g.running:
@@ -1669,7 +3891,7 @@ class H(BaseHTTPRequestHandler):
                 self.wfile.write(b'ok')
             elif p.path=='/api/stop':
                 self.send_response(200); self.send_header('Content-type','text/plain'); self.end_headers()
-                if engine_g: engine_g.stop()
+                if engine_g: engine_g.stop(); engine_g.publish()
                 self.wfile.write(b'ok')
             elif p.path=='/api/klines':
                 qs=parse_qs(p.query); sym=qs.get('sym',['BTCUSDT'])[0]; tf=qs.get('tf',['5m'])[0]; limit=int(qs.get('limit',['80'])[0])
@@ -1678,59 +3900,10 @@ class H(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({'klines':kl}).encode())
             elif p.path=='/api/debug':
                 # FULL DEBUG ENDPOINT - Claude can monitor bot health
+                b=engine_g.snap.body('debug',_agent_name(p)) if engine_g else json.dumps({'error':'Engine not initialized'}).encode()
+                if b is None: return self._no_agent(p)
                 self.send_response(200); self.send_header('Content-type','application/json'); self.send_header('Access-Control-Allow-Origin','*'); self.end_headers()
-                if not engine_g:
-                    self.wfile.write(json.dumps({'error':'Engine not initialized'}).encode())
-                    return
-                
-                debug_data={
-                    'timestamp':datetime.now().isoformat(),
-                    'uptime_seconds':int((datetime.now()-datetime.fromisoformat(engine_g.start_time)).total_seconds()) if engine_g.start_time else 0,
-                    'running':engine_g.running,
-                    'balance':engine_g.agent.balance,
-                    'start_balance':engine_g.agent.start_balance,
-                    'total_pnl':engine_g.agent.total_pnl(),
-                    'total_pnl_pct':round(engine_g.agent.total_pnl()/engine_g.agent.start_balance*100,2),
-                    'trades':engine_g.agent.trades,
-                    'wins':engine_g.agent.wins,
-                    'losses':engine_g.agent.trades-engine_g.agent.wins,
-                    'win_rate':round(engine_g.agent.wr(),2),
-                    'active_positions':len(engine_g.agent.positions),
-                    'drawdown':engine_g.agent.drawdown(),
-                    'profit_factor':engine_g.agent.profit_factor(),
-                    'peak_balance':engine_g.agent.peak_balance,
-                    'total_profit':engine_g.agent.total_profit,
-                    'total_loss':engine_g.agent.total_loss,
-                    'coin_count':len(engine_g.bc.symbols),
-                    'risk_config':engine_g.agent.risk,
-                    'positions_detail':{},
-                    'recent_trades':engine_g.agent.history[:10],
-                    'strategies':{},
-                    'recent_logs':engine_g.events[:20],
-                }
-                
-                # Position details with health indicators
-                for sym,pos in engine_g.agent.positions.items():
-                    tp_dist=abs(pos['tp']-pos['cur'])/pos['cur']*100
-                    sl_dist=abs(pos['cur']-pos['sl'])/pos['cur']*100
-                    duration_sec=int((datetime.now()-datetime.fromisoformat(pos['t0'])).total_seconds())
-                    
-                    debug_data['positions_detail'][sym]={
-                        'type':pos['type'],'entry':pos['entry'],'current':pos['cur'],
-                        'tp':pos['tp'],'sl':pos['sl'],'leverage':pos['lev'],
-                        'size':pos['sz'],'pnl':round(pos['pnl'],2),'pnl_pct':round(pos['pnl_pct'],2),
-                        'max_pnl':round(pos['max_pnl'],2),'min_pnl':round(pos['min_pnl'],2),
-                        'tp_distance_pct':round(tp_dist,2),'sl_distance_pct':round(sl_dist,2),
-                        'duration_seconds':duration_sec,'strategy':pos['strat']
-                    }
-                
-                # Strategy performance
-                for s,v in engine_g.agent.strategies.items():
-                    st=engine_g.agent.strat_trades[s]
-                    wr=st['wins']/st['total']*100 if st['total']>0 else 0
-                    debug_data['strategies'][s]={'score':round(v,3),'trades':st['total'],'wins':st['wins'],'wr':round(wr,1)}
-                
-                self.wfile.write(json.dumps(debug_data).encode())
+                self.wfile.write(b)
             
             # ── CANLI İZLEME API'LERİ ──────────────────────────────
             elif p.path=='/api/live-status':
@@ -1764,6 +3937,24 @@ class H(BaseHTTPRequestHandler):
                     self.wfile.write(json.dumps(snapshot).encode())
                 else:
                     self.wfile.write(json.dumps({'error':'Live monitoring not active'}).encode())
+            elif p.path=='/api/montecarlo':
+                qs=parse_qs(p.query)
+                if engine_g and not _agent(p): return self._no_agent(p)
+                self.send_response(200); self.send_header('Content-type','application/json'); self.send_header('Access-Control-Allow-Origin','*'); self.end_headers()
+                if not engine_g:
+                    self.wfile.write(json.dumps({'error':'Engine not initialized'}).encode())
+                    return
+                try:
+                    num=lambda k,d,lo,hi: min(max(int(qs.get(k,[d])[0]),lo),hi)
+                    res=_agent(p).robustness(paths=num('paths','10000',1,100000),
+                        method=qs.get('method',['bootstrap'])[0],block=num('block','20',1,1000),
+                        seed=num('seed','0',0,2**32-1))
+                except ValueError as e: res={'error':str(e)}
+                self.wfile.write(json.dumps(res).encode())
+            elif p.path=='/api/ticks':
+                # Tick aşama süreleri, bütçe uyarlaması ve son aşımlar
+                self.send_response(200); self.send_header('Content-type','application/json'); self.send_header('Access-Control-Allow-Origin','*'); self.end_headers()
+                self.wfile.write(engine_g.snap.body('ticks') if engine_g else b'{}')
             else:
                 self.send_response(404); self.end_headers()
         except BrokenPipeError: pass
@@ -1775,13 +3966,11 @@ class H(BaseHTTPRequestHandler):
             length=int(self.headers.get('Content-Length',0))
             body=json.loads(self.rfile.read(length)) if length>0 else {}
             if p.path=='/api/risk':
-                if engine_g:
-                    for k,v in body.items():
-                        if k in engine_g.agent.risk:
-                            engine_g.agent.risk[k]=type(engine_g.agent.risk[k])(v)
-                    engine_g.log(f"Risk ayarlari guncellendi: {body}","success")
+                ag=_agent(p)
+                if engine_g and not ag: return self._no_agent(p)
+                risk=engine_g.update_risk(ag,body) if ag else {}
                 self.send_response(200); self.send_header('Content-type','application/json'); self.end_headers()
-                self.wfile.write(json.dumps({'ok':True,'risk':engine_g.agent.risk if engine_g else {}}).encode())
+                self.wfile.write(json.dumps({'ok':True,'risk':risk}).encode())
             else:
                 self.send_response(404); self.end_headers()
         except BrokenPipeError: pass
@@ -1796,11 +3985,38 @@ class H(BaseHTTPRequestHandler):
 
     def log_message(self,*a): pass
 
+def _sigterm(signum,frame):
+    # Konteyner durdurma (SIGTERM) Ctrl+C ile aynı kapanış yolundan geçer: journal/trade fsync
+    raise KeyboardInterrupt
+
 def main():
     global engine_g
     PORT = int(os.environ.get('PORT', 8080))
     print("\n"+"="*52+"\n  AI TRADING BOT v5.0\n  Real Binance Data - Simulated Trading\n"+"="*52+"\n")
-    engine_g=Engine()
+    # BOT_RECORD=dosya.jsonl.gz -> canlı piyasa verisini kaydet
+    # BOT_REPLAY=dosya.jsonl.gz [BOT_REPLAY_SPEED=100] -> kaydı ağsız, sanal saatle oynat (otomatik başlar)
+    seed=os.environ.get('BOT_SEED'); seed=int(seed) if seed else None
+    replay=os.environ.get('BOT_REPLAY')
+    if replay:
+        bc=ReplayClient(replay,float(os.environ.get('BOT_REPLAY_SPEED',1)))
+        if seed is None: seed=0
+    else:
+        rec=os.environ.get('BOT_RECORD')
+        bc=BinanceClient(recorder=MarketRecorder(rec) if rec else None)
+        if rec: print(f"● Piyasa verisi kaydediliyor: {rec}")
+    # BOT_ENGINE=async -> asyncio çekirdeği (AsyncEngine); varsayılan thread döngüsü
+    # BOT_SHARDS=N -> taramayı N işçi sürece böl (ShardedEngine, thread döngüsü)
+    mode=os.environ.get('BOT_ENGINE','thread'); shards=int(os.environ.get('BOT_SHARDS',0) or 0)
+    # BOT_AGENTS='{"ad":{risk ayarları},...}' ya da JSON dosyası -> tek veri akışında çok ajan (MarketHub)
+    agents=os.environ.get('BOT_AGENTS')
+    if agents:
+        if os.path.exists(agents):
+            with open(agents) as f: agents=json.load(f)
+        else: agents=json.loads(agents)
+        print(f"● {len(agents)} ajan: {', '.join(agents)}")
+    if shards>1: engine_g=ShardedEngine(bc,seed,persist=not replay,shards=shards,replay=replay,agents=agents)
+    else: engine_g=(AsyncEngine if mode=='async' else Engine)(bc,seed,persist=not replay,agents=agents)
+    if replay: threading.Thread(target=engine_g.start,daemon=True).start()
     
     # ── CANLI İZLEME SİSTEMİ ──────────────────────────────────
     try:
@@ -1815,8 +4031,13 @@ def main():
         live_analyzer = None
     
     srv=HTTPServer(('0.0.0.0',PORT),H)
+    engine_g.bc.startup['ready_ms']=round((time.perf_counter()-BOOT_T0)*1000)
+    engine_g.publish()  # ilk görüntü ready_ms'den önce yayımlandı
+    print(f"-> Hazir: {engine_g.bc.startup['ready_ms']}ms ({'snapshot' if engine_g.bc.startup['warm'] else 'soguk'} baslatma)")
     print(f"-> Server running on port {PORT}")
     print("-> Ctrl+C ile durdur\n")
+    signal.signal(signal.SIGTERM,_sigterm)
+    atexit.register(lambda: engine_g and engine_g.flush())  # diğer çıkış yolları için son çare
     try: srv.serve_forever()
     except KeyboardInterrupt:
         print("\nDurduruluyor...")